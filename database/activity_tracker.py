@@ -0,0 +1,43 @@
+import time
+from typing import Dict
+
+
+class ActivityTracker:
+    """Отложенная запись users.last_activity
+
+    Касания копятся в памяти процесса ({telegram_id: момент последнего касания}) и
+    сбрасываются в PostgreSQL пачкой раз в FLUSH_INTERVAL секунд одним UPDATE.
+    """
+
+    FLUSH_INTERVAL = 5  # секунд между сбросами
+
+    def __init__(self):
+        self._pending: Dict[int, float] = {}
+        self.touches = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+
+    def touch(self, telegram_id: int):
+        self._pending[telegram_id] = time.monotonic()
+        self.touches += 1
+
+    def drain(self) -> Dict[int, float]:
+        """Забрать накопленные касания: {telegram_id: time.monotonic() касания}"""
+        pending, self._pending = self._pending, {}
+        return pending
+
+    def restore(self, pending: Dict[int, float]):
+        """Вернуть касания после неудачного сброса (более свежие касания не перетираются)"""
+        for telegram_id, touched in pending.items():
+            self._pending.setdefault(telegram_id, touched)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'pending': len(self._pending),
+            'touches': self.touches,
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+        }
@@ -0,0 +1,65 @@
+import time
+import heapq
+from datetime import datetime
+from typing import Dict, List, Optional
+
+
+class BanRegistry:
+    """Множество активных банов в памяти процесса с расписанием истечения
+
+    Баны хранятся как {telegram_id: момент окончания}, а min-куча по моменту окончания
+    позволяет снимать истёкшие баны без полного перебора.
+    """
+
+    def __init__(self):
+        self._expires: Dict[int, float] = {}
+        self._schedule: List[tuple] = []
+        self.synced_at = 0.0
+
+    @staticmethod
+    def _timestamp(expires_at) -> Optional[float]:
+        if expires_at is None:
+            return None
+        if isinstance(expires_at, datetime):
+            return expires_at.timestamp()
+        return float(expires_at)
+
+    def load(self, bans: Dict[int, float]):
+        """Полная замена содержимого: {telegram_id: timestamp окончания}"""
+        self._expires = dict(bans)
+        self._schedule = [(expires, user_id) for user_id, expires in self._expires.items()]
+        heapq.heapify(self._schedule)
+        self.synced_at = time.monotonic()
+        self._expire()
+
+    def add(self, user_id: int, expires_at):
+        expires = self._timestamp(expires_at)
+        if expires is None or expires <= time.time():
+            self._expires.pop(user_id, None)
+            return
+        self._expires[user_id] = expires
+        heapq.heappush(self._schedule, (expires, user_id))
+
+    def remove(self, user_id: int):
+        # Запись в куче остаётся и отбрасывается при истечении
+        self._expires.pop(user_id, None)
+
+    def _expire(self):
+        now = time.time()
+        while self._schedule and self._schedule[0][0] <= now:
+            expires, user_id = heapq.heappop(self._schedule)
+            if self._expires.get(user_id) == expires:
+                del self._expires[user_id]
+
+    def is_banned(self, user_id: int) -> bool:
+        self._expire()
+        return user_id in self._expires
+
+    def ids(self) -> List[int]:
+        """Отсортированный список ID активных банов (для параметра int8[])"""
+        self._expire()
+        return sorted(self._expires)
+
+    def __len__(self):
+        self._expire()
+        return len(self._expires)
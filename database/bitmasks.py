@@ -0,0 +1,54 @@
+from typing import Dict, Iterable, Optional
+
+import config.settings as settings
+
+# Битовое кодирование позиций и целей анкеты (profiles.positions_mask / goals_mask).
+# Бит 0 - значение 'any', далее значения в порядке объявления в settings.POSITIONS / settings.GOALS.
+# Новые значения добавлять только в конец словарей, иначе маски нужно пересчитать
+# (Database.recalculate_profile_masks).
+ANY_BIT = 1
+
+
+def _bit_map(values: Iterable[str]) -> Dict[str, int]:
+    return {value: 1 << (i + 1) for i, value in enumerate(values)}
+
+
+def position_bits(game: str) -> Dict[str, int]:
+    return _bit_map(settings.POSITIONS.get(game, {}))
+
+
+def goal_bits() -> Dict[str, int]:
+    return _bit_map(settings.GOALS)
+
+
+def encode_mask(items, bits: Dict[str, int]) -> int:
+    """Маска списка значений ('any' -> ANY_BIT, неизвестные значения игнорируются)"""
+    mask = 0
+    for item in items or []:
+        if item == 'any':
+            mask |= ANY_BIT
+        else:
+            mask |= bits.get(item, 0)
+    return mask
+
+
+def encode_positions(game: str, positions) -> int:
+    return encode_mask(positions, position_bits(game))
+
+
+def encode_goals(goals) -> int:
+    return encode_mask(goals, goal_bits())
+
+
+def position_filter_mask(game: str, position: Optional[str]) -> Optional[int]:
+    """Маска фильтра поиска по позиции: совпадение позиции или 'any' у кандидата"""
+    if not position or position == 'any':
+        return None
+    return position_bits(game).get(position, 0) | ANY_BIT
+
+
+def goal_filter_mask(goal: Optional[str]) -> Optional[int]:
+    """Маска фильтра поиска по цели (точное совпадение, без 'any')"""
+    if not goal or goal == 'any':
+        return None
+    return goal_bits().get(goal, 0)
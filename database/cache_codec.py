@@ -0,0 +1,183 @@
+import json
+import zlib
+import struct
+import logging
+from datetime import datetime, date, timezone, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack - опциональная зависимость, без неё кэш пишется в JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Формат бинарного значения: [версия кодека][флаги][payload]
+# Старые значения (JSON-текст) никогда не начинаются с байтов версий, поэтому читаются оба формата
+FLAG_COMPRESSED = 0x01
+
+# Типы msgpack-расширений
+EXT_DATETIME = 1      # naive datetime: микросекунды от 1970-01-01
+EXT_TABLE = 2         # список словарей с одинаковыми ключами: [ключи, [значения строк]]
+EXT_DATETIME_TZ = 3   # aware datetime: микросекунды UTC + смещение в минутах
+EXT_DATE = 4          # date: порядковый номер дня
+EXT_DECIMAL = 5       # Decimal: строка
+
+_EPOCH = datetime(1970, 1, 1)
+_EPOCH_UTC = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class JsonCodec:
+    """Исходный формат кэша: JSON-текст, datetime сериализуются строками"""
+
+    name = 'json'
+    version = None
+
+    def encode(self, data) -> bytes:
+        return json.dumps(data, default=str).encode()
+
+    def decode(self, payload: bytes):
+        text = payload.decode()
+        try:
+            return json.loads(text)
+        except Exception:
+            return text
+
+
+class BinaryCodec:
+    """msgpack с расширениями для дат и табличной упаковкой списков строк
+
+    Списки однотипных словарей (страницы поиска, лайки, мэтчи) хранят ключи один раз,
+    значения больше compress_threshold байт сжимаются zlib, если это даёт выигрыш.
+    """
+
+    name = 'binary'
+    version = 1
+
+    def __init__(self, compress_threshold: int = 512, compress_level: int = 1):
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+
+    # --- кодирование ---
+
+    def _default(self, obj):
+        if isinstance(obj, datetime):
+            if obj.tzinfo is None:
+                micros = (obj - _EPOCH) // timedelta(microseconds=1)
+                return msgpack.ExtType(EXT_DATETIME, struct.pack('>q', micros))
+            micros = (obj - _EPOCH_UTC) // timedelta(microseconds=1)
+            offset = int(obj.utcoffset().total_seconds() // 60)
+            return msgpack.ExtType(EXT_DATETIME_TZ, struct.pack('>qh', micros, offset))
+        if isinstance(obj, date):
+            return msgpack.ExtType(EXT_DATE, struct.pack('>i', obj.toordinal()))
+        if isinstance(obj, Decimal):
+            return msgpack.ExtType(EXT_DECIMAL, str(obj).encode())
+        if isinstance(obj, _Table):
+            return msgpack.ExtType(EXT_TABLE, self._packb([obj.keys, obj.rows]))
+        return str(obj)
+
+    def _tabulate(self, obj):
+        """Замена списков однотипных словарей на табличное представление"""
+        if isinstance(obj, dict):
+            return {key: self._tabulate(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            if len(obj) > 1 and all(isinstance(item, dict) for item in obj):
+                keys = list(obj[0])
+                if all(len(item) == len(keys) and all(k in item for k in keys) for item in obj):
+                    return _Table(keys, [[self._tabulate(item[k]) for k in keys] for item in obj])
+            return [self._tabulate(item) for item in obj]
+        return obj
+
+    def _packb(self, obj) -> bytes:
+        return msgpack.packb(obj, default=self._default, use_bin_type=True)
+
+    def encode(self, data) -> bytes:
+        payload = self._packb(self._tabulate(data))
+        flags = 0
+        if len(payload) > self.compress_threshold:
+            compressed = zlib.compress(payload, self.compress_level)
+            if len(compressed) < len(payload):
+                payload, flags = compressed, FLAG_COMPRESSED
+        return bytes((self.version, flags)) + payload
+
+    # --- декодирование ---
+
+    def _ext_hook(self, code: int, data: bytes):
+        if code == EXT_DATETIME:
+            return _EPOCH + timedelta(microseconds=struct.unpack('>q', data)[0])
+        if code == EXT_DATETIME_TZ:
+            micros, offset = struct.unpack('>qh', data)
+            return (_EPOCH_UTC + timedelta(microseconds=micros)).astimezone(timezone(timedelta(minutes=offset)))
+        if code == EXT_DATE:
+            return date.fromordinal(struct.unpack('>i', data)[0])
+        if code == EXT_DECIMAL:
+            return Decimal(data.decode())
+        if code == EXT_TABLE:
+            keys, rows = self._unpackb(data)
+            return [dict(zip(keys, row)) for row in rows]
+        return msgpack.ExtType(code, data)
+
+    def _unpackb(self, data: bytes):
+        return msgpack.unpackb(data, ext_hook=self._ext_hook, raw=False, strict_map_key=False)
+
+    def decode(self, payload: bytes):
+        flags, body = payload[1], payload[2:]
+        if flags & FLAG_COMPRESSED:
+            body = zlib.decompress(body)
+        return self._unpackb(body)
+
+
+class _Table:
+    __slots__ = ('keys', 'rows')
+
+    def __init__(self, keys, rows):
+        self.keys = keys
+        self.rows = rows
+
+
+class CacheSerializer:
+    """Запись через выбранный кодек, чтение любого поддерживаемого формата + учёт сэкономленных байт"""
+
+    SAMPLE_EVERY = 16  # размер JSON-эквивалента считается для каждой 16-й записи
+
+    def __init__(self, codec_name: str = 'binary'):
+        self._binary = BinaryCodec() if msgpack is not None else None
+        self._json = JsonCodec()
+        if codec_name == 'binary' and self._binary is None:
+            logger.warning("msgpack не установлен - кэш пишется в JSON")
+        self.codec = self._binary if codec_name == 'binary' and self._binary else self._json
+
+        self.writes = 0
+        self.bytes_written = 0
+        self._sampled_json = 0
+        self._sampled_encoded = 0
+
+    def dumps(self, data) -> bytes:
+        encoded = self.codec.encode(data)
+        self.writes += 1
+        self.bytes_written += len(encoded)
+        if self.codec is not self._json and self.writes % self.SAMPLE_EVERY == 0:
+            self._sampled_json += len(self._json.encode(data))
+            self._sampled_encoded += len(encoded)
+        return encoded
+
+    def loads(self, raw: Optional[Union[bytes, str]]):
+        if raw is None:
+            return None
+        if isinstance(raw, str):
+            raw = raw.encode()
+        if raw and self._binary is not None and raw[0] == self._binary.version:
+            return self._binary.decode(raw)
+        return self._json.decode(raw)
+
+    def stats(self) -> Dict[str, Union[int, float, str]]:
+        """Статистика записей; bytes_saved - оценка экономии относительно JSON по выборке"""
+        ratio = (1 - self._sampled_encoded / self._sampled_json) if self._sampled_json else 0.0
+        return {
+            'codec': self.codec.name,
+            'writes': self.writes,
+            'bytes_written': self.bytes_written,
+            'saved_ratio': round(ratio, 3),
+            'bytes_saved': int(self.bytes_written / (1 - ratio) - self.bytes_written) if ratio < 1 else 0,
+        }
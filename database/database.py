@@ -1,37 +1,113 @@
+import asyncio
 import asyncpg
 import redis.asyncio as redis
 import json
 import os
 import hashlib
 import logging
-from typing import List, Dict, Optional, Union
+import time
+from enum import Enum
+from typing import Callable, Iterable, List, Dict, Optional, Union
 from datetime import datetime, timedelta
 
+from database.search_index import SearchIndex
+from database.ban_registry import BanRegistry
+from database import bitmasks
+from database.local_cache import LocalCache
+from database.cache_codec import CacheSerializer
+from database.statements import StatementRegistry, HotConnection
+from database.activity_tracker import ActivityTracker
+from database.activity_counters import ActivityCounters
+from database.migrations import MigrationRunner
+from database.partitions import PartitionManager
+from database.skip_store import SkipBitmap
+from database.replica import ReplicaRouter, replica_dsn
+from database.pool_monitor import InstrumentedPool, PoolAutoscaler
+from database.metrics import METHOD_METRICS, record_backend, record_cache, render_simple
+import config.settings as settings
+
 logger = logging.getLogger(__name__)
 
+
+class LikeResult(str, Enum):
+    """Результат Database.add_like"""
+    DUPLICATE = 'duplicate'  # лайк этой анкете уже был
+    LIKE = 'like'            # новый лайк без взаимности
+    MATCH = 'match'          # новый лайк оказался взаимным - создан мэтч
+
+class TimedRedisConnection(redis.Connection):
+    """Соединение Redis, учитывающее ожидание ответов сервера во времени текущего метода Database"""
+
+    async def read_response(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().read_response(*args, **kwargs)
+        finally:
+            record_backend('redis', time.perf_counter() - started)
+
+
+@METHOD_METRICS.instrument(exclude=('init', 'close'))
 class Database:
     """Объединенный класс для работы с PostgreSQL + Redis с оптимизациями"""
     
     def __init__(self):
         self._pg_pool = None
+        self._replica_pool = None  # необязательная реплика для тяжёлых чтений (DB_REPLICA_HOST)
+        self._reads = None
+        self._pool_autoscaler = None  # адаптивный размер пула (DB_POOL_ADAPTIVE=true)
+        self._autoscaler_task = None
         self._redis = None
+        self._redis_raw = None  # клиент без decode_responses для бинарных значений кэша
+        self._exclusions_script = None  # Lua-скрипт атомарного обновления исключений поиска
+        self._cache_codec = CacheSerializer(os.getenv('CACHE_CODEC', 'binary').lower())
+        self._statements = StatementRegistry()
+        self._migrations = MigrationRunner()
+        self._partitions = PartitionManager()
+        self._register_statements()
         self._connection_retries = 3
+        self._search_index = SearchIndex() if (
+            SearchIndex.available() and os.getenv('SEARCH_INDEX', 'true').lower() == 'true'
+        ) else None
+        self._bans = BanRegistry()
+        self._activity = ActivityTracker()
+        self._activity_counters = None  # HLL-счётчики аудитории, создаются вместе с Redis
+        self._activity_task = None
         self._cache_ttl = {
             'user': 300,          # 5 минут для пользователей
             'profile': 600,       # 10 минут для профилей 
             'search': 180,        # 3 минуты для результатов поиска
             'matches': 900,       # 15 минут для мэтчей
-            'likes': 300          # 5 минут для лайков
+            'likes': 300,         # 5 минут для лайков
+            'search_snapshot': 1800,  # 30 минут для снапшота выдачи поиска
+            'exclusions': 3600,   # 1 час для множеств исключений поиска
+            'bans': 3600,         # 1 час для ZSET активных банов в Redis
+            'bans_sync': 60       # 1 минута между сверками банов в памяти с Redis
         }
+        # Локальный слой перед Redis: (максимум записей, TTL в секундах)
+        self._local_cache = LocalCache({
+            'user': (10000, 30),
+            'profile': (20000, 30),
+            'active_ads': (16, 60),
+        })
     
-    async def init(self):
-        """Инициализация подключений с улучшенной обработкой ошибок"""
+    async def init(self, apply_migrations: bool = True):
+        """Инициализация подключений с улучшенной обработкой ошибок
+
+        Args:
+            apply_migrations: применять неприменённые миграции схемы; при False устаревшая
+                схема - ошибка (фоновые процессы не берут DDL-блокировки на живых таблицах)
+        """
         logger.info("Начинаем инициализацию базы данных...")
         try:
-            await self._init_postgres()
+            await self._init_postgres(apply_migrations)
             logger.info("PostgreSQL инициализирован успешно")
             await self._init_redis()  
             logger.info("Redis инициализирован успешно")
+            if apply_migrations:
+                await self.sync_quality_scores()
+            self._activity_task = asyncio.create_task(self._activity_flush_loop())
+            if self._pool_autoscaler:
+                self._autoscaler_task = asyncio.create_task(self._pool_autoscaler.run())
             logger.info("✅ Database (PostgreSQL + Redis) готова")
         except Exception as e:
             logger.error(f"❌ Ошибка инициализации базы данных: {e}")
@@ -39,13 +115,24 @@ class Database:
 
     async def close(self):
         """Закрытие подключений"""
+        if self._activity_task:
+            self._activity_task.cancel()
+            self._activity_task = None
+        if self._autoscaler_task:
+            self._autoscaler_task.cancel()
+            self._autoscaler_task = None
         if self._pg_pool:
+            await self.flush_activity()
             await self._pg_pool.close()
+        if self._replica_pool:
+            await self._replica_pool.close()
         if self._redis:
             await self._redis.close()
+        if self._redis_raw:
+            await self._redis_raw.close()
         logger.info("Database закрыта")
 
-    async def _init_postgres(self):
+    async def _init_postgres(self, apply_migrations: bool = True):
         """Инициализация PostgreSQL с улучшенными настройками пула"""
         db_host = os.getenv('DB_HOST', 'localhost')
         db_port = os.getenv('DB_PORT', '5432')
@@ -58,17 +145,69 @@ class Database:
 
         connection_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
 
-        self._pg_pool = await asyncpg.create_pool(
-            connection_url, 
-            min_size=3,           # Минимум подключений
-            max_size=15,          # Максимум подключений
-            max_queries=50000,    # Максимум запросов на подключение
-            max_inactive_connection_lifetime=300.0,  # 5 минут жизни неактивных соединений
-            command_timeout=30.0, # 30 секунд таймаут на команду
-        )
-        await self._create_tables()
+        async def create_pool(min_size: int, max_size: int):
+            return await asyncpg.create_pool(
+                connection_url,
+                min_size=min_size,    # Минимум подключений
+                max_size=max_size,    # Максимум подключений
+                max_queries=50000,    # Максимум запросов на подключение
+                max_inactive_connection_lifetime=300.0,  # 5 минут жизни неактивных соединений
+                command_timeout=30.0, # 30 секунд таймаут на команду
+                connection_class=HotConnection,
+                init=self._statements.prepare_all,  # подготовка горячих запросов на каждом новом соединении
+            )
+
+        min_size = int(os.getenv('DB_POOL_MIN_SIZE', '3'))
+        max_size = int(os.getenv('DB_POOL_SIZE', '15'))
+        # Обёртка собирает ожидание acquire, занятость и удержание соединений по методам
+        self._pg_pool = InstrumentedPool('primary', await create_pool(min_size, max_size), create_pool)
+
+        if os.getenv('DB_POOL_ADAPTIVE', 'false').lower() == 'true':
+            self._pool_autoscaler = PoolAutoscaler(
+                self._pg_pool,
+                lower=int(os.getenv('DB_POOL_ADAPTIVE_MIN', '5')),
+                upper=int(os.getenv('DB_POOL_ADAPTIVE_MAX', '40')),
+                wait_target=int(os.getenv('DB_POOL_WAIT_TARGET_MS', '20')) / 1000,
+            )
+            logger.info(f"🔧 Адаптивный размер пула: {self._pool_autoscaler.lower}-{self._pool_autoscaler.upper}")
+        if await self._migrate(apply_migrations):
+            # Соединения, созданные до миграций, пересоздаются и готовят запросы по итоговой схеме
+            await self._pg_pool.expire_connections()
+        if apply_migrations:
+            await self.maintain_partitions()
+        await self._init_replica()
+        self._reads = ReplicaRouter(self._pg_pool, self._replica_pool)
         logger.info("✅ PostgreSQL подключена с оптимизированным пулом")
 
+    async def _init_replica(self):
+        """Пул реплики для аналитики и массовых выборок; без реплики всё читается с мастера"""
+        dsn = replica_dsn()
+        if not dsn:
+            return
+        try:
+            self._replica_pool = InstrumentedPool('replica', await asyncpg.create_pool(
+                dsn,
+                min_size=1,
+                max_size=int(os.getenv('DB_REPLICA_POOL_SIZE', '5')),
+                max_inactive_connection_lifetime=300.0,
+                command_timeout=60.0,  # аналитические запросы дольше интерактивных
+            ))
+            logger.info(f"✅ Реплика PostgreSQL подключена ({os.getenv('DB_REPLICA_HOST')})")
+        except Exception as e:
+            self._replica_pool = None
+            logger.warning(f"⚠️ Реплика PostgreSQL недоступна, чтения идут на мастер: {e}")
+
+    def read_connection(self, route: str):
+        """Соединение для тяжёлого чтения: реплика по REPLICA_ROUTES с учётом отставания, иначе мастер
+
+        Использование: async with db.read_connection('get_database_stats') as conn: ...
+        """
+        return self._reads.acquire(route)
+
+    def get_replica_stats(self) -> Dict:
+        """Чтения с реплики, откаты на мастер и последнее измеренное отставание"""
+        return self._reads.stats() if self._reads else {'enabled': False}
+
     async def _init_redis(self):
         """Инициализация Redis с connection pooling"""
         redis_host = os.getenv('REDIS_HOST', 'localhost')
@@ -84,7 +223,19 @@ class Database:
         self._redis = redis.from_url(
             redis_url,
             decode_responses=True,
-            max_connections=100,
+            connection_class=TimedRedisConnection,
+            max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', '100')),
+            retry_on_timeout=True,
+            socket_connect_timeout=10,
+            socket_timeout=30,
+            socket_keepalive=True,
+            socket_keepalive_options={}
+        )
+        self._redis_raw = redis.from_url(
+            redis_url,
+            decode_responses=False,
+            connection_class=TimedRedisConnection,
+            max_connections=int(os.getenv('REDIS_RAW_MAX_CONNECTIONS', '50')),
             retry_on_timeout=True,
             socket_connect_timeout=10,
             socket_timeout=30,
@@ -92,259 +243,218 @@ class Database:
             socket_keepalive_options={}
         )
         await self._redis.ping()
-        logger.info("✅ Redis подключен с connection pooling")
-
-    async def _create_tables(self):
-        """Создание таблиц с оптимизированными индексами"""
+        self._activity_counters = ActivityCounters(self._redis)
+        logger.info(f"✅ Redis подключен с connection pooling (кодек кэша: {self._cache_codec.codec.name})")
+
+    def _register_statements(self):
+        """Горячие запросы, которые готовятся на каждом соединении пула"""
+        register = self._statements.register
+        register('search', self._search_sql(self._SEARCH_COLUMNS))
+        register('search_ranking', self._search_sql(self._SEARCH_RANKING_COLUMNS))
+        register('get_user_profile', '''
+            SELECT p.*, u.username
+            FROM profiles p
+            LEFT JOIN users u ON p.telegram_id = u.telegram_id
+            WHERE p.telegram_id = $1 AND p.game = $2''')
+        register('get_user_profiles', '''
+            SELECT p.*, u.username
+            FROM profiles p
+            LEFT JOIN users u ON p.telegram_id = u.telegram_id
+            WHERE p.telegram_id = ANY($1::bigint[]) AND p.game = $2''')
+        register('register_like', "SELECT register_like($1, $2, $3, $4)")
+        register('get_likes_for_user', '''
+            SELECT l.from_user, l.message, l.created_at as like_created_at
+            FROM likes l
+            WHERE l.to_user = $1 AND l.game = $2
+            AND NOT EXISTS (
+                SELECT 1 FROM matches m
+                WHERE ((m.user1 = $1 AND m.user2 = l.from_user) OR
+                        (m.user1 = l.from_user AND m.user2 = $1))
+                AND m.game = $2
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM skipped_likes sl
+                WHERE sl.user_id = $1 AND sl.skipped_user_id = l.from_user AND sl.game = $2
+            )
+            ORDER BY l.created_at DESC''')
+        register('get_matches', '''
+            SELECT p.*, u.username
+            FROM profiles p
+            JOIN users u ON p.telegram_id = u.telegram_id
+            JOIN matches m ON (p.telegram_id = m.user1 OR p.telegram_id = m.user2)
+            WHERE (m.user1 = $1 OR m.user2 = $1)
+                AND p.telegram_id != $1
+                AND m.game = $2 AND p.game = $2
+            ORDER BY m.created_at DESC''')
+        # is_user_banned отвечает из памяти, в PostgreSQL ходит только сверка множества банов
+        register('active_bans', "SELECT user_id, expires_at FROM bans WHERE expires_at > CURRENT_TIMESTAMP")
+
+    def get_statement_stats(self) -> Dict[str, Dict[str, int]]:
+        """Число выполнений и подготовок каждого горячего запроса"""
+        return self._statements.stats()
+
+    async def _migrate(self, apply_migrations: bool) -> List[int]:
+        """Проверка версии схемы; DDL выполняется, только если есть неприменённые миграции"""
         async with self._pg_pool.acquire() as conn:
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    telegram_id BIGINT PRIMARY KEY,
-                    username TEXT,
-                    current_game TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS likes (
-                    id SERIAL PRIMARY KEY,
-                    from_user BIGINT,
-                    to_user BIGINT,
-                    game TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(from_user, to_user, game)
-                )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS matches (
-                    id SERIAL PRIMARY KEY,
-                    user1 BIGINT,
-                    user2 BIGINT,
-                    game TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user1, user2, game)
-                )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS skipped_likes (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT,
-                    skipped_user_id BIGINT,
-                    game TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, skipped_user_id, game)
-                )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS search_skipped (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT,
-                    skipped_user_id BIGINT,
-                    game TEXT,
-                    skip_count INTEGER DEFAULT 1,
-                    last_skipped TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(user_id, skipped_user_id, game)
+            version = await self._migrations.current_version(conn)
+            if version >= self._migrations.latest:
+                logger.info(f"✅ Схема БД актуальна (версия {version})")
+                return []
+            if not apply_migrations:
+                raise RuntimeError(
+                    f"Схема БД устарела: версия {version}, требуется {self._migrations.latest}. "
+                    f"Запустите бота или utils/scripts/migrate.py"
                 )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS reports (
-                    id SERIAL PRIMARY KEY,
-                    reporter_id BIGINT,
-                    reported_user_id BIGINT,
-                    game TEXT,
-                    report_reason TEXT DEFAULT 'inappropriate_content',
-                    status TEXT DEFAULT 'pending',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    reviewed_at TIMESTAMP,
-                    admin_id BIGINT,
-                    UNIQUE(reporter_id, reported_user_id, game)
-                )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS bans (
-                    id SERIAL PRIMARY KEY,
-                    user_id BIGINT UNIQUE,
-                    reason TEXT DEFAULT 'нарушение правил',
-                    expires_at TIMESTAMP,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS profiles (
-                    id SERIAL PRIMARY KEY,
-                    telegram_id BIGINT,
-                    game TEXT,
-                    name TEXT,
-                    nickname TEXT,
-                    age INTEGER,
-                    rating TEXT,
-                    region TEXT DEFAULT 'eeu',
-                    positions JSONB DEFAULT '[]'::jsonb,
-                    goals JSONB DEFAULT '["any"]'::jsonb,
-                    additional_info TEXT,
-                    photo_id TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(telegram_id, game)
-                )
-            ''')
-
-            await conn.execute('''
-                CREATE TABLE IF NOT EXISTS ad_posts (
-                    id SERIAL PRIMARY KEY,
-                    message_id BIGINT NOT NULL,
-                    chat_id BIGINT NOT NULL,
-                    caption TEXT,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    created_by BIGINT,
-                    show_interval INTEGER DEFAULT 3,
-                    games TEXT[] DEFAULT ARRAY['dota', 'cs']::TEXT[]
-                )
-            ''')
-
-            optimized_indexes = [
-                # === ОСНОВНЫЕ ИНДЕКСЫ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game ON profiles(game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_telegram_id_game ON profiles(telegram_id, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_current_game ON users(current_game)",
-
-                # === ИНДЕКСЫ ДЛЯ ЛАЙКОВ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_to_game ON likes(to_user, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_from_game ON likes(from_user, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_from_to_game ON likes(from_user, to_user, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_created_at_desc ON likes(created_at DESC)",
-
-                # === ИНДЕКСЫ ДЛЯ МЭТЧЕЙ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_user1_game ON matches(user1, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_user2_game ON matches(user2, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_users_game ON matches(user1, user2, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_created_at_desc ON matches(created_at DESC)",
-
-                # === ИНДЕКСЫ ДЛЯ ПОИСКА ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game_rating ON profiles(game, rating)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game_region ON profiles(game, region)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game_active ON profiles(game, telegram_id) WHERE telegram_id IS NOT NULL",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_goals_gin ON profiles USING gin (goals)",
-
-                # === GIN ИНДЕКС ДЛЯ ПОЗИЦИЙ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_positions_gin ON profiles USING gin (positions)",
-
-                # === СОСТАВНЫЕ ИНДЕКСЫ ДЛЯ СЛОЖНЫХ ЗАПРОСОВ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_search_composite ON profiles(game, rating, region) WHERE telegram_id IS NOT NULL",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_mutual_check ON likes(to_user, from_user, game)",
-
-                # === ИНДЕКСЫ ДЛЯ ПРОПУСКОВ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_search_skipped_user_game ON search_skipped(user_id, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_skipped_likes_user_game ON skipped_likes(user_id, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_search_skipped_composite ON search_skipped(user_id, skipped_user_id, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_skipped_likes_composite ON skipped_likes(user_id, skipped_user_id, game)",
-
-                # === ИНДЕКСЫ ДЛЯ ОТЧЕТОВ И БАНОВ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reports_status ON reports(status)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reports_reported_user_game ON reports(reported_user_id, game)",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reports_created_at_desc ON reports(created_at DESC) WHERE status = 'pending'",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bans_user_expires ON bans(user_id, expires_at)",
-
-                # === ЧАСТИЧНЫЕ ИНДЕКСЫ ДЛЯ АКТИВНЫХ ЗАПИСЕЙ ===
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_active_with_photo ON profiles(game, telegram_id) WHERE photo_id IS NOT NULL",
-                "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_updated_at ON profiles(updated_at)"
-            ]
+            applied = await self._migrations.run(self, conn)
+        logger.info(f"✅ Схема БД обновлена до версии {self._migrations.latest} (применено: {applied})")
+        return applied
 
-            try:
-                await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS goals JSONB DEFAULT '[\"any\"]'::jsonb")
-                await conn.execute("UPDATE profiles SET goals = '[\"any\"]'::jsonb WHERE goals IS NULL")
-            except Exception as e:
-                logger.warning(f"Миграция поля goals: {e}")
-
-            try:
-                await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS profile_url TEXT")
-            except Exception as e:
-                logger.warning(f"Миграция поля profile_url: {e}")
-
-            try:
-                await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
-                await conn.execute("UPDATE profiles SET updated_at = created_at WHERE updated_at IS NULL")
-                logger.info("✅ Миграция: добавлена колонка updated_at в profiles")
-            except Exception as e:
-                logger.warning(f"Миграция поля updated_at: {e}")
+    async def maintain_partitions(self) -> Dict[str, Dict[str, List[str]]]:
+        """Создание партиций на месяцы вперёд и удаление партиций старше срока хранения
 
-            try:
-                await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS role TEXT DEFAULT 'player'")
-                await conn.execute("UPDATE profiles SET role = 'player' WHERE role IS NULL")
-                logger.info("✅ Миграция: добавлена колонка role в profiles")
-            except Exception as e:
-                logger.warning(f"Миграция поля role: {e}")
-
-            try:
-                await conn.execute("ALTER TABLE likes ADD COLUMN IF NOT EXISTS message TEXT")
-                logger.info("✅ Миграция: добавлена колонка message в likes")
-            except Exception as e:
-                logger.warning(f"Миграция поля message: {e}")
-
-            try:
-                await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS games TEXT[] DEFAULT ARRAY['dota', 'cs']::TEXT[]")
-                logger.info("✅ Миграция: добавлена колонка games в ad_posts")
-            except Exception as e:
-                logger.warning(f"Миграция поля games: {e}")
-
-            try:
-                await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS regions TEXT[] DEFAULT ARRAY['all']::TEXT[]")
-                logger.info("✅ Миграция: добавлена колонка regions в ad_posts")
-            except Exception as e:
-                logger.warning(f"Миграция поля regions: {e}")
-
-            try:
-                await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS ad_type TEXT DEFAULT 'forward'")
-                logger.info("✅ Миграция: добавлена колонка ad_type в ad_posts")
-            except Exception as e:
-                logger.warning(f"Миграция поля ad_type: {e}")
+        Срок хранения append-only таблиц соблюдается DROP целой партиции вместо DELETE
+        по строкам: без мёртвых кортежей и нагрузки на VACUUM.
+        """
+        try:
+            async with self._pg_pool.acquire() as conn:
+                report = await self._partitions.maintain(conn)
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания партиций: {e}")
+            return {}
+
+        for table, changes in report.items():
+            if changes['created']:
+                logger.info(f"🗂 {table}: созданы партиции {', '.join(changes['created'])}")
+            if changes['dropped']:
+                logger.info(f"🗑 {table}: удалены устаревшие партиции {', '.join(changes['dropped'])}")
+        return report
+
+    @staticmethod
+    def _default_avatar_file_ids() -> List[Optional[str]]:
+        """Закэшированные file_id дефолтных аватарок по играм (None - ещё не загружена)"""
+        return [settings.get_cached_photo_id(f'avatar_{game}') for game in sorted(settings.DEFAULT_AVATARS)]
+
+    def _default_avatar_ids(self) -> Optional[str]:
+        """file_id дефолтных аватарок одной строкой; None, пока закэшированы не все"""
+        ids = self._default_avatar_file_ids()
+        return ','.join(ids) if all(ids) else None
+
+    def _known_default_avatars(self) -> List[str]:
+        """Уже закэшированные file_id дефолтных аватарок - параметр text[] для _quality_score_sql"""
+        return [file_id for file_id in self._default_avatar_file_ids() if file_id]
+
+    async def _backfill_quality_scores(self, conn, only_missing: bool = True) -> int:
+        """Пересчёт profiles.quality_score (по умолчанию только для анкет без скора)
+
+        Пока file_id дефолтных аватарок неизвестны, стандартное фото не отличить от своего,
+        поэтому пересчёт откладывается до sync_quality_scores (скор остаётся NULL).
+        """
+        if self._default_avatar_ids() is None:
+            logger.info("file_id дефолтных аватарок ещё не закэшированы - пересчёт quality_score отложен")
+            return 0
 
-            try:
-                await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP")
-                logger.info("✅ Миграция: добавлена колонка expires_at в ad_posts")
-            except Exception as e:
-                logger.warning(f"Миграция поля expires_at: {e}")
+        query = f"UPDATE profiles SET quality_score = {self._quality_score_sql(lambda name: name, '$1::text[]')}"
+        if only_missing:
+            query += " WHERE quality_score IS NULL"
 
-            try:
-                await conn.execute("ALTER TABLE reports ADD COLUMN IF NOT EXISTS report_message TEXT")
-                logger.info("✅ Миграция: добавлена колонка report_message в reports")
-            except Exception as e:
-                logger.warning(f"Миграция поля report_message: {e}")
+        status = await conn.execute(query, self._known_default_avatars())
+        return int(status.split()[-1])
 
-            try:
-                await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS gender TEXT")
-                logger.info("✅ Миграция: добавлена колонка gender в profiles")
-            except Exception as e:
-                logger.warning(f"Миграция поля gender: {e}")
+    async def recalculate_quality_scores(self) -> int:
+        """Полный пересчёт скоров заполненности (например, после смены дефолтных аватарок)"""
+        async with self._pg_pool.acquire() as conn:
+            count = await self._backfill_quality_scores(conn, only_missing=False)
+        if count:
+            await self.invalidate_search_cache()
+            if self._search_index:
+                self._search_index.mark_stale()
+        logger.info(f"Пересчитан quality_score для {count} анкет")
+        return count
+
+    async def sync_quality_scores(self) -> int:
+        """Пересчёт quality_score после того, как file_id дефолтных аватарок закэшированы или сменились
+
+        Набор file_id, по которому считались скоры, хранится в Redis: при его изменении
+        пересчитываются все анкеты, иначе - только оставшиеся без скора.
+        """
+        avatar_ids = self._default_avatar_ids()
+        if avatar_ids is None:
+            return 0
 
-            try:
-                await conn.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_activity TIMESTAMP")
-                logger.info("✅ Миграция: добавлена колонка last_activity в users")
-            except Exception as e:
-                logger.warning(f"Миграция поля last_activity: {e}")
+        key = "quality_score:avatars"
+        try:
+            if await self._redis.get(key) != avatar_ids:
+                count = await self.recalculate_quality_scores()
+                await self._redis.set(key, avatar_ids)
+                return count
 
-            try:
-                await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT TRUE")
-                await conn.execute("UPDATE profiles SET is_active = TRUE WHERE is_active IS NULL")
-                logger.info("✅ Миграция: добавлена колонка is_active в profiles")
-            except Exception as e:
-                logger.warning(f"Миграция поля is_active: {e}")
+            async with self._pg_pool.acquire() as conn:
+                count = await self._backfill_quality_scores(conn)
+            if count:
+                await self.invalidate_search_cache()
+                if self._search_index:
+                    self._search_index.mark_stale()
+                logger.info(f"quality_score посчитан для {count} анкет без скора")
+            return count
+        except Exception as e:
+            logger.error(f"Ошибка пересчёта quality_score: {e}")
+            return 0
+
+    async def _backfill_profile_masks(self, conn, only_missing: bool = True) -> int:
+        """Пересчёт битовых масок позиций и целей (по умолчанию только для анкет без масок)"""
+        query = "SELECT id, game, positions, goals FROM profiles"
+        if only_missing:
+            query += " WHERE positions_mask IS NULL OR goals_mask IS NULL"
+
+        rows = await conn.fetch(query)
+        if not rows:
+            return 0
+
+        updates = []
+        for row in rows:
+            profile = self._format_profile(row)
+            updates.append((
+                bitmasks.encode_positions(row['game'], profile['positions']),
+                bitmasks.encode_goals(profile['goals']),
+                row['id']
+            ))
+        await conn.executemany(
+            "UPDATE profiles SET positions_mask = $1, goals_mask = $2 WHERE id = $3", updates
+        )
+        return len(updates)
 
-            for index_sql in optimized_indexes:
-                try:
-                    await conn.execute(index_sql)
-                except Exception as e:
-                    index_name = index_sql.split("idx_")[1].split(" ")[0] if "idx_" in index_sql else "unknown"
-                    logger.warning(f"Индекс {index_name} уже существует или ошибка: {e}")
+    async def recalculate_profile_masks(self) -> int:
+        """Полный пересчёт масок (после изменения settings.POSITIONS / settings.GOALS)"""
+        async with self._pg_pool.acquire() as conn:
+            count = await self._backfill_profile_masks(conn, only_missing=False)
+        await self.invalidate_search_cache()
+        if self._search_index:
+            self._search_index.mark_stale()
+        logger.info(f"Пересчитаны маски позиций и целей для {count} анкет")
+        return count
+
+    @staticmethod
+    def _quality_score_sql(field: Callable[[str], str], default_avatars: str) -> str:
+        """SQL-выражение скора заполненности анкеты для ранжирования в поиске (profiles.quality_score)
+
+        Единственное место с правилами скора: его используют все записи анкеты и пересчёт.
+        Заполненные поля дают по 4 балла (описание длиннее 20 символов - 8), кастомное фото +8.
+        field(name) - SQL-значение поля (колонка или параметр с новым значением),
+        default_avatars - выражение text[] с file_id дефолтных аватарок.
+        """
+        def filled_list(name: str) -> str:
+            value = field(name)
+            return (f"(CASE WHEN jsonb_typeof({value}) = 'array'"
+                    f" THEN jsonb_array_length({value}) > 0 AND NOT {value} ? 'any' ELSE false END)")
+
+        return f"""(4 * (
+                (COALESCE({field('rating')}, '') NOT IN ('', 'any'))::int
+                + {filled_list('positions')}::int
+                + (COALESCE({field('region')}, '') NOT IN ('', 'any'))::int
+                + {filled_list('goals')}::int
+                + 2 * (length(btrim(COALESCE({field('additional_info')}, ''), E' \\t\\n\\r')) > 20)::int
+                + (btrim(COALESCE({field('profile_url')}, ''), E' \\t\\n\\r') <> '')::int
+            ) + 8 * (COALESCE({field('photo_id')}, '') <> '' AND {field('photo_id')} <> ALL({default_avatars}))::int)"""
 
     def _format_profile(self, row) -> Dict:
         """Форматирование профиля с кэшированием"""
@@ -387,29 +497,78 @@ class Database:
 
     # === ОПТИМИЗИРОВАННОЕ КЭШИРОВАНИЕ ===
 
+    def _decode_cache(self, raw):
+        try:
+            return self._cache_codec.loads(raw)
+        except Exception as e:
+            logger.warning(f"Ошибка декодирования значения кэша: {e}")
+            return None
+
     async def _get_cache(self, key: str):
         try:
-            raw = await self._redis.get(key)
+            raw = await self._redis_raw.get(key)
         except Exception as e:
             logger.warning(f"Redis get error for {key}: {e}")
+            record_cache(False)
             return None
-        if raw is None:
-            return None
-        if isinstance(raw, bytes):
-            raw = raw.decode()
+        record_cache(raw is not None)
+        return self._decode_cache(raw)
+
+    async def _get_cache_many(self, keys: List[str]) -> Dict[str, object]:
+        """Чтение нескольких ключей одним MGET (отсутствующих ключей нет в результате)"""
+        if not keys:
+            return {}
         try:
-            return json.loads(raw)
-        except Exception:
-            return raw
+            values = await self._redis_raw.mget(keys)
+        except Exception as e:
+            logger.warning(f"Redis mget error for {len(keys)} keys: {e}")
+            record_cache(False)
+            return {}
+        found = {key: self._decode_cache(raw) for key, raw in zip(keys, values) if raw is not None}
+        record_cache(len(found) == len(keys))
+        return found
+
 
+    async def _set_cache(self, key: str, data, ttl: int = 600, index: str = None):
+        """Сохранение в кэш с обработкой ошибок
 
-    async def _set_cache(self, key: str, data, ttl: int = 600):
-        """Сохранение в кэш с обработкой ошибок"""
+        index - множество, в котором запоминается ключ (для ключей с нефиксированным
+        суффиксом, которые иначе пришлось бы искать SCAN-ом при инвалидации)
+        """
         try:
-            await self._redis.setex(key, ttl, json.dumps(data, default=str))
+            value = self._cache_codec.dumps(data)
+            if index is None:
+                await self._redis.setex(key, ttl, value)
+                return
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.setex(key, ttl, value)
+                pipe.sadd(index, key)
+                pipe.expire(index, ttl)
+                await pipe.execute()
         except Exception as e:
             logger.warning(f"Ошибка записи в кэш {key}: {e}")
 
+    async def _set_cache_many(self, entries: Dict[str, tuple]):
+        """Запись нескольких ключей одним пайплайном: {key: (data, ttl)}"""
+        if not entries:
+            return
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for key, (data, ttl) in entries.items():
+                    pipe.setex(key, ttl, self._cache_codec.dumps(data))
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Ошибка записи в кэш {len(entries)} ключей: {e}")
+
+    async def _delete_cache(self, *keys: str):
+        """Удаление нескольких ключей одной командой DEL"""
+        if not keys:
+            return
+        try:
+            await self._redis.delete(*keys)
+        except Exception as e:
+            logger.warning(f"Ошибка удаления ключей кэша {keys}: {e}")
+
     async def _delete_keys_batched(self, pattern: str):
         cursor = 0
         while True:
@@ -419,33 +578,92 @@ class Database:
             if cursor == 0:
                 break
 
+    def _user_cache_keys(self, user_id: int, *namespaces: str) -> List[str]:
+        """Детерминированные ключи кэша пользователя по играм (profile/matches/likes)"""
+        return [f"{namespace}:{user_id}:{game}" for namespace in namespaces for game in settings.GAMES]
+
+    def _search_keys_index(self, user_id: int, game: str) -> str:
+        return f"cache_keys:search:{user_id}:{game}"
+
+    async def _delete_cache_keys(self, keys: List[str], indexes: List[str] = ()):
+        """Удаление ключей и всех ключей из множеств-индексов (не более двух обращений к Redis)"""
+        keys = list(keys)
+        if indexes:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for index in indexes:
+                    pipe.smembers(index)
+                for members in await pipe.execute():
+                    keys.extend(members)
+            keys.extend(indexes)
+        await self._delete_cache(*keys)
+
     async def _clear_user_cache(self, user_id: int):
+        self._local_cache.invalidate('user', user_id)
+        for game in settings.GAMES:
+            self._local_cache.invalidate('profile', (user_id, game))
         try:
-            patterns = [
-                f"user:{user_id}*",
-                f"profile:{user_id}:*",
-                f"search:{user_id}:*",
-                f"matches:{user_id}:*",
-                f"likes:{user_id}:*"
-            ]
-            for pattern in patterns:
-                await self._delete_keys_batched(pattern)
+            await self._delete_cache_keys(
+                [f"user:{user_id}"] + self._user_cache_keys(user_id, 'profile', 'matches', 'likes'),
+                [self._search_keys_index(user_id, game) for game in settings.GAMES]
+            )
         except Exception as e:
             logger.error(f"Ошибка очистки кэша пользователя {user_id}: {e}")
 
+    async def _clear_user_search_cache(self, user_id: int, game: str):
+        try:
+            await self._delete_cache_keys([], [self._search_keys_index(user_id, game)])
+        except Exception as e:
+            logger.warning(f"Ошибка очистки кэша поиска {user_id}/{game}: {e}")
+
+    async def _clear_user_namespaces(self, user_id: int, *namespaces: str):
+        try:
+            await self._delete_cache_keys(self._user_cache_keys(user_id, *namespaces))
+        except Exception as e:
+            logger.warning(f"Ошибка очистки кэша {namespaces} пользователя {user_id}: {e}")
+
     async def _clear_pattern_cache(self, pattern: str):
         try:
             await self._delete_keys_batched(pattern)
         except Exception as e:
             logger.warning(f"Ошибка очистки кэша по паттерну {pattern}: {e}")
 
+    # Поколения кэша: счётчик gen:{namespace} входит в ключи пространства имён,
+    # широкая инвалидация - один INCR, устаревшие ключи истекают по TTL
+
+    async def _cache_generation(self, namespace: str) -> int:
+        try:
+            value = await self._redis.get(f"gen:{namespace}")
+            return int(value) if value else 0
+        except Exception as e:
+            logger.warning(f"Ошибка чтения поколения кэша {namespace}: {e}")
+            return 0
+
+    async def _bump_cache_generation(self, *namespaces: str):
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for namespace in namespaces:
+                    pipe.incr(f"gen:{namespace}")
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Ошибка инвалидации поколений кэша {namespaces}: {e}")
+
+    async def invalidate_search_cache(self, game: str = None):
+        """Инвалидация кэша результатов поиска игры (или всех игр)"""
+        games = [game] if game else list(settings.GAMES)
+        await self._bump_cache_generation(*(f"search:{g}" for g in games))
+
     # === ПОЛЬЗОВАТЕЛИ ===
 
     async def get_user(self, telegram_id: int) -> Optional[Dict]:
-        """Получение пользователя с кэшированием"""
+        """Получение пользователя с кэшированием (память процесса -> Redis -> PostgreSQL)"""
+        local = self._local_cache.get('user', telegram_id)
+        if local:
+            return local
+
         cache_key = f"user:{telegram_id}"
         cached = await self._get_cache(cache_key)
         if cached:
+            self._local_cache.set('user', telegram_id, cached)
             return cached
 
         async with self._pg_pool.acquire() as conn:
@@ -454,6 +672,7 @@ class Database:
 
             if result:
                 await self._set_cache(cache_key, result, self._cache_ttl['user'])
+                self._local_cache.set('user', telegram_id, result)
 
             return result
 
@@ -472,14 +691,17 @@ class Database:
     async def create_user(self, telegram_id: int, username: str, game: str) -> bool:
         """Создание или обновление пользователя"""
         async with self._pg_pool.acquire() as conn:
-            await conn.execute(
+            inserted = await conn.fetchval(
                 """INSERT INTO users (telegram_id, username, current_game)
                    VALUES ($1, $2, $3)
                    ON CONFLICT (telegram_id)
-                   DO UPDATE SET username = $2, current_game = $3""",
+                   DO UPDATE SET username = $2, current_game = $3
+                   RETURNING (xmax = 0)""",
                 telegram_id, username, game
             )
             await self._clear_user_cache(telegram_id)
+            if inserted and self._activity_counters:
+                await self._activity_counters.record_new([telegram_id])
             return True
 
     async def switch_game(self, telegram_id: int, game: str) -> bool:
@@ -495,28 +717,67 @@ class Database:
     # === ПРОФИЛИ ===
 
     async def get_user_profile(self, telegram_id: int, game: str) -> Optional[Dict]:
-        """Получение профиля пользователя с кэшированием"""
+        """Получение профиля пользователя с кэшированием (память процесса -> Redis -> PostgreSQL)"""
+        local = self._local_cache.get('profile', (telegram_id, game))
+        if local:
+            return local
+
         cache_key = f"profile:{telegram_id}:{game}"
         cached = await self._get_cache(cache_key)
         if cached:
+            self._local_cache.set('profile', (telegram_id, game), cached)
             return cached
 
         async with self._pg_pool.acquire() as conn:
-            row = await conn.fetchrow(
-                '''SELECT p.*, u.username
-                   FROM profiles p
-                   LEFT JOIN users u ON p.telegram_id = u.telegram_id
-                   WHERE p.telegram_id = $1 AND p.game = $2''',
-                telegram_id, game
-            )
+            row = await self._statements.fetchrow(conn, 'get_user_profile', telegram_id, game)
 
             if row:
                 profile = self._format_profile(row)
                 await self._set_cache(cache_key, profile, self._cache_ttl['profile'])
+                self._local_cache.set('profile', (telegram_id, game), profile)
                 return profile
 
             return None
 
+    async def get_user_profiles(self, telegram_ids: List[int], game: str) -> Dict[int, Dict]:
+        """Пакетное получение профилей: память процесса -> один MGET -> один запрос
+        с ANY($1) для промахов -> дозапись кэша одним пайплайном
+
+        Returns:
+            {telegram_id: профиль}; ID без анкеты в этой игре в результат не попадают
+        """
+        profiles = {}
+        missing = []
+        for telegram_id in dict.fromkeys(telegram_ids):
+            local = self._local_cache.get('profile', (telegram_id, game))
+            if local:
+                profiles[telegram_id] = local
+            else:
+                missing.append(telegram_id)
+
+        if missing:
+            cached = await self._get_cache_many([f"profile:{telegram_id}:{game}" for telegram_id in missing])
+            for telegram_id in missing:
+                profile = cached.get(f"profile:{telegram_id}:{game}")
+                if profile:
+                    profiles[telegram_id] = profile
+                    self._local_cache.set('profile', (telegram_id, game), profile)
+            missing = [telegram_id for telegram_id in missing if telegram_id not in profiles]
+
+        if missing:
+            async with self._pg_pool.acquire() as conn:
+                rows = await self._statements.fetch(conn, 'get_user_profiles', missing, game)
+            loaded = {row['telegram_id']: self._format_profile(row) for row in rows}
+            await self._set_cache_many({
+                f"profile:{telegram_id}:{game}": (profile, self._cache_ttl['profile'])
+                for telegram_id, profile in loaded.items()
+            })
+            for telegram_id, profile in loaded.items():
+                self._local_cache.set('profile', (telegram_id, game), profile)
+            profiles.update(loaded)
+
+        return profiles
+
     async def has_profile(self, telegram_id: int, game: str) -> bool:
         """Проверка наличия профиля с кэшированием"""
         profile = await self.get_user_profile(telegram_id, game)
@@ -529,6 +790,15 @@ class Database:
                                  role: str = 'player', gender: str = None):
         """Создание или обновление профиля пользователя"""
 
+        # Скор считается в запросе по новым значениям полей; $15 - file_id дефолтных аватарок
+        values = {
+            'rating': '$6', 'region': '$7', 'positions': '$8::jsonb', 'goals': '$9::jsonb',
+            'additional_info': '$10', 'photo_id': '$11', 'profile_url': '$12'
+        }
+        quality_score = self._quality_score_sql(values.__getitem__, '$15::text[]')
+        positions_mask = bitmasks.encode_positions(game, positions)
+        goals_mask = bitmasks.encode_goals(goals)
+
         async with self._pg_pool.acquire() as conn:
             try:
                 # Проверяем существует ли профиль
@@ -540,25 +810,30 @@ class Database:
                 if existing:
                     # ОБНОВЛЕНИЕ существующего профиля (БЕЗ username)
                     await conn.execute(
-                        '''UPDATE profiles
+                        f'''UPDATE profiles
                            SET name = $3, nickname = $4, age = $5, rating = $6, region = $7,
                                positions = $8, goals = $9, additional_info = $10, photo_id = $11,
-                               profile_url = $12, role = $13, gender = $14, updated_at = NOW()
+                               profile_url = $12, role = $13, gender = $14, quality_score = {quality_score},
+                               positions_mask = $16, goals_mask = $17, updated_at = NOW()
                            WHERE telegram_id = $1 AND game = $2''',
                         telegram_id, game, name, nickname, age, rating, region,
                         json.dumps(positions), json.dumps(goals), additional_info,
-                        photo_id, profile_url, role, gender
+                        photo_id, profile_url, role, gender, self._known_default_avatars(),
+                        positions_mask, goals_mask
                     )
                 else:
                     # СОЗДАНИЕ нового профиля (БЕЗ username)
                     await conn.execute(
-                        '''INSERT INTO profiles
+                        f'''INSERT INTO profiles
                            (telegram_id, game, name, nickname, age, rating, region, positions, goals,
-                            additional_info, photo_id, profile_url, role, gender, created_at, updated_at)
-                           VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, NOW(), NOW())''',
+                            additional_info, photo_id, profile_url, role, gender, quality_score,
+                            positions_mask, goals_mask, created_at, updated_at)
+                           VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, {quality_score},
+                                   $16, $17, NOW(), NOW())''',
                         telegram_id, game, name, nickname, age, rating, region,
                         json.dumps(positions), json.dumps(goals), additional_info,
-                        photo_id, profile_url, role, gender
+                        photo_id, profile_url, role, gender, self._known_default_avatars(),
+                        positions_mask, goals_mask
                     )
 
                 # Если передан username, обновляем его в таблице users
@@ -573,8 +848,7 @@ class Database:
 
                 # Инвалидация кэша
                 await self._clear_user_cache(telegram_id)
-                await self._clear_pattern_cache(f"search:*:{game}:*")
-                await self._clear_pattern_cache(f"profile:*:{game}")
+                await self.invalidate_search_cache(game)
 
                 logger.info(f"Профиль обновлён: {telegram_id} в {game}, роль: {role}")
                 return True
@@ -583,19 +857,152 @@ class Database:
                 logger.error(f"Ошибка обновления профиля: {e}")
                 return False
 
+    # Поля анкеты, которые можно менять через update_profile_fields
+    _PROFILE_FIELDS = frozenset({
+        'name', 'nickname', 'age', 'rating', 'region', 'positions', 'goals',
+        'additional_info', 'photo_id', 'profile_url', 'role', 'gender'
+    })
+    # Поля, входящие в quality_score (_quality_score_sql)
+    _QUALITY_FIELDS = frozenset({
+        'rating', 'region', 'positions', 'goals', 'additional_info', 'profile_url', 'photo_id'
+    })
+    # Поля, влияющие на фильтры и ранжирование поиска; имя, ник и возраст выдачу не меняют
+    _SEARCH_FIELDS = _QUALITY_FIELDS | {'role', 'gender'}
+
+    async def update_profile_fields(self, telegram_id: int, game: str, **changes) -> Optional[Dict]:
+        """Частичное обновление анкеты: один UPDATE только изменённых колонок с RETURNING
+
+        quality_score и маски позиций/целей пересчитываются вместе с полями, от которых зависят.
+        Результат записывается в кэш профиля; кэш поиска игры инвалидируется, только если
+        изменилось поле из _SEARCH_FIELDS.
+
+        Returns:
+            обновлённый профиль или None, если анкеты нет
+        """
+        unknown = set(changes) - self._PROFILE_FIELDS
+        if unknown:
+            raise ValueError(f"Неизвестные поля анкеты: {', '.join(sorted(unknown))}")
+        if not changes:
+            return await self.get_user_profile(telegram_id, game)
+
+        columns = dict(changes)
+        if 'positions' in changes:
+            columns['positions_mask'] = bitmasks.encode_positions(game, changes['positions'])
+            columns['positions'] = json.dumps(changes['positions'])
+        if 'goals' in changes:
+            columns['goals_mask'] = bitmasks.encode_goals(changes['goals'])
+            columns['goals'] = json.dumps(changes['goals'])
+
+        placeholders = {column: f"${i}" for i, column in enumerate(columns, start=3)}
+        params = list(columns.values())
+        assignments = [f"{column} = {placeholder}" for column, placeholder in placeholders.items()]
+        if self._QUALITY_FIELDS & changes.keys():
+            # Скор считается в том же UPDATE по итоговым значениям: новые - из параметров,
+            # остальные - из текущей строки (правые части SET видят строку до обновления)
+            def field(name: str) -> str:
+                if name not in placeholders:
+                    return name
+                return f"{placeholders[name]}::jsonb" if name in ('positions', 'goals') else placeholders[name]
+
+            params.append(self._known_default_avatars())
+            avatars = f"${len(params) + 2}::text[]"
+            assignments.append(f"quality_score = {self._quality_score_sql(field, avatars)}")
+        assignments = ', '.join(assignments)
+
+        async with self._pg_pool.acquire() as conn:
+            row = await conn.fetchrow(
+                f'''WITH updated AS (
+                       UPDATE profiles SET {assignments}, updated_at = NOW()
+                       WHERE telegram_id = $1 AND game = $2
+                       RETURNING *
+                   )
+                   SELECT updated.*, u.username
+                   FROM updated
+                   LEFT JOIN users u ON updated.telegram_id = u.telegram_id''',
+                telegram_id, game, *params
+            )
+        if not row:
+            return None
+
+        profile = self._format_profile(row)
+
+        await self._set_cache(f"profile:{telegram_id}:{game}", profile, self._cache_ttl['profile'])
+        self._local_cache.set('profile', (telegram_id, game), profile)
+        if self._SEARCH_FIELDS & changes.keys():
+            await self.invalidate_search_cache(game)
+
+        logger.info(f"Профиль обновлён: {telegram_id} в {game}, поля: {', '.join(changes)}")
+        return profile
+
     async def update_user_activity(self, user_id: int) -> bool:
-        """Обновление времени последней активности пользователя"""
+        """Отметка активности пользователя: запись в users.last_activity уходит пачкой
+        (flush_activity), там же реактивируются деактивированные анкеты"""
+        self._activity.touch(user_id)
+        return True
+
+    async def flush_activity(self) -> int:
+        """Сброс накопленных касаний одним UPDATE ... FROM unnest
+
+        Возраст касаний передаётся в секундах и отсчитывается от LOCALTIMESTAMP сервера,
+        поэтому часы процесса бота не влияют на last_activity. Тем же запросом
+        реактивируются только те анкеты касавшихся пользователей, что были деактивированы.
+
+        Returns:
+            число пользователей в пачке
+        """
+        pending = self._activity.drain()
+        if not pending:
+            return 0
+
+        now = time.monotonic()
+        ids = list(pending)
+        ages = [now - touched for touched in pending.values()]
         try:
             async with self._pg_pool.acquire() as conn:
-                await conn.execute("""
-                    UPDATE users 
-                    SET last_activity = CURRENT_TIMESTAMP 
-                    WHERE telegram_id = $1
-                """, user_id)
-                return True
+                rows = await conn.fetch('''
+                    WITH touched AS (
+                        SELECT * FROM unnest($1::bigint[], $2::float8[]) AS t(telegram_id, age)
+                    ),
+                    activity AS (
+                        UPDATE users u
+                        SET last_activity = LOCALTIMESTAMP - t.age * INTERVAL '1 second'
+                        FROM touched t
+                        WHERE u.telegram_id = t.telegram_id
+                    )
+                    UPDATE profiles p SET is_active = TRUE
+                    FROM touched t
+                    WHERE p.telegram_id = t.telegram_id AND p.is_active = FALSE
+                    RETURNING p.telegram_id
+                ''', ids, ages)
+                if rows and self._search_index:
+                    await self._search_index.reload_profiles(
+                        conn, list({row['telegram_id'] for row in rows}), self._format_profile
+                    )
         except Exception as e:
-            logger.error(f"Ошибка обновления активности пользователя {user_id}: {e}")
-            return False
+            self._activity.restore(pending)
+            logger.warning(f"Ошибка сброса активности ({len(ids)} польз.): {e}")
+            return 0
+
+        self._activity.flushes += 1
+        self._activity.flushed_rows += len(ids)
+        if self._activity_counters:
+            await self._activity_counters.record_active(ids)
+
+        reactivated = {row['telegram_id'] for row in rows}
+        if reactivated:
+            for user_id in reactivated:
+                await self._clear_user_cache(user_id)
+            await self.invalidate_search_cache()
+            logger.info(f"Реактивированы анкеты вернувшихся пользователей: {len(reactivated)}")
+        return len(ids)
+
+    async def _activity_flush_loop(self):
+        while True:
+            await asyncio.sleep(ActivityTracker.FLUSH_INTERVAL)
+            try:
+                await self.flush_activity()
+            except Exception as e:
+                logger.warning(f"Ошибка фонового сброса активности: {e}")
 
     async def delete_profile(self, telegram_id: int, game: str) -> bool:
         """Удаление профиля и связанных данных"""
@@ -617,6 +1024,11 @@ class Database:
                     "DELETE FROM search_skipped WHERE (user_id = $1 OR skipped_user_id = $1) AND game = $2",
                     telegram_id, game
                 )
+                # Пропуски этой анкеты другими пользователями адресуются её profiles.id и отпадают сами
+                await conn.execute(
+                    "DELETE FROM search_skip_bitmaps WHERE user_id = $1 AND game = $2",
+                    telegram_id, game
+                )
                 await conn.execute(
                     "DELETE FROM reports WHERE reported_user_id = $1 AND game = $2",
                     telegram_id, game
@@ -627,17 +1039,26 @@ class Database:
                 )
 
                 await self._clear_user_cache(telegram_id)
-                await self._clear_pattern_cache(f"search:*:{game}:*")
+                await self.invalidate_search_cache(game)
+                if self._search_index:
+                    self._search_index.discard(telegram_id, game)
                 return True
 
     async def clear_invalid_photo(self, user_id: int, game: str) -> bool:
         """Очистка невалидного photo_id у пользователя"""
         try:
             async with self._pg_pool.acquire() as conn:
-                await conn.execute(
-                    "UPDATE profiles SET photo_id = NULL WHERE telegram_id = $1 AND game = $2",
-                    user_id, game
+                quality_score = self._quality_score_sql(
+                    lambda name: 'NULL' if name == 'photo_id' else name, '$3::text[]'
+                )
+                status = await conn.execute(
+                    f"UPDATE profiles SET photo_id = NULL, quality_score = {quality_score}, updated_at = NOW() "
+                    "WHERE telegram_id = $1 AND game = $2",
+                    user_id, game, self._known_default_avatars()
                 )
+                if status == "UPDATE 0":
+                    return False
+
                 await self._clear_user_cache(user_id)
                 logger.info(f"Очищен невалидный photo_id для пользователя {user_id} в игре {game}")
                 return True
@@ -655,48 +1076,73 @@ class Database:
                                    role_filter: str = None,
                                    gender_filter: str = None,
                                    limit: int = 20,
-                                   offset: int = 0) -> List[Dict]:
-        """Поиск анкет с приоритетом по заполненности и релевантности"""
-
-        from config import settings
-        default_dota_avatar = settings.get_cached_photo_id('avatar_dota')
-        default_cs_avatar = settings.get_cached_photo_id('avatar_cs')
+                                   offset: int = 0,
+                                   after: Optional[Dict] = None) -> List[Dict]:
+        """Поиск анкет с приоритетом по заполненности и релевантности
 
-        user_profile = await self.get_user_profile(user_id, game)
-        user_rating = user_profile.get('rating') if user_profile else None
-        user_goals = user_profile.get('goals', []) if user_profile else []
-        user_positions = user_profile.get('positions', []) if user_profile else []
-        user_region = user_profile.get('region') if user_profile else None
+        Args:
+            offset: Смещение (устаревшая постраничная навигация)
+            after: Последняя показанная анкета из предыдущей страницы. Если передана,
+                страница читается из снапшота выдачи (get_search_page), offset игнорируется:
+                там ранжирование выполняется раз на сессию и цена страницы не зависит
+                от числа кандидатов
+        """
+        filters = (rating_filter, position_filter, country_filter, goals_filter, role_filter, gender_filter)
+        if after:
+            return await self.get_search_page(user_id, game, *filters, limit=limit, after=after)
 
-        if game == 'dota':
-            ratings_list = ['herald', 'guardian', 'crusader', 'archon', 'legend', 'ancient', 'divine', 'immortal1', 'immortal2', 'immortal3', 'immortal4', 'immortal5']
-        else:
-            ratings_list = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '10_plus', '10_advanced', '10_elite', 'pro']
+        filters_hash = self._generate_filters_hash(*filters)
+        generation = await self._cache_generation(f"search:{game}")
+        cache_key = f"search:{user_id}:{game}:g{generation}:{filters_hash}:{limit}:{offset//limit}"
+        use_cache = offset < 60
 
-        rating_order = {r: i for i, r in enumerate(ratings_list)}
-        user_rating_idx = rating_order.get(user_rating, -1) if user_rating else -1
+        if use_cache:
+            cached = await self._get_cache(cache_key)
+            if isinstance(cached, dict) and cached.get('results'):
+                return self._restamp_search_session(cached['results'], time.time() - cached['cached_at'])
 
-        filters_hash = self._generate_filters_hash(
-            rating_filter, position_filter, country_filter, goals_filter, role_filter, gender_filter
+        statement, params = await self._build_search_query(
+            user_id, game, rating_filter, position_filter, country_filter,
+            goals_filter, role_filter, gender_filter,
+            limit=limit, offset=offset
         )
-        cache_key = f"search:{user_id}:{game}:{filters_hash}:{offset//limit}"
 
-        if offset < 60:
-            cached = await self._get_cache(cache_key)
-            if cached:
-                return cached
+        async with self._pg_pool.acquire() as conn:
+            try:
+                rows = await self._statements.fetch(conn, statement, *params)
+                results = [self._format_profile(row) for row in rows]
 
-        query = '''
-            WITH excluded_users AS (
-                SELECT DISTINCT to_user as excluded_id FROM likes WHERE from_user = $1 AND game = $2
-                UNION
-                SELECT DISTINCT reported_user_id as excluded_id FROM reports WHERE reporter_id = $1 AND game = $2
-                UNION
-                SELECT DISTINCT user_id as excluded_id FROM bans WHERE expires_at > CURRENT_TIMESTAMP
+                if use_cache:
+                    await self._set_cache(cache_key, {'results': results, 'cached_at': time.time()},
+                                          self._cache_ttl['search'], index=self._search_keys_index(user_id, game))
+
+                return results
+
+            except Exception as e:
+                logger.error(f"Ошибка поиска анкет: {e}")
+                return await self._fallback_search(user_id, game, limit, offset)
+
+    _SEARCH_COLUMNS = '''telegram_id, game, name, nickname, age, rating, region,
+                positions, goals, additional_info, photo_id, profile_url,
+                username, created_at, updated_at, role, gender, display_priority,
+                relevance_score, skip_count, last_skipped,
+                (SELECT started_at FROM search_session) as search_started_at'''
+
+    _SEARCH_RANKING_COLUMNS = "telegram_id, (SELECT started_at FROM search_session) as search_started_at"
+
+    @staticmethod
+    def _search_sql(columns: str) -> str:
+        """Текст ранжирующего запроса поиска (регистрируется как подготовленный запрос)"""
+        return '''
+            WITH search_session AS (
+                -- Момент начала сессии поиска: пропуски, сделанные позже, не меняют порядок выдачи
+                SELECT COALESCE($16::timestamp, LOCALTIMESTAMP) as started_at
             ),
             skipped_users AS (
-                SELECT skipped_user_id as skipped_id, skip_count, last_skipped
-                FROM search_skipped WHERE user_id = $1 AND game = $2
+                -- Пропуски до начала сессии (битовая карта + свежие строки search_skipped,
+                -- слиты в приложении); пропущенные в текущей сессии приходят в $17
+                SELECT * FROM unnest($18::int4[], $19::int4[], $20::timestamp[])
+                    AS s(profile_id, skip_count, last_skipped)
             ),
             rating_indices AS (
                 SELECT unnest($10::text[]) as rating,
@@ -714,116 +1160,428 @@ class Database:
 
                     -- Новые анкеты (никогда не пропускавшиеся) показываем первыми
                     CASE
-                        WHEN s.skipped_id IS NULL THEN 0
+                        WHEN s.profile_id IS NULL THEN 0
                         WHEN s.last_skipped < NOW() - INTERVAL '7 days' THEN 1
                         ELSE 2
                     END as display_priority,
 
                     -- Составной скор релевантности (чем выше — тем лучше совпадение)
                     (
-                        -- Заполненность анкеты (вес 4, макс ~28)
-                        (
-                            CASE WHEN p.rating IS NOT NULL AND p.rating != 'any' THEN 1 ELSE 0 END +
-                            CASE WHEN p.positions IS NOT NULL AND p.positions != '["any"]'::jsonb THEN 1 ELSE 0 END +
-                            CASE WHEN p.region IS NOT NULL AND p.region != 'any' THEN 1 ELSE 0 END +
-                            CASE WHEN p.goals IS NOT NULL AND p.goals != '["any"]'::jsonb THEN 1 ELSE 0 END +
-                            CASE WHEN LENGTH(TRIM(COALESCE(p.additional_info, ''))) > 20 THEN 2 ELSE 0 END +
-                            CASE WHEN p.profile_url IS NOT NULL AND TRIM(p.profile_url) != '' THEN 1 ELSE 0 END
-                        ) * 4 +
-
-                        -- Кастомное фото (+8)
-                        CASE WHEN p.photo_id IS NOT NULL
-                             AND ($11::text IS NULL OR p.photo_id != $11::text)
-                             AND ($12::text IS NULL OR p.photo_id != $12::text) THEN 8 ELSE 0 END +
+                        -- Заполненность анкеты и кастомное фото (предрасчитано при записи, макс 36)
+                        COALESCE(p.quality_score, 0) +
 
                         -- Близость рейтинга (вес 3, макс 30 при совпадении)
-                        CASE WHEN $13 >= 0 AND ri.rating_idx IS NOT NULL
-                            THEN GREATEST(0, 10 - ABS(ri.rating_idx - $13)) * 3
+                        CASE WHEN $11 >= 0 AND ri.rating_idx IS NOT NULL
+                            THEN GREATEST(0, 10 - ABS(ri.rating_idx - $11)) * 3
                             ELSE 0
                         END +
 
-                        -- Совпадение целей (4 за каждую, 'any' не считается)
-                        (SELECT COUNT(*) FROM jsonb_array_elements_text(p.goals) g
-                         WHERE g = ANY($14::text[]) AND g != 'any') * 4 +
+                        -- Совпадение целей (4 за каждую, 'any' не считается: $12 без бита 'any')
+                        bit_count((COALESCE(p.goals_mask, 0) & $12::bigint)::bit(64)) * 4 +
 
                         -- Комплементарные позиции: награждаем за несовпадающие позиции
-                        -- (ищем тех, кто дополняет команду, а не дублирует)
-                        CASE WHEN $15::text[] IS NOT NULL
-                                  AND array_length($15::text[], 1) > 0
-                                  AND NOT ('any' = ANY($15::text[]))
-                                  AND p.positions IS NOT NULL
-                                  AND p.positions != '["any"]'::jsonb
+                        -- (ищем тех, кто дополняет команду, а не дублирует); $13 = 0, если у ищущего 'any'
+                        CASE WHEN $13::bigint <> 0
+                                  AND COALESCE(p.positions_mask, 0) NOT IN (0, 1)  -- 1 = только 'any'
                             THEN GREATEST(0,
-                                jsonb_array_length(p.positions) -
-                                (SELECT COUNT(*) FROM jsonb_array_elements_text(p.positions) pos
-                                 WHERE pos = ANY($15::text[]))
+                                bit_count(p.positions_mask::bit(64)) -
+                                bit_count((p.positions_mask & $13::bigint)::bit(64))
                             ) * 3
                             ELSE 0
                         END +
 
                         -- Та же страна (небольшой бонус, +2)
-                        CASE WHEN $17::text IS NOT NULL AND p.region = $17 THEN 2 ELSE 0 END
-                    ) as relevance_score
+                        CASE WHEN $15::text IS NOT NULL AND p.region = $15 THEN 2 ELSE 0 END
+                    )::bigint as relevance_score
 
                 FROM profiles p
                 JOIN users u ON p.telegram_id = u.telegram_id
-                LEFT JOIN skipped_users s ON p.telegram_id = s.skipped_id
+                LEFT JOIN skipped_users s ON p.id = s.profile_id
                 LEFT JOIN rating_indices ri ON p.rating = ri.rating
                 WHERE p.telegram_id != $1
                     AND p.game = $2
                     AND p.is_active = TRUE
-                    AND p.telegram_id NOT IN (SELECT excluded_id FROM excluded_users)
+                    AND p.telegram_id <> ALL($17::int8[])
                     AND COALESCE(p.role, 'player') = $7::text
                     AND ($3::text IS NULL OR p.rating = $3::text)
-                    AND ($4::text IS NULL OR p.positions ? $4 OR p.positions ? 'any')
+                    AND ($4::bigint IS NULL OR (p.positions_mask & $4::bigint) <> 0)
                     AND ($5::text IS NULL OR p.region = $5::text OR p.region = 'any')
-                    AND ($6::text IS NULL OR p.goals ? $6)
-                    AND ($16::text IS NULL OR p.gender = $16::text)
+                    AND ($6::bigint IS NULL OR (p.goals_mask & $6::bigint) <> 0)
+                    AND ($14::text IS NULL OR p.gender = $14::text)
             )
-            SELECT
-                telegram_id, game, name, nickname, age, rating, region,
-                positions, goals, additional_info, photo_id, profile_url,
-                username, created_at, updated_at, role, gender, display_priority
+            SELECT ''' + columns + '''
             FROM scored_profiles
             ORDER BY
                 display_priority ASC,
                 relevance_score DESC,
                 skip_count ASC,
-                last_skipped ASC NULLS FIRST
+                last_skipped ASC NULLS FIRST,
+                telegram_id ASC
             LIMIT $8 OFFSET $9
         '''
 
+    async def _build_search_query(self, user_id: int, game: str,
+                                  rating_filter: str, position_filter: str,
+                                  country_filter: str, goals_filter: str,
+                                  role_filter: str, gender_filter: str,
+                                  limit: Optional[int] = 20, offset: int = 0,
+                                  started_at: Optional[datetime] = None,
+                                  statement: str = None) -> tuple:
+        """Параметры ранжирующего запроса поиска (limit=None - все кандидаты)
+
+        Returns:
+            (имя подготовленного запроса: search или search_ranking, список параметров)
+        """
+
+        user_profile = await self.get_user_profile(user_id, game)
+        user_rating = user_profile.get('rating') if user_profile else None
+        user_goals = user_profile.get('goals', []) if user_profile else []
+        user_positions = user_profile.get('positions', []) if user_profile else []
+        user_region = user_profile.get('region') if user_profile else None
+
+        if game == 'dota':
+            ratings_list = ['herald', 'guardian', 'crusader', 'archon', 'legend', 'ancient', 'divine', 'immortal1', 'immortal2', 'immortal3', 'immortal4', 'immortal5']
+        else:
+            ratings_list = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '10_plus', '10_advanced', '10_elite', 'pro']
+
+        rating_order = {r: i for i, r in enumerate(ratings_list)}
+        user_rating_idx = rating_order.get(user_rating, -1) if user_rating else -1
+
+        user_goals_mask = bitmasks.encode_goals(user_goals) & ~bitmasks.ANY_BIT
+        user_positions_mask = 0 if 'any' in user_positions else bitmasks.encode_positions(game, user_positions)
+
+        excluded_ids = await self._get_search_exclusions(user_id, game)
+        async with self._pg_pool.acquire() as conn:
+            started_at, session_skipped, skips = await self._load_search_skips(conn, user_id, game, started_at)
+        skipped_profiles = list(skips)
+
+        statement = statement or 'search'
+
         params = [
             user_id, game,
             rating_filter if rating_filter and rating_filter != 'any' else None,   # $3
-            position_filter if position_filter and position_filter != 'any' else None,  # $4
+            bitmasks.position_filter_mask(game, position_filter),  # $4
             country_filter if country_filter and country_filter != 'any' else None,  # $5
-            goals_filter if goals_filter and goals_filter != 'any' else None,  # $6
+            bitmasks.goal_filter_mask(goals_filter),  # $6
             role_filter if role_filter else 'player',  # $7
             limit, offset,           # $8, $9
             ratings_list,            # $10
-            default_dota_avatar,     # $11
-            default_cs_avatar,       # $12
-            user_rating_idx,         # $13
-            user_goals,              # $14
-            user_positions,          # $15
-            gender_filter if gender_filter and gender_filter != 'any' else None,  # $16
-            user_region if user_region and user_region != 'any' else None,  # $17
+            user_rating_idx,         # $11
+            user_goals_mask,         # $12
+            user_positions_mask,     # $13
+            gender_filter if gender_filter and gender_filter != 'any' else None,  # $14
+            user_region if user_region and user_region != 'any' else None,  # $15
+            started_at,              # $16
+            excluded_ids + session_skipped,  # $17
+            skipped_profiles,        # $18
+            [skips[profile_id][0] for profile_id in skipped_profiles],  # $19
+            [skips[profile_id][1] for profile_id in skipped_profiles],  # $20
         ]
 
-        async with self._pg_pool.acquire() as conn:
-            try:
-                rows = await conn.fetch(query, *params)
-                results = [self._format_profile(row) for row in rows]
+        return statement, params
 
-                if offset < 60:
-                    await self._set_cache(cache_key, results, self._cache_ttl['search'])
+    @staticmethod
+    def _parse_timestamp(value) -> Optional[datetime]:
+        """Даты из Redis приходят строками"""
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+        return value
 
-                return results
+    def _restamp_search_session(self, results: List[Dict], age: float) -> List[Dict]:
+        """Страница из кэша открывает новую сессию поиска: её начало сдвигается на возраст кэша
 
+        Пропуск сбрасывает кэш поиска пользователя, поэтому с момента кэширования пропусков
+        не было и выдача совпадает со свежей; сдвиг сохраняет часы PostgreSQL (LOCALTIMESTAMP).
+        """
+        shift = timedelta(seconds=max(0.0, age))
+        for profile in results:
+            started_at = self._parse_timestamp(profile.get('search_started_at'))
+            if started_at:
+                profile['search_started_at'] = started_at + shift
+        return results
+
+    # === СНАПШОТ ВЫДАЧИ ПОИСКА (REDIS ZSET) ===
+
+    def _search_snapshot_key(self, user_id: int, game: str, filters_hash: str) -> str:
+        return f"search_snapshot:{user_id}:{game}:{filters_hash}"
+
+    def _search_snapshot_meta_key(self, user_id: int, game: str) -> str:
+        return f"search_snapshot_meta:{user_id}:{game}"
+
+    async def build_search_snapshot(self, user_id: int, game: str,
+                                    rating_filter: str = None,
+                                    position_filter: str = None,
+                                    country_filter: str = None,
+                                    goals_filter: str = None,
+                                    role_filter: str = None,
+                                    gender_filter: str = None,
+                                    started_at: Optional[datetime] = None) -> Dict:
+        """Ранжирование всех кандидатов один раз на сессию поиска.
+
+        Порядок сохраняется в Redis ZSET (score = позиция в выдаче), а метаданные
+        снапшота - в search_snapshot_meta:{user_id}:{game}
+
+        Returns:
+            Метаданные снапшота: filters, version, started_at, count
+        """
+        filters_hash = self._generate_filters_hash(
+            rating_filter, position_filter, country_filter, goals_filter, role_filter, gender_filter
+        )
+        ranked_ids = None
+        if self._search_index:
+            try:
+                ranked_ids, started_at = await self._rank_with_index(
+                    user_id, game, {
+                        'rating': rating_filter, 'position': position_filter,
+                        'region': country_filter, 'goals': goals_filter,
+                        'role': role_filter, 'gender': gender_filter
+                    }, started_at
+                )
             except Exception as e:
-                logger.error(f"Ошибка поиска анкет: {e}")
-                return await self._fallback_search(user_id, game, limit, offset)
+                logger.warning(f"Индекс поиска недоступен, ранжируем в PostgreSQL: {e}")
+
+        if ranked_ids is None:
+            statement, params = await self._build_search_query(
+                user_id, game, rating_filter, position_filter, country_filter,
+                goals_filter, role_filter, gender_filter,
+                limit=None, started_at=started_at, statement='search_ranking'
+            )
+
+            async with self._pg_pool.acquire() as conn:
+                rows = await self._statements.fetch(conn, statement, *params)
+
+            ranked_ids = [row['telegram_id'] for row in rows]
+            if rows:
+                started_at = rows[0]['search_started_at']
+
+        meta = {
+            'filters': filters_hash,
+            'version': int(time.time() * 1000),
+            'started_at': started_at.isoformat() if started_at else None,
+            'count': len(ranked_ids)
+        }
+
+        ttl = self._cache_ttl['search_snapshot']
+        snapshot_key = self._search_snapshot_key(user_id, game, filters_hash)
+        try:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.delete(snapshot_key)
+            if ranked_ids:
+                pipe.zadd(snapshot_key, {str(telegram_id): rank for rank, telegram_id in enumerate(ranked_ids)})
+                pipe.expire(snapshot_key, ttl)
+            pipe.setex(self._search_snapshot_meta_key(user_id, game), ttl, self._cache_codec.dumps(meta))
+            await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Ошибка записи снапшота поиска {snapshot_key}: {e}")
+
+        logger.info(f"Снапшот поиска {user_id}/{game}: {len(ranked_ids)} анкет")
+        return meta
+
+    async def _rank_with_index(self, user_id: int, game: str, filters: Dict,
+                               started_at: Optional[datetime] = None) -> tuple:
+        """Ранжирование кандидатов в памяти процесса (numpy-индекс) вместо SQL-запроса
+
+        Из PostgreSQL читаются только дельта индекса и пропуски самого пользователя.
+
+        Returns:
+            (список telegram_id в порядке выдачи, начало сессии поиска)
+        """
+        filters = {name: value if value and value != 'any' else None for name, value in filters.items()}
+        viewer = dict(await self.get_user_profile(user_id, game) or {})
+        viewer['telegram_id'] = user_id
+
+        async with self._pg_pool.acquire() as conn:
+            index = await self._search_index.get(conn, game, self._format_profile)
+            started_at, session_skipped, skips = await self._load_search_skips(conn, user_id, game, started_at)
+
+        excluded = set(await self._get_search_exclusions(user_id, game))
+        excluded.update(session_skipped)
+        return index.rank(viewer, filters, excluded, skips, started_at), started_at
+
+    async def get_search_page(self, user_id: int, game: str,
+                              rating_filter: str = None,
+                              position_filter: str = None,
+                              country_filter: str = None,
+                              goals_filter: str = None,
+                              role_filter: str = None,
+                              gender_filter: str = None,
+                              limit: int = 20,
+                              after: Optional[Dict] = None,
+                              refresh: bool = False,
+                              seen: Optional[Iterable[int]] = None) -> List[Dict]:
+        """Страница выдачи поиска из снапшота в Redis.
+
+        Ранжирующий запрос выполняется только при сборке снапшота: при refresh=True
+        (начало поиска), смене фильтров или истечении TTL. Остальные страницы - ZRANGEBYSCORE
+        и одна выборка анкет по списку ID.
+
+        Если снапшот пересобран посреди сессии, позиция after в нём другая: страница
+        продолжается сразу за after (если анкета есть в новом снапшоте) или с начала,
+        но без анкет из seen - так она не окажется пустой, пока есть непоказанные кандидаты.
+
+        Args:
+            after: Последняя загруженная анкета предыдущей страницы
+            refresh: Пересобрать снапшот (новая сессия поиска)
+            seen: telegram_id анкет, уже загруженных в сессию
+        """
+        filters = (rating_filter, position_filter, country_filter, goals_filter, role_filter, gender_filter)
+        filters_hash = self._generate_filters_hash(*filters)
+        meta_key = self._search_snapshot_meta_key(user_id, game)
+
+        meta = None if refresh else await self._get_cache(meta_key)
+        if meta and meta.get('filters') != filters_hash:
+            meta = None
+
+        seen = {int(telegram_id) for telegram_id in seen or ()}
+        if after:
+            seen.add(int(after['telegram_id']))
+
+        start_rank = None
+        if meta is None:
+            # Снапшот истёк посреди сессии - пересобираем с тем же началом сессии,
+            # чтобы уже пропущенные и лайкнутые анкеты не вернулись
+            session_started = self._parse_timestamp(after.get('search_started_at')) if after else None
+            meta = await self.build_search_snapshot(user_id, game, *filters, started_at=session_started)
+        elif after and after.get('search_snapshot') == meta['version'] and after.get('search_rank') is not None:
+            start_rank = int(after['search_rank']) + 1
+
+        if not meta['count']:
+            return []
+
+        snapshot_key = self._search_snapshot_key(user_id, game, filters_hash)
+        ttl = self._cache_ttl['search_snapshot']
+        results = []
+
+        try:
+            if start_rank is None:
+                # Снапшот не тот, из которого загружена after: ищем её позицию в текущем
+                rank = await self._redis.zscore(snapshot_key, str(after['telegram_id'])) if after else None
+                start_rank = int(rank) + 1 if rank is not None else 0
+
+            while len(results) < limit:
+                pipe = self._redis.pipeline(transaction=False)
+                pipe.zrangebyscore(snapshot_key, start_rank, '+inf', start=0, num=limit, withscores=True)
+                pipe.expire(snapshot_key, ttl)
+                pipe.expire(meta_key, ttl)
+                entries = (await pipe.execute())[0]
+                if not entries:
+                    break
+
+                ranks = {int(member): int(score) for member, score in entries if int(member) not in seen}
+                profiles = await self._hydrate_search_profiles(list(ranks), game) if ranks else {}
+
+                for telegram_id, rank in ranks.items():
+                    profile = profiles.get(telegram_id)
+                    if not profile:
+                        continue
+                    profile['search_rank'] = rank
+                    profile['search_snapshot'] = meta['version']
+                    profile['search_started_at'] = meta['started_at']
+                    results.append(profile)
+
+                if len(entries) < limit:
+                    break
+                start_rank = int(entries[-1][1]) + 1
+
+        except Exception as e:
+            logger.error(f"Ошибка чтения снапшота поиска {snapshot_key}: {e}")
+            if after:
+                return []
+            return await self.get_potential_matches(user_id, game, *filters, limit=limit)
+
+        return results[:limit]
+
+    async def _hydrate_search_profiles(self, telegram_ids: List[int], game: str) -> Dict[int, Dict]:
+        """Загрузка анкет для страницы снапшота через get_user_profiles (неактивные и забаненные отбрасываются)"""
+        profiles = await self.get_user_profiles(telegram_ids, game)
+        bans = await self._active_bans()
+        return {
+            telegram_id: profile for telegram_id, profile in profiles.items()
+            if profile.get('is_active', True) and not bans.is_banned(telegram_id)
+        }
+
+    async def _remove_from_search_snapshot(self, user_id: int, game: str, target_id: int):
+        """Инкрементальное удаление анкеты из активного снапшота поиска пользователя"""
+        try:
+            meta = await self._get_cache(self._search_snapshot_meta_key(user_id, game))
+            if meta:
+                await self._redis.zrem(self._search_snapshot_key(user_id, game, meta['filters']), str(target_id))
+        except Exception as e:
+            logger.warning(f"Ошибка обновления снапшота поиска {user_id}/{game}: {e}")
+
+    # === ИСКЛЮЧЕНИЯ ПОИСКА ===
+
+    # Маркер загруженного множества: пустые множества Redis не хранит, а telegram_id 0 не бывает
+    _LOADED_MARKER = '0'
+
+    def _exclusions_key(self, user_id: int, game: str) -> str:
+        return f"search_excluded:{user_id}:{game}"
+
+    async def _get_search_exclusions(self, user_id: int, game: str) -> List[int]:
+        """Отсортированный список ID, скрытых из поиска: лайкнутые, зарепорченные и забаненные
+
+        Множество лайков и жалоб хранится в Redis на пользователя/игру и поддерживается
+        инкрементально в add_like, remove_like и add_report; баны берутся из _active_bans.
+        """
+        user_key = self._exclusions_key(user_id, game)
+        try:
+            user_ids = await self._redis.smembers(user_key)
+        except Exception as e:
+            logger.warning(f"Ошибка чтения исключений поиска {user_id}/{game}: {e}")
+            user_ids = None
+
+        if not user_ids or self._LOADED_MARKER not in user_ids:
+            # Без маркера множество неполное (или его нет) - перечитываем из PostgreSQL
+            async with self._pg_pool.acquire() as conn:
+                rows = await conn.fetch(
+                    '''SELECT to_user as excluded_id FROM likes WHERE from_user = $1 AND game = $2
+                       UNION
+                       SELECT reported_user_id FROM reports WHERE reporter_id = $1 AND game = $2''',
+                    user_id, game
+                )
+            user_ids = {str(row['excluded_id']) for row in rows}
+            await self._store_exclusions(user_key, user_ids, self._cache_ttl['exclusions'])
+
+        excluded = {int(x) for x in user_ids if x != self._LOADED_MARKER}
+        excluded.update((await self._active_bans()).ids())
+        return sorted(excluded)
+
+    async def _store_exclusions(self, key: str, ids, ttl: int):
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.sadd(key, self._LOADED_MARKER, *ids)
+                pipe.expire(key, ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.warning(f"Ошибка записи исключений поиска {key}: {e}")
+
+    # Проверка маркера загрузки и изменение множества - одна атомарная операция:
+    # если ключ истёк между ними, SADD создал бы неполное множество без маркера и TTL
+    _UPDATE_EXCLUSIONS_LUA = '''
+        if redis.call('SISMEMBER', KEYS[1], ARGV[1]) == 0 then
+            return 0
+        end
+        if ARGV[2] ~= '' then
+            redis.call('SADD', KEYS[1], ARGV[2])
+        end
+        if ARGV[3] ~= '' then
+            redis.call('SREM', KEYS[1], ARGV[3])
+        end
+        return 1
+    '''
+
+    async def _update_exclusions(self, key: str, add: int = None, remove: int = None):
+        """Точечное изменение множества исключений (только если оно уже загружено)"""
+        try:
+            if self._exclusions_script is None:
+                self._exclusions_script = self._redis.register_script(self._UPDATE_EXCLUSIONS_LUA)
+            await self._exclusions_script(
+                keys=[key],
+                args=[self._LOADED_MARKER, '' if add is None else add, '' if remove is None else remove]
+            )
+        except Exception as e:
+            logger.warning(f"Ошибка обновления исключений поиска {key}: {e}")
 
     async def _fallback_search(self, user_id: int, game: str, limit: int, offset: int) -> List[Dict]:
         """Резервный поиск при ошибках в основном запросе"""
@@ -841,22 +1599,23 @@ class Database:
                     SELECT 1 FROM reports 
                     WHERE reporter_id = $1 AND reported_user_id = p.telegram_id AND game = $2
                 )
-                AND NOT EXISTS (
-                    SELECT 1 FROM bans 
-                    WHERE user_id = p.telegram_id AND expires_at > CURRENT_TIMESTAMP
-                )
+                AND p.telegram_id <> ALL($5::int8[])
             ORDER BY 
                 CASE WHEN p.photo_id IS NOT NULL THEN 0 ELSE 1 END,  -- Сначала с фото
                 p.created_at DESC
             LIMIT $3 OFFSET $4
         '''
 
+        banned_ids = (await self._active_bans()).ids()
         async with self._pg_pool.acquire() as conn:
-            rows = await conn.fetch(query, user_id, game, limit, offset)
+            rows = await conn.fetch(query, user_id, game, limit, offset, banned_ids)
             return [self._format_profile(row) for row in rows]
 
     async def add_search_skip(self, user_id: int, skipped_user_id: int, game: str) -> bool:
-        """Добавление пропуска в поиске"""
+        """Добавление пропуска в поиске
+
+        Строка search_skipped живёт до уплотнения в битовую карту (compact_search_skips).
+        """
         async with self._pg_pool.acquire() as conn:
             await conn.execute(
                 '''INSERT INTO search_skipped (user_id, skipped_user_id, game, skip_count, last_skipped)
@@ -865,83 +1624,165 @@ class Database:
                    DO UPDATE SET skip_count = search_skipped.skip_count + 1, last_skipped = CURRENT_TIMESTAMP''',
                 user_id, skipped_user_id, game
             )
-            await self._clear_pattern_cache(f"search:{user_id}:{game}:*")
+            await self._clear_user_search_cache(user_id, game)
+            await self._remove_from_search_snapshot(user_id, game, skipped_user_id)
             return True
 
-    # === ЛАЙКИ И МЭТЧИ ===
+    _SKIP_COMPACT_AFTER = timedelta(days=1)  # свежие пропуски хранят точное время (сессии поиска)
+    _SKIP_COMPACT_BATCH = 500                # пар (пользователь, игра) на одну транзакцию уплотнения
 
-    async def add_like(self, from_user: int, to_user: int, game: str, message: str = None) -> bool:
-        """Добавление лайка с опциональным сообщением (возвращает True если мэтч)"""
-        async with self._pg_pool.acquire() as conn:
-            async with conn.transaction():
-                existing = await conn.fetchval(
-                    "SELECT 1 FROM likes WHERE from_user = $1 AND to_user = $2 AND game = $3",
-                    from_user, to_user, game
-                )
-                if existing:
-                    return False
+    async def _load_search_skips(self, conn, user_id: int, game: str,
+                                 started_at: Optional[datetime] = None) -> tuple:
+        """Пропуски пользователя: битовая карта + ещё не уплотнённые строки search_skipped
 
-                await conn.execute(
-                    "INSERT INTO likes (from_user, to_user, game, message) VALUES ($1, $2, $3, $4)",
-                    from_user, to_user, game, message
-                )
+        Returns:
+            (начало сессии поиска, telegram_id пропущенных в текущей сессии,
+             {profile_id: (skip_count, last_skipped)} для пропусков до начала сессии)
+        """
+        row = await conn.fetchrow(
+            '''SELECT LOCALTIMESTAMP as now,
+                      (SELECT skips FROM search_skip_bitmaps WHERE user_id = $1 AND game = $2) as skips''',
+            user_id, game
+        )
+        recent = await conn.fetch(
+            '''SELECT s.skipped_user_id, s.skip_count, s.last_skipped, p.id as profile_id
+               FROM search_skipped s
+               LEFT JOIN profiles p ON p.telegram_id = s.skipped_user_id AND p.game = s.game
+               WHERE s.user_id = $1 AND s.game = $2''',
+            user_id, game
+        )
+        started_at = started_at or row['now']
+
+        bitmap = SkipBitmap.from_bytes(row['skips'])
+        skips = {profile_id: (count, last_skipped) for profile_id, count, last_skipped in bitmap.items()}
+        session_skipped = []
+        for skip in recent:
+            if skip['last_skipped'] and skip['last_skipped'] >= started_at:
+                session_skipped.append(skip['skipped_user_id'])
+            elif skip['profile_id'] is not None:
+                compacted_count = skips.get(skip['profile_id'], (0, None))[0]
+                skips[skip['profile_id']] = (compacted_count + skip['skip_count'], skip['last_skipped'])
+        return started_at, session_skipped, skips
+
+    async def compact_search_skips(self, older_than: timedelta = None) -> int:
+        """Перенос строк search_skipped старше older_than в битовые карты search_skip_bitmaps
+
+        Строки забираются DELETE ... RETURNING и сливаются с картой в одной транзакции,
+        поэтому параллельный пропуск не теряется: он просто создаст новую строку.
+        Пропуски удалённых анкет (нет profiles.id) отбрасываются.
 
-                mutual = await conn.fetchval(
-                    "SELECT 1 FROM likes WHERE from_user = $1 AND to_user = $2 AND game = $3",
-                    to_user, from_user, game
-                )
+        Returns:
+            Число перенесённых строк
+        """
+        older_than = older_than or self._SKIP_COMPACT_AFTER
+        async with self._pg_pool.acquire() as conn:
+            owners = await conn.fetch(
+                '''SELECT DISTINCT user_id, game FROM search_skipped
+                   WHERE last_skipped < LOCALTIMESTAMP - $1::interval''',
+                older_than
+            )
 
-                if mutual:
-                    user1, user2 = sorted([from_user, to_user])
-                    await conn.execute(
-                        "INSERT INTO matches (user1, user2, game) VALUES ($1, $2, $3) ON CONFLICT DO NOTHING",
-                        user1, user2, game
+        moved = 0
+        for start in range(0, len(owners), self._SKIP_COMPACT_BATCH):
+            batch = owners[start:start + self._SKIP_COMPACT_BATCH]
+            user_ids = [owner['user_id'] for owner in batch]
+            games = [owner['game'] for owner in batch]
+
+            async with self._pg_pool.acquire() as conn:
+                async with conn.transaction():
+                    rows = await conn.fetch(
+                        '''WITH moved AS (
+                               DELETE FROM search_skipped s
+                               USING unnest($1::bigint[], $2::text[]) AS o(user_id, game)
+                               WHERE s.user_id = o.user_id AND s.game = o.game
+                                   AND s.last_skipped < LOCALTIMESTAMP - $3::interval
+                               RETURNING s.user_id, s.game, s.skipped_user_id, s.skip_count, s.last_skipped
+                           )
+                           SELECT m.user_id, m.game, m.skip_count, m.last_skipped, p.id as profile_id
+                           FROM moved m
+                           LEFT JOIN profiles p ON p.telegram_id = m.skipped_user_id AND p.game = m.game''',
+                        user_ids, games, older_than
+                    )
+                    existing = await conn.fetch(
+                        '''SELECT b.user_id, b.game, b.skips FROM search_skip_bitmaps b
+                           JOIN unnest($1::bigint[], $2::text[]) AS o(user_id, game)
+                               ON b.user_id = o.user_id AND b.game = o.game
+                           FOR UPDATE OF b''',
+                        user_ids, games
                     )
 
-                    await self._clear_user_cache(from_user)
-                    await self._clear_user_cache(to_user)
-                    return True
+                    bitmaps = {(row['user_id'], row['game']): SkipBitmap.from_bytes(row['skips']) for row in existing}
+                    for row in rows:
+                        if row['profile_id'] is None:
+                            continue
+                        bitmap = bitmaps.setdefault((row['user_id'], row['game']), SkipBitmap())
+                        bitmap.add(row['profile_id'], row['skip_count'], row['last_skipped'])
+
+                    if bitmaps:
+                        keys = list(bitmaps)
+                        await conn.execute(
+                            '''INSERT INTO search_skip_bitmaps (user_id, game, skips, skipped_total, compacted_at)
+                               SELECT *, LOCALTIMESTAMP FROM unnest($1::bigint[], $2::text[], $3::bytea[], $4::int[])
+                               ON CONFLICT (user_id, game) DO UPDATE SET
+                                   skips = EXCLUDED.skips,
+                                   skipped_total = EXCLUDED.skipped_total,
+                                   compacted_at = EXCLUDED.compacted_at''',
+                            [key[0] for key in keys], [key[1] for key in keys],
+                            [bitmaps[key].to_bytes() for key in keys], [len(bitmaps[key]) for key in keys]
+                        )
+            moved += len(rows)
+
+        if moved:
+            logger.info(f"🗜 Уплотнено пропусков поиска: {moved} строк, {len(owners)} пользователей")
+        return moved
 
-                await self._clear_pattern_cache(f"likes:{to_user}:*")
-                return False
+    # === ЛАЙКИ И МЭТЧИ ===
+
+    async def add_like(self, from_user: int, to_user: int, game: str, message: str = None) -> LikeResult:
+        """Добавление лайка с опциональным сообщением
+
+        Вставка, проверка взаимности и создание мэтча выполняются одной функцией
+        register_like за одно обращение к базе.
+        """
+        async with self._pg_pool.acquire() as conn:
+            result = LikeResult(await self._statements.fetchval(
+                conn, 'register_like', from_user, to_user, game, message
+            ))
+
+        if result == LikeResult.DUPLICATE:
+            return result
+
+        await self._remove_from_search_snapshot(from_user, game, to_user)
+        await self._update_exclusions(self._exclusions_key(from_user, game), add=to_user)
+
+        if result == LikeResult.MATCH:
+            await self._clear_user_cache(from_user)
+            await self._clear_user_cache(to_user)
+        else:
+            await self._clear_user_namespaces(to_user, 'likes')
+        return result
 
     async def get_likes_for_user(self, user_id: int, game: str) -> List[Dict]:
-        """Получение лайков для пользователя с сообщениями"""
+        """Получение лайков для пользователя с сообщениями
+
+        Запрос возвращает только отправителей и сообщения, анкеты подгружаются
+        пакетно через get_user_profiles (большей частью из кэша)
+        """
         cache_key = f"likes:{user_id}:{game}"
         cached = await self._get_cache(cache_key)
         if cached:
             return cached
 
         async with self._pg_pool.acquire() as conn:
-            rows = await conn.fetch(
-                '''SELECT p.telegram_id, p.game, p.name, p.nickname, p.age,
-                        p.rating, p.region, p.positions, p.goals,
-                        p.additional_info, p.photo_id, p.profile_url,
-                        p.role, p.gender,
-                        p.created_at, p.updated_at,
-                        u.username,
-                        l.message, l.created_at as like_created_at
-                FROM profiles p
-                JOIN users u ON p.telegram_id = u.telegram_id
-                JOIN likes l ON p.telegram_id = l.from_user AND l.game = p.game
-                WHERE l.to_user = $1 AND l.game = $2 AND p.game = $2
-                AND NOT EXISTS (
-                    SELECT 1 FROM matches m
-                    WHERE ((m.user1 = $1 AND m.user2 = p.telegram_id) OR
-                            (m.user1 = p.telegram_id AND m.user2 = $1))
-                    AND m.game = $2
-                )
-                AND NOT EXISTS (
-                    SELECT 1 FROM skipped_likes sl
-                    WHERE sl.user_id = $1 AND sl.skipped_user_id = p.telegram_id AND sl.game = $2
-                )
-                ORDER BY l.created_at DESC''',
-                user_id, game
-            )
+            rows = await self._statements.fetch(conn, 'get_likes_for_user', user_id, game)
 
-            results = [self._format_profile(row) for row in rows]
-            await self._set_cache(cache_key, results, self._cache_ttl['likes'])
-            return results
+        profiles = await self.get_user_profiles([row['from_user'] for row in rows], game)
+        results = [
+            {**profiles[row['from_user']], 'message': row['message'], 'like_created_at': row['like_created_at']}
+            for row in rows if row['from_user'] in profiles
+        ]
+        await self._set_cache(cache_key, results, self._cache_ttl['likes'])
+        return results
 
     async def get_matches(self, user_id: int, game: str) -> List[Dict]:
         """Получение мэтчей пользователя с кэшированием"""
@@ -951,17 +1792,7 @@ class Database:
             return cached
 
         async with self._pg_pool.acquire() as conn:
-            rows = await conn.fetch(
-                '''SELECT p.*, u.username 
-                   FROM profiles p
-                   JOIN users u ON p.telegram_id = u.telegram_id
-                   JOIN matches m ON (p.telegram_id = m.user1 OR p.telegram_id = m.user2)
-                   WHERE (m.user1 = $1 OR m.user2 = $1) 
-                       AND p.telegram_id != $1
-                       AND m.game = $2 AND p.game = $2
-                   ORDER BY m.created_at DESC''',
-                user_id, game
-            )
+            rows = await self._statements.fetch(conn, 'get_matches', user_id, game)
 
             results = [self._format_profile(row) for row in rows]
             await self._set_cache(cache_key, results, self._cache_ttl['matches'])
@@ -974,7 +1805,7 @@ class Database:
                 "INSERT INTO skipped_likes (user_id, skipped_user_id, game) VALUES ($1, $2, $3) ON CONFLICT DO NOTHING",
                 user_id, skipped_user_id, game
             )
-            await self._clear_pattern_cache(f"likes:{user_id}:*")
+            await self._clear_user_namespaces(user_id, 'likes')
             return True
 
     async def remove_like(self, from_user: int, to_user: int, game: str) -> bool:
@@ -985,29 +1816,78 @@ class Database:
                 from_user, to_user, game
             )
 
-            await self._clear_pattern_cache(f"likes:{to_user}:*")
-            await self._clear_pattern_cache(f"matches:{from_user}:*")
-            await self._clear_pattern_cache(f"matches:{to_user}:*")
+            # Жалоба от того же пользователя по-прежнему скрывает анкету - множество перечитается из БД
+            if result != "DELETE 0":
+                await self._delete_cache(self._exclusions_key(from_user, game))
+            await self._clear_user_namespaces(to_user, 'likes', 'matches')
+            await self._clear_user_namespaces(from_user, 'matches')
 
             return result != "DELETE 0"
 
     # === БАНЫ ===
 
-    async def is_user_banned(self, user_id: int) -> bool:
-        """Проверка бана пользователя с кэшированием"""
-        cache_key = f"ban:{user_id}"
-        cached = await self._get_cache(cache_key)
-        if cached is not None:
-            return bool(cached)
+    _BANS_KEY = "bans:active"
 
-        async with self._pg_pool.acquire() as conn:
-            row = await conn.fetchval(
-                "SELECT 1 FROM bans WHERE user_id = $1 AND expires_at > CURRENT_TIMESTAMP",
-                user_id
-            )
-            result = row is not None
-            await self._set_cache(cache_key, result, 60)
-            return result
+    async def _active_bans(self) -> BanRegistry:
+        """Множество активных банов: память процесса -> ZSET в Redis -> PostgreSQL
+
+        В ZSET score - момент окончания бана, истёкшие баны срезаются по score.
+        Изменения этого процесса попадают в память сразу, остальных - при сверке раз в минуту.
+        """
+        if time.monotonic() - self._bans.synced_at < self._cache_ttl['bans_sync']:
+            return self._bans
+
+        bans = None
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.zremrangebyscore(self._BANS_KEY, '-inf', time.time())
+                pipe.zrange(self._BANS_KEY, 0, -1, withscores=True)
+                _, members = await pipe.execute()
+            if members:
+                bans = {int(member): score for member, score in members if member != self._LOADED_MARKER}
+        except Exception as e:
+            logger.warning(f"Ошибка чтения активных банов из Redis: {e}")
+
+        if bans is None:
+            async with self._pg_pool.acquire() as conn:
+                rows = await self._statements.fetch(conn, 'active_bans')
+            bans = {row['user_id']: row['expires_at'].timestamp() for row in rows}
+            try:
+                async with self._redis.pipeline(transaction=True) as pipe:
+                    pipe.delete(self._BANS_KEY)
+                    pipe.zadd(self._BANS_KEY, {self._LOADED_MARKER: float('inf'),
+                                               **{str(user_id): expires for user_id, expires in bans.items()}})
+                    pipe.expire(self._BANS_KEY, self._cache_ttl['bans'])
+                    await pipe.execute()
+            except Exception as e:
+                logger.warning(f"Ошибка записи активных банов в Redis: {e}")
+
+        self._bans.load(bans)
+        return self._bans
+
+    async def _update_active_bans(self, user_id: int, expires_at: datetime = None):
+        """Точечное изменение множества банов (expires_at=None - снятие бана)"""
+        if expires_at:
+            self._bans.add(user_id, expires_at)
+        else:
+            self._bans.remove(user_id)
+        try:
+            if not await self._redis.exists(self._BANS_KEY):
+                return
+            if expires_at and expires_at.timestamp() > time.time():
+                await self._redis.zadd(self._BANS_KEY, {str(user_id): expires_at.timestamp()})
+            else:
+                await self._redis.zrem(self._BANS_KEY, str(user_id))
+        except Exception as e:
+            logger.warning(f"Ошибка обновления активных банов {user_id}: {e}")
+
+    async def get_banned_user_ids(self) -> List[int]:
+        """Отсортированный список ID активных банов"""
+        return (await self._active_bans()).ids()
+
+    async def is_user_banned(self, user_id: int) -> bool:
+        """Проверка бана пользователя по множеству активных банов"""
+        return (await self._active_bans()).is_banned(user_id)
 
     async def get_user_ban(self, user_id: int) -> Optional[Dict]:
         """Получение информации о бане"""
@@ -1072,8 +1952,8 @@ class Database:
                 DO UPDATE SET reason=EXCLUDED.reason, expires_at=EXCLUDED.expires_at, created_at=CURRENT_TIMESTAMP
             """, user_id, reason, expires_at)
 
+            await self._update_active_bans(user_id, expires_at)
             await self._clear_user_cache(user_id)
-            await self._clear_pattern_cache(f"ban:{user_id}")
             return True
 
     async def unban_user(self, user_id: int) -> bool:
@@ -1081,8 +1961,8 @@ class Database:
         async with self._pg_pool.acquire() as conn:
             await conn.execute("DELETE FROM bans WHERE user_id = $1", user_id)
 
+            await self._update_active_bans(user_id)
             await self._clear_user_cache(user_id)
-            await self._clear_pattern_cache(f"ban:{user_id}")
             return True
 
     # === ЖАЛОБЫ ===
@@ -1109,6 +1989,8 @@ class Database:
                        VALUES ($1, $2, $3, 'inappropriate_content', 'pending', $4)''',
                     reporter_id, reported_user_id, game, report_message.strip()
                 )
+                await self._remove_from_search_snapshot(reporter_id, game, reported_user_id)
+                await self._update_exclusions(self._exclusions_key(reporter_id, game), add=reported_user_id)
                 return True
             except:
                 return False
@@ -1184,18 +2066,26 @@ class Database:
                    RETURNING id""",
                 message_id, chat_id, caption, admin_id, show_interval, games, regions, ad_type, expires_at
             )
-            await self._redis.delete("active_ads:dota")
-            await self._redis.delete("active_ads:cs")
+            await self._clear_ads_cache()
 
             expires_info = f", истекает: {expires_at}" if expires_at else ", бессрочно"
             logger.info(f"Добавлен рекламный пост #{post_id} ({ad_type}) для игр: {games}, регионов: {regions}{expires_info}")
             return post_id
 
+    async def _clear_ads_cache(self):
+        self._local_cache.invalidate('active_ads')
+        await self._delete_cache(*(f"active_ads:{game}" for game in settings.GAMES))
+
     async def get_active_ads_for_game(self, game: str) -> List[Dict]:
         """Получение активных рекламных постов для конкретной игры (не истекших)"""
+        local = self._local_cache.get('active_ads', game)
+        if local is not None:
+            return local
+
         cache_key = f"active_ads:{game}"
         cached = await self._get_cache(cache_key)
         if cached:
+            self._local_cache.set('active_ads', game, cached)
             return cached
 
         async with self._pg_pool.acquire() as conn:
@@ -1209,6 +2099,7 @@ class Database:
             )
             result = [dict(row) for row in rows]
             await self._set_cache(cache_key, result, 600)
+            self._local_cache.set('active_ads', game, result)
             return result
 
     async def update_ad_games(self, ad_id: int, games: List[str]) -> bool:
@@ -1219,8 +2110,7 @@ class Database:
                     "UPDATE ad_posts SET games = $1 WHERE id = $2",
                     games, ad_id
                 )
-                await self._redis.delete("active_ads:dota")
-                await self._redis.delete("active_ads:cs")
+                await self._clear_ads_cache()
                 logger.info(f"Обновлены игры для рекламы #{ad_id}: {games}")
                 return True
         except Exception as e:
@@ -1235,8 +2125,7 @@ class Database:
                     "UPDATE ad_posts SET regions = $1 WHERE id = $2",
                     regions, ad_id
                 )
-                await self._redis.delete("active_ads:dota")
-                await self._redis.delete("active_ads:cs")
+                await self._clear_ads_cache()
                 logger.info(f"Обновлены регионы для рекламы #{ad_id}: {regions}")
                 return True
         except Exception as e:
@@ -1258,7 +2147,7 @@ class Database:
                 "UPDATE ad_posts SET is_active = NOT is_active WHERE id = $1",
                 ad_id
             )
-            await self._redis.delete("active_ads")
+            await self._clear_ads_cache()
             return True
 
     async def update_ad_interval(self, ad_id: int, interval: int) -> bool:
@@ -1270,8 +2159,7 @@ class Database:
                     interval, ad_id
                 )
                 # Очищаем кэш для обеих игр
-                await self._redis.delete("active_ads:dota")
-                await self._redis.delete("active_ads:cs")
+                await self._clear_ads_cache()
                 logger.info(f"Обновлён интервал рекламы #{ad_id}: {interval}, кэш очищен")
                 return True
         except Exception as e:
@@ -1282,7 +2170,7 @@ class Database:
         """Удаление рекламного поста"""
         async with self._pg_pool.acquire() as conn:
             await conn.execute("DELETE FROM ad_posts WHERE id = $1", ad_id)
-            await self._redis.delete("active_ads")
+            await self._clear_ads_cache()
             return True
 
     async def cleanup_expired_ads(self) -> int:
@@ -1299,8 +2187,7 @@ class Database:
             deleted_count = int(result.split()[-1]) if result and result.split() else 0
 
             if deleted_count > 0:
-                await self._redis.delete("active_ads:dota")
-                await self._redis.delete("active_ads:cs")
+                await self._clear_ads_cache()
                 logger.info(f"🗑️ Удалено {deleted_count} истекших рекламных постов")
 
             return deleted_count
@@ -1414,7 +2301,8 @@ class Database:
         target_regions = broadcast['target_regions']
         target_purposes = broadcast['target_purposes']
 
-        async with self._pg_pool.acquire() as conn:
+        banned_ids = (await self._active_bans()).ids()
+        async with self.read_connection('get_broadcast_recipients') as conn:
             # Базовый запрос - пользователи с анкетами
             query_parts = ["""
                 SELECT DISTINCT p.telegram_id
@@ -1439,18 +2327,14 @@ class Database:
 
             # Фильтр по целям (включаем пользователей с goals содержащим 'any' в любую выборку)
             if target_purposes:
-                query_parts.append(f"AND (p.goals ?| ${param_count} OR p.goals @> '[\"any\"]'::jsonb)")
-                params.append(target_purposes)
+                query_parts.append(f"AND (p.goals_mask & ${param_count}::bigint) <> 0")
+                params.append(bitmasks.encode_goals(target_purposes) | bitmasks.ANY_BIT)
                 param_count += 1
 
             # Исключаем забаненных
-            query_parts.append("""
-                AND NOT EXISTS (
-                    SELECT 1 FROM bans b
-                    WHERE b.user_id = p.telegram_id
-                    AND b.expires_at > NOW()
-                )
-            """)
+            query_parts.append(f"AND p.telegram_id <> ALL(${param_count}::int8[])")
+            params.append(banned_ids)
+            param_count += 1
 
             query = "\n".join(query_parts)
             logger.info(f"SQL Query: {query}")
@@ -1665,7 +2549,8 @@ class Database:
         Returns:
             Список telegram_id неактивных пользователей
         """
-        async with self._pg_pool.acquire() as conn:
+        banned_ids = (await self._active_bans()).ids()
+        async with self.read_connection('get_inactive_users') as conn:
             if max_hours:
                 query = """
                     SELECT telegram_id
@@ -1673,11 +2558,7 @@ class Database:
                     WHERE last_activity IS NOT NULL
                       AND last_activity < NOW() - INTERVAL '%s hours'
                       AND last_activity >= NOW() - INTERVAL '%s hours'
-                      AND NOT EXISTS (
-                          SELECT 1 FROM bans b
-                          WHERE b.user_id = users.telegram_id
-                          AND b.expires_at > NOW()
-                      )
+                      AND telegram_id <> ALL($1::int8[])
                       AND EXISTS (
                           SELECT 1 FROM profiles p
                           WHERE p.telegram_id = users.telegram_id AND p.is_active = TRUE
@@ -1689,24 +2570,20 @@ class Database:
                     FROM users
                     WHERE last_activity IS NOT NULL
                       AND last_activity < NOW() - INTERVAL '%s hours'
-                      AND NOT EXISTS (
-                          SELECT 1 FROM bans b
-                          WHERE b.user_id = users.telegram_id
-                          AND b.expires_at > NOW()
-                      )
+                      AND telegram_id <> ALL($1::int8[])
                       AND EXISTS (
                           SELECT 1 FROM profiles p
                           WHERE p.telegram_id = users.telegram_id AND p.is_active = TRUE
                       )
                 """ % min_hours
 
-            rows = await conn.fetch(query)
+            rows = await conn.fetch(query, banned_ids)
             return [row['telegram_id'] for row in rows]
 
     async def get_unviewed_likes_count(self, user_id: int) -> int:
         """Получение количества непросмотренных лайков пользователя.
         Считаем лайки, полученные после последней активности пользователя."""
-        async with self._pg_pool.acquire() as conn:
+        async with self.read_connection('get_unviewed_likes_count') as conn:
             count = await conn.fetchval("""
                 SELECT COUNT(*)
                 FROM likes l
@@ -1728,7 +2605,7 @@ class Database:
         Returns:
             Количество новых анкет
         """
-        async with self._pg_pool.acquire() as conn:
+        async with self.read_connection('get_new_profiles_count_for_user') as conn:
             # Получаем анкету пользователя
             user_profile = await conn.fetchrow("""
                 SELECT game, region
@@ -1832,36 +2709,32 @@ class Database:
 
         # Для уведомлений о непросмотренных лайках
         elif 'min_unviewed_likes' in conditions:
-            async with self._pg_pool.acquire() as conn:
+            banned_ids = (await self._active_bans()).ids()
+            async with self.read_connection('get_users_for_engagement') as conn:
                 rows = await conn.fetch("""
                     SELECT DISTINCT l.to_user as telegram_id
                     FROM likes l
                     JOIN users u ON u.telegram_id = l.to_user
                     WHERE u.last_activity IS NOT NULL
                     AND l.created_at > u.last_activity
-                    AND NOT EXISTS (
-                        SELECT 1 FROM bans b
-                        WHERE b.user_id = l.to_user AND b.expires_at > NOW()
-                    )
+                    AND l.to_user <> ALL($1::int8[])
                     AND EXISTS (
                         SELECT 1 FROM profiles p
                         WHERE p.telegram_id = l.to_user AND p.is_active = TRUE
                     )
-                """)
+                """, banned_ids)
                 users = [row['telegram_id'] for row in rows]
 
         # Для уведомлений о новых анкетах
         elif 'min_new_profiles' in conditions:
-            async with self._pg_pool.acquire() as conn:
+            banned_ids = (await self._active_bans()).ids()
+            async with self.read_connection('get_users_for_engagement') as conn:
                 rows = await conn.fetch("""
                     SELECT DISTINCT telegram_id
                     FROM profiles
                     WHERE is_active = TRUE
-                    AND NOT EXISTS (
-                        SELECT 1 FROM bans b
-                        WHERE b.user_id = profiles.telegram_id AND b.expires_at > NOW()
-                    )
-                """)
+                    AND telegram_id <> ALL($1::int8[])
+                """, banned_ids)
                 users = [row['telegram_id'] for row in rows]
 
         # Фильтруем пользователей по условиям отправки
@@ -1917,26 +2790,24 @@ class Database:
 
     async def get_users_for_monthly_reminder(self) -> List[Dict]:
         """Получение пользователей для ежемесячного напоминания об обновлении анкеты"""
-        async with self._pg_pool.acquire() as conn:
+        banned_ids = (await self._active_bans()).ids()
+        async with self.read_connection('get_users_for_monthly_reminder') as conn:
             rows = await conn.fetch("""
                 SELECT DISTINCT p.telegram_id, p.game, u.username, p.updated_at
                 FROM profiles p
                 JOIN users u ON p.telegram_id = u.telegram_id
                 WHERE p.updated_at < NOW() - INTERVAL '25 days'
                     AND p.created_at < NOW() - INTERVAL '7 days'
-                    AND NOT EXISTS (
-                        SELECT 1 FROM bans b
-                        WHERE b.user_id = p.telegram_id
-                        AND b.expires_at > NOW()
-                    )
+                    AND p.telegram_id <> ALL($1::int8[])
                 ORDER BY p.updated_at ASC
                 LIMIT 1000
-            """)
+            """, banned_ids)
             return [dict(row) for row in rows]
 
     async def deactivate_inactive_profiles(self, days: int = 30) -> List[int]:
         """Деактивирует анкеты пользователей неактивных N дней.
         Возвращает список telegram_id деактивированных пользователей."""
+        banned_ids = (await self._active_bans()).ids()
         async with self._pg_pool.acquire() as conn:
             rows = await conn.fetch("""
                 UPDATE profiles SET is_active = FALSE
@@ -1945,15 +2816,21 @@ class Database:
                       SELECT u.telegram_id FROM users u
                       WHERE (u.last_activity IS NULL OR u.last_activity < NOW() - ($1 || ' days')::INTERVAL)
                   )
-                  AND NOT EXISTS (
-                      SELECT 1 FROM bans b
-                      WHERE b.user_id = profiles.telegram_id AND b.expires_at > NOW()
-                  )
+                  AND telegram_id <> ALL($2::int8[])
                 RETURNING telegram_id
-            """, str(days))
+            """, str(days), banned_ids)
             user_ids = list({row['telegram_id'] for row in rows})
             if user_ids:
-                await self._clear_pattern_cache("search:*")
+                # Кэшированные профили несут is_active - сбрасываем их одной командой
+                for user_id in user_ids:
+                    for game in settings.GAMES:
+                        self._local_cache.invalidate('profile', (user_id, game))
+                await self._delete_cache(*(key for user_id in user_ids
+                                           for key in self._user_cache_keys(user_id, 'profile')))
+                await self.invalidate_search_cache()
+                if self._search_index:
+                    for user_id in user_ids:
+                        self._search_index.discard(user_id)
             return user_ids
 
     async def reactivate_profile(self, user_id: int) -> bool:
@@ -1966,16 +2843,73 @@ class Database:
             )
             reactivated = result != "UPDATE 0"
             if reactivated:
-                await self._clear_pattern_cache(f"search:*")
+                if self._search_index:
+                    await self._search_index.reload_profiles(conn, [user_id], self._format_profile)
+                await self.invalidate_search_cache()
                 await self._clear_user_cache(user_id)
             return reactivated
 
+    async def get_audience_stats(self) -> Dict[str, float]:
+        """DAU/WAU/MAU и удержание по HLL-счётчикам (см. ActivityCounters.summary)"""
+        return await self._activity_counters.summary()
+
+    def get_cache_stats(self) -> Dict:
+        """Статистика кодека кэша (в т.ч. экономия байт относительно JSON) и локального кэша"""
+        return {
+            'codec': self._cache_codec.stats(),
+            'local': self._local_cache.stats(),
+            'activity': self._activity.stats(),
+        }
+
+    def _pools(self) -> List[InstrumentedPool]:
+        return [pool for pool in (self._pg_pool, self._replica_pool) if isinstance(pool, InstrumentedPool)]
+
+    def _redis_pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Занятые/свободные соединения пулов Redis (внутренние поля redis-py, без обращений к серверу)"""
+        stats = {}
+        for name, client in (('text', self._redis), ('binary', self._redis_raw)):
+            pool = getattr(client, 'connection_pool', None)
+            if pool is None:
+                continue
+            stats[name] = {
+                'in_use': len(getattr(pool, '_in_use_connections', ())),
+                'idle': len(getattr(pool, '_available_connections', ())),
+                'max': pool.max_connections,
+            }
+        return stats
+
+    def get_pool_stats(self) -> Dict:
+        """Состояние пулов: PostgreSQL (мастер/реплика), топ методов по удержанию, Redis"""
+        return {
+            'postgres': {pool.name: pool.stats() for pool in self._pools()},
+            'top_holders': self._pg_pool.top_holders() if isinstance(self._pg_pool, InstrumentedPool) else [],
+            'adaptive': self._pool_autoscaler is not None,
+            'redis': self._redis_pool_stats(),
+        }
+
+    def get_method_stats(self, limit: int = 5) -> List[tuple]:
+        """Самые медленные методы по p99: [(метод, вызовов, p99 с)]"""
+        return METHOD_METRICS.slowest(limit)
+
+    def prometheus_metrics(self) -> str:
+        """Метрики в text exposition format Prometheus (для /metrics)"""
+        lines = METHOD_METRICS.prometheus()
+        for pool in self._pools():
+            lines += pool.prometheus()
+        redis_stats = self._redis_pool_stats()
+        for key, help_text in (('in_use', 'Занятых соединений Redis'),
+                               ('idle', 'Свободных соединений Redis'),
+                               ('max', 'Верхняя граница пула Redis')):
+            lines += render_simple(f'cgdv_redis_pool_{key}', 'gauge', help_text,
+                                   [({'client': name}, stats[key]) for name, stats in redis_stats.items()])
+        return "\n".join(lines) + "\n"
+
     async def get_database_stats(self) -> Dict[str, Union[int, str]]:
         """Получение детальной статистики базы данных"""
         stats = {}
 
         try:
-            async with self._pg_pool.acquire() as conn:
+            async with self.read_connection('get_database_stats') as conn:
                 stats_queries = [
                     ("users_total", "SELECT COUNT(DISTINCT telegram_id) FROM users"),
                     ("users_with_profiles", "SELECT COUNT(DISTINCT telegram_id) FROM profiles"),
@@ -2042,6 +2976,9 @@ class Database:
 
                 logger.info(f"Очищены данные старше {days} дней")
 
+        # engagement_history и broadcast_stats чистятся удалением партиций
+        await self.maintain_partitions()
+
     async def get_all_user_ids(self) -> List[int]:
         """Возвращает список всех telegram_id пользователей"""
         async with self._pg_pool.acquire() as conn:
@@ -2051,20 +2988,105 @@ class Database:
     async def delete_user_completely(self, telegram_id: int) -> bool:
         """Полное удаление пользователя и всех его данных из БД"""
         try:
-            async with self._pg_pool.acquire() as conn:
-                async with conn.transaction():
-                    await conn.execute("DELETE FROM likes WHERE from_user = $1 OR to_user = $1", telegram_id)
-                    await conn.execute("DELETE FROM matches WHERE user1 = $1 OR user2 = $1", telegram_id)
-                    await conn.execute("DELETE FROM skipped_likes WHERE user_id = $1 OR skipped_user_id = $1", telegram_id)
-                    await conn.execute("DELETE FROM search_skipped WHERE user_id = $1 OR skipped_user_id = $1", telegram_id)
-                    await conn.execute("DELETE FROM reports WHERE reporter_id = $1 OR reported_user_id = $1", telegram_id)
-                    await conn.execute("DELETE FROM bans WHERE user_id = $1", telegram_id)
-                    await conn.execute("DELETE FROM engagement_history WHERE user_id = $1", telegram_id)
-                    await conn.execute("DELETE FROM profiles WHERE telegram_id = $1", telegram_id)
-                    await conn.execute("DELETE FROM users WHERE telegram_id = $1", telegram_id)
-            await self._clear_user_cache(telegram_id)
-            await self._clear_pattern_cache("search:*")
+            await self.purge_users([telegram_id])
             return True
         except Exception as e:
             logger.error(f"Ошибка полного удаления пользователя {telegram_id}: {e}")
-            return False
\ No newline at end of file
+            return False
+
+    _PURGE_CACHE_CHUNK = 1000  # пользователей на одну пачку удаления ключей Redis
+
+    async def purge_users(self, telegram_ids: List[int]) -> int:
+        """Массовое удаление пользователей со всеми данными
+
+        Каждая зависимая таблица чистится одним DELETE ... = ANY($1) в общей транзакции,
+        кэши инвалидируются один раз в конце. Кэши лайков и мэтчей собеседников удалённых
+        пользователей тоже сбрасываются.
+
+        Returns:
+            число удалённых записей users
+        """
+        ids = sorted(set(telegram_ids))
+        if not ids:
+            return 0
+
+        async with self._pg_pool.acquire() as conn:
+            async with conn.transaction():
+                # В приложение возвращаются только различные собеседники, а не все удалённые строки
+                like_recipients = await conn.fetch(
+                    '''WITH deleted AS (
+                           DELETE FROM likes WHERE from_user = ANY($1::bigint[]) OR to_user = ANY($1::bigint[])
+                           RETURNING to_user
+                       )
+                       SELECT DISTINCT to_user as partner FROM deleted WHERE to_user <> ALL($1::bigint[])''',
+                    ids
+                )
+                match_partners = await conn.fetch(
+                    '''WITH deleted AS (
+                           DELETE FROM matches WHERE user1 = ANY($1::bigint[]) OR user2 = ANY($1::bigint[])
+                           RETURNING user1, user2
+                       )
+                       SELECT user1 as partner FROM deleted WHERE user1 <> ALL($1::bigint[])
+                       UNION
+                       SELECT user2 FROM deleted WHERE user2 <> ALL($1::bigint[])''',
+                    ids
+                )
+                await conn.execute(
+                    "DELETE FROM skipped_likes WHERE user_id = ANY($1::bigint[]) OR skipped_user_id = ANY($1::bigint[])",
+                    ids
+                )
+                await conn.execute(
+                    "DELETE FROM search_skipped WHERE user_id = ANY($1::bigint[]) OR skipped_user_id = ANY($1::bigint[])",
+                    ids
+                )
+                await conn.execute("DELETE FROM search_skip_bitmaps WHERE user_id = ANY($1::bigint[])", ids)
+                await conn.execute(
+                    "DELETE FROM reports WHERE reporter_id = ANY($1::bigint[]) OR reported_user_id = ANY($1::bigint[])",
+                    ids
+                )
+                await conn.execute("DELETE FROM bans WHERE user_id = ANY($1::bigint[])", ids)
+                await conn.execute("DELETE FROM engagement_history WHERE user_id = ANY($1::bigint[])", ids)
+                await conn.execute("DELETE FROM profiles WHERE telegram_id = ANY($1::bigint[])", ids)
+                status = await conn.execute("DELETE FROM users WHERE telegram_id = ANY($1::bigint[])", ids)
+
+        like_recipients = [row['partner'] for row in like_recipients]
+        match_partners = [row['partner'] for row in match_partners]
+
+        for telegram_id in ids:
+            self._local_cache.invalidate('user', telegram_id)
+            self._bans.remove(telegram_id)
+            for game in settings.GAMES:
+                self._local_cache.invalidate('profile', (telegram_id, game))
+
+        try:
+            for i in range(0, len(ids), self._PURGE_CACHE_CHUNK):
+                chunk = ids[i:i + self._PURGE_CACHE_CHUNK]
+                keys = [f"user:{telegram_id}" for telegram_id in chunk]
+                indexes = []
+                for telegram_id in chunk:
+                    keys.extend(self._user_cache_keys(telegram_id, 'profile', 'matches', 'likes'))
+                    keys.extend(self._exclusions_key(telegram_id, game) for game in settings.GAMES)
+                    indexes.extend(self._search_keys_index(telegram_id, game) for game in settings.GAMES)
+                await self._delete_cache_keys(keys, indexes)
+                await self._redis.zrem(self._BANS_KEY, *map(str, chunk))
+
+            partners = [
+                key
+                for user_id in like_recipients for key in self._user_cache_keys(user_id, 'likes')
+            ] + [
+                key
+                for user_id in match_partners for key in self._user_cache_keys(user_id, 'matches')
+            ]
+            for i in range(0, len(partners), self._PURGE_CACHE_CHUNK):
+                await self._delete_cache(*partners[i:i + self._PURGE_CACHE_CHUNK])
+        except Exception as e:
+            logger.warning(f"Ошибка очистки кэша удалённых пользователей: {e}")
+
+        await self.invalidate_search_cache()
+        if self._search_index:
+            for telegram_id in ids:
+                self._search_index.discard(telegram_id)
+
+        deleted = int(status.split()[-1])
+        logger.info(f"Удалено пользователей: {deleted} (запрошено {len(ids)})")
+        return deleted
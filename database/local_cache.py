@@ -0,0 +1,64 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+from database.metrics import record_cache
+
+_MISSING = object()
+
+
+class LocalCache:
+    """In-process LRU-кэш с TTL перед Redis, разделённый на семейства ключей
+
+    У каждого семейства свой лимит записей и TTL. TTL короткий: другие процессы
+    инвалидируют только Redis, поэтому локальная копия может отставать не дольше TTL.
+    """
+
+    def __init__(self, families: Dict[str, Tuple[int, float]]):
+        """families: {семейство: (максимум записей, TTL в секундах)}"""
+        self._limits = dict(families)
+        self._entries: Dict[str, OrderedDict] = {name: OrderedDict() for name in families}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _copy(value):
+        # Вызывающий код может менять полученный словарь - наружу отдаём копию верхнего уровня
+        if isinstance(value, dict):
+            return dict(value)
+        if isinstance(value, list):
+            return [dict(item) if isinstance(item, dict) else item for item in value]
+        return value
+
+    def get(self, family: str, key: Hashable, default=None) -> Any:
+        entries = self._entries[family]
+        entry = entries.get(key, _MISSING)
+        if entry is _MISSING or entry[0] < time.monotonic():
+            if entry is not _MISSING:
+                del entries[key]
+            self.misses += 1
+            return default
+        entries.move_to_end(key)
+        self.hits += 1
+        record_cache(True)
+        return self._copy(entry[1])
+
+    def set(self, family: str, key: Hashable, value: Any):
+        size, ttl = self._limits[family]
+        entries = self._entries[family]
+        entries[key] = (time.monotonic() + ttl, self._copy(value))
+        entries.move_to_end(key)
+        while len(entries) > size:
+            entries.popitem(last=False)
+
+    def invalidate(self, family: str, key: Optional[Hashable] = None):
+        """Удаление одного ключа семейства (key=None - всего семейства)"""
+        if key is None:
+            self._entries[family].clear()
+        else:
+            self._entries[family].pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        stats = {f"{name}_size": len(entries) for name, entries in self._entries.items()}
+        stats.update(hits=self.hits, misses=self.misses)
+        return stats
@@ -0,0 +1,210 @@
+import bisect
+import functools
+import inspect
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Границы корзин по умолчанию, секунды (от 0.5 мс до 5 с)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными корзинами (как histogram в Prometheus)"""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # последняя - +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Оценка квантиля по верхней границе корзины (None - нет наблюдений)"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def snapshot(self) -> 'Histogram':
+        copy = Histogram(self.buckets)
+        copy.counts, copy.count, copy.sum = list(self.counts), self.count, self.sum
+        return copy
+
+    def since(self, previous: 'Histogram') -> 'Histogram':
+        """Наблюдения, сделанные после снимка previous"""
+        delta = Histogram(self.buckets)
+        delta.counts = [a - b for a, b in zip(self.counts, previous.counts)]
+        delta.count, delta.sum = self.count - previous.count, self.sum - previous.sum
+        return delta
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_histogram(name: str, help_text: str,
+                     series: Iterable[Tuple[Dict[str, str], Histogram]]) -> List[str]:
+    """Строки text exposition format Prometheus для набора гистограмм одной метрики"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in series:
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f"{name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+    return lines
+
+
+def render_simple(name: str, kind: str, help_text: str,
+                  series: Iterable[Tuple[Dict[str, str], float]]) -> List[str]:
+    """Строки для gauge/counter"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    lines.extend(f"{name}{_labels(labels)} {value}" for labels, value in series)
+    return lines
+
+
+# === МЕТРИКИ МЕТОДОВ Database ===
+
+class _Call:
+    """Текущий вызов метода: исход обращения к кэшу и время в PostgreSQL/Redis"""
+
+    __slots__ = ('parent', 'cache', 'postgres', 'redis')
+
+    def __init__(self, parent: Optional['_Call']):
+        self.parent = parent
+        self.cache: Optional[str] = None  # 'hit' / 'miss' / None - кэш не читался
+        self.postgres = 0.0
+        self.redis = 0.0
+
+
+_current_call: ContextVar[Optional[_Call]] = ContextVar('db_current_call', default=None)
+
+
+def record_cache(hit: bool):
+    """Исход чтения кэша в текущем вызове (любой промах делает вызов промахом)"""
+    call = _current_call.get()
+    if call is not None:
+        call.cache = 'miss' if not hit else (call.cache or 'hit')
+
+
+def record_backend(backend: str, seconds: float):
+    """Время, проведённое текущим вызовом в PostgreSQL ('postgres') или Redis ('redis')"""
+    call = _current_call.get()
+    if call is not None:
+        setattr(call, backend, getattr(call, backend) + seconds)
+
+
+class MethodMetrics:
+    """Латентность, число вызовов и ошибок публичных корутин Database
+
+    Латентность размечается исходом кэша (hit/miss/none); отдельно копится время
+    в PostgreSQL (удержание соединения пула) и Redis (ожидание ответов сервера).
+    Вложенные вызовы добавляют своё время бэкендов и вызывающему методу.
+    """
+
+    def __init__(self):
+        self.latency: Dict[Tuple[str, str], Histogram] = {}
+        self.backend: Dict[Tuple[str, str], Histogram] = {}
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    @staticmethod
+    def _histogram(store: Dict, key: Tuple[str, str]) -> Histogram:
+        histogram = store.get(key)
+        if histogram is None:
+            histogram = store[key] = Histogram()
+        return histogram
+
+    def observe(self, method: str, call: _Call, elapsed: float, failed: bool):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if failed:
+            self.errors[method] = self.errors.get(method, 0) + 1
+        self._histogram(self.latency, (method, call.cache or 'none')).observe(elapsed)
+        if call.postgres:
+            self._histogram(self.backend, (method, 'postgres')).observe(call.postgres)
+        if call.redis:
+            self._histogram(self.backend, (method, 'redis')).observe(call.redis)
+
+    def wrap(self, method: str, func):
+        metrics = self
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            parent = _current_call.get()
+            call = _Call(parent)
+            token = _current_call.set(call)
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                _current_call.reset(token)
+                metrics.observe(method, call, time.perf_counter() - started, failed)
+                if parent is not None:
+                    parent.postgres += call.postgres
+                    parent.redis += call.redis
+        return wrapper
+
+    def instrument(self, exclude: Iterable[str] = ()):
+        """Декоратор класса: оборачивает все публичные корутины, кроме exclude"""
+        exclude = set(exclude)
+
+        def decorator(cls):
+            for name, func in list(vars(cls).items()):
+                if name.startswith('_') or name in exclude or not inspect.iscoroutinefunction(func):
+                    continue
+                setattr(cls, name, self.wrap(name, func))
+            return cls
+        return decorator
+
+    def slowest(self, limit: int = 5) -> List[Tuple[str, int, Optional[float]]]:
+        """Методы с наибольшим p99: [(метод, вызовов, p99 с)]"""
+        merged: Dict[str, Histogram] = {}
+        for (method, _), histogram in self.latency.items():
+            total = merged.setdefault(method, Histogram(histogram.buckets))
+            total.counts = [a + b for a, b in zip(total.counts, histogram.counts)]
+            total.count += histogram.count
+            total.sum += histogram.sum
+        ranked = sorted(merged.items(), key=lambda item: (item[1].quantile(0.99), item[1].sum), reverse=True)
+        return [(method, histogram.count, histogram.quantile(0.99)) for method, histogram in ranked[:limit]]
+
+    def prometheus(self) -> List[str]:
+        lines = render_histogram(
+            'cgdv_db_method_duration_seconds', 'Длительность методов Database по исходу кэша',
+            [({'method': method, 'cache': cache}, hist) for (method, cache), hist in sorted(self.latency.items())]
+        )
+        lines += render_histogram(
+            'cgdv_db_method_backend_seconds', 'Время метода в PostgreSQL и Redis',
+            [({'method': method, 'backend': backend}, hist) for (method, backend), hist in sorted(self.backend.items())]
+        )
+        lines += render_simple('cgdv_db_method_calls_total', 'counter', 'Вызовов методов Database',
+                               [({'method': method}, count) for method, count in sorted(self.calls.items())])
+        lines += render_simple('cgdv_db_method_errors_total', 'counter', 'Исключений в методах Database',
+                               [({'method': method}, count) for method, count in sorted(self.errors.items())])
+        return lines
+
+
+METHOD_METRICS = MethodMetrics()
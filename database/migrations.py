@@ -0,0 +1,647 @@
+import json
+import time
+import logging
+from typing import Awaitable, Callable, List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[..., Awaitable[None]]  # async apply(db, conn)
+    transactional: bool = True             # CREATE INDEX CONCURRENTLY нельзя выполнять в транзакции
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str, transactional: bool = True):
+    """Регистрация миграции схемы; версии применяются строго по возрастанию"""
+    def decorator(func):
+        MIGRATIONS.append(Migration(version, name, func, transactional))
+        return func
+    return decorator
+
+
+class MigrationRunner:
+    """Применение миграций с учётом версии в таблице schema_version
+
+    Старт приложения - одна проверка версии; DDL выполняется только при наличии
+    неприменённых миграций. Параллельные запуски сериализуются advisory-блокировкой.
+    """
+
+    LOCK_KEY = 0x636764760001  # pg_advisory_lock: "cgdv" + 1
+
+    def __init__(self, migrations: List[Migration] = None):
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+        versions = [m.version for m in self.migrations]
+        if len(set(versions)) != len(versions):
+            raise ValueError(f"Повторяющиеся версии миграций: {versions}")
+
+    @property
+    def latest(self) -> int:
+        return self.migrations[-1].version if self.migrations else 0
+
+    async def current_version(self, conn) -> int:
+        return await conn.fetchval('''
+            SELECT CASE WHEN to_regclass('schema_version') IS NULL THEN 0
+                        ELSE (SELECT COALESCE(MAX(version), 0) FROM schema_version)
+                   END
+        ''')
+
+    async def run(self, db, conn) -> List[int]:
+        """Применение всех неприменённых миграций; возвращает список применённых версий"""
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms INTEGER
+            )
+        ''')
+        await conn.execute("SELECT pg_advisory_lock($1)", self.LOCK_KEY)
+        try:
+            # Версия перечитывается под блокировкой: другой процесс мог успеть всё применить
+            current = await self.current_version(conn)
+            applied = []
+            for item in self.migrations:
+                if item.version <= current:
+                    continue
+                logger.info(f"🔧 Миграция {item.version}: {item.name}...")
+                started = time.monotonic()
+                if item.transactional:
+                    async with conn.transaction():
+                        await item.apply(db, conn)
+                        await self._record(conn, item, started)
+                else:
+                    await item.apply(db, conn)
+                    await self._record(conn, item, started)
+                applied.append(item.version)
+                logger.info(f"✅ Миграция {item.version} применена за {time.monotonic() - started:.1f}с")
+            return applied
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", self.LOCK_KEY)
+
+    @staticmethod
+    async def _record(conn, item: Migration, started: float):
+        await conn.execute(
+            "INSERT INTO schema_version (version, name, duration_ms) VALUES ($1, $2, $3)",
+            item.version, item.name, int((time.monotonic() - started) * 1000)
+        )
+
+
+# ==================== МИГРАЦИИ ====================
+# Базы, созданные до появления schema_version, проходят все миграции с первой: DDL идемпотентен
+# (IF NOT EXISTS), а правки шаблонов рассылки при повторе по порядку дают то же итоговое состояние.
+
+
+@migration(1, 'initial_tables')
+async def _initial_tables(db, conn):
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            telegram_id BIGINT PRIMARY KEY,
+            username TEXT,
+            current_game TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS likes (
+            id SERIAL PRIMARY KEY,
+            from_user BIGINT,
+            to_user BIGINT,
+            game TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(from_user, to_user, game)
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS matches (
+            id SERIAL PRIMARY KEY,
+            user1 BIGINT,
+            user2 BIGINT,
+            game TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user1, user2, game)
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS skipped_likes (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            skipped_user_id BIGINT,
+            game TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, skipped_user_id, game)
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_skipped (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT,
+            skipped_user_id BIGINT,
+            game TEXT,
+            skip_count INTEGER DEFAULT 1,
+            last_skipped TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, skipped_user_id, game)
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS reports (
+            id SERIAL PRIMARY KEY,
+            reporter_id BIGINT,
+            reported_user_id BIGINT,
+            game TEXT,
+            report_reason TEXT DEFAULT 'inappropriate_content',
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reviewed_at TIMESTAMP,
+            admin_id BIGINT,
+            UNIQUE(reporter_id, reported_user_id, game)
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS bans (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT UNIQUE,
+            reason TEXT DEFAULT 'нарушение правил',
+            expires_at TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS profiles (
+            id SERIAL PRIMARY KEY,
+            telegram_id BIGINT,
+            game TEXT,
+            name TEXT,
+            nickname TEXT,
+            age INTEGER,
+            rating TEXT,
+            region TEXT DEFAULT 'eeu',
+            positions JSONB DEFAULT '[]'::jsonb,
+            goals JSONB DEFAULT '["any"]'::jsonb,
+            additional_info TEXT,
+            photo_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(telegram_id, game)
+        )
+    ''')
+
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS ad_posts (
+            id SERIAL PRIMARY KEY,
+            message_id BIGINT NOT NULL,
+            chat_id BIGINT NOT NULL,
+            caption TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_by BIGINT,
+            show_interval INTEGER DEFAULT 3,
+            games TEXT[] DEFAULT ARRAY['dota', 'cs']::TEXT[]
+        )
+    ''')
+
+
+@migration(2, 'legacy_columns')
+async def _legacy_columns(db, conn):
+    """Колонки, добавлявшиеся к таблицам по мере развития бота"""
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS goals JSONB DEFAULT '[\"any\"]'::jsonb")
+    await conn.execute("UPDATE profiles SET goals = '[\"any\"]'::jsonb WHERE goals IS NULL")
+
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS profile_url TEXT")
+
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+    await conn.execute("UPDATE profiles SET updated_at = created_at WHERE updated_at IS NULL")
+
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS role TEXT DEFAULT 'player'")
+    await conn.execute("UPDATE profiles SET role = 'player' WHERE role IS NULL")
+
+    await conn.execute("ALTER TABLE likes ADD COLUMN IF NOT EXISTS message TEXT")
+
+    await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS games TEXT[] DEFAULT ARRAY['dota', 'cs']::TEXT[]")
+
+    await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS regions TEXT[] DEFAULT ARRAY['all']::TEXT[]")
+
+    await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS ad_type TEXT DEFAULT 'forward'")
+
+    await conn.execute("ALTER TABLE ad_posts ADD COLUMN IF NOT EXISTS expires_at TIMESTAMP")
+
+    await conn.execute("ALTER TABLE reports ADD COLUMN IF NOT EXISTS report_message TEXT")
+
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS gender TEXT")
+
+    await conn.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_activity TIMESTAMP")
+
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS is_active BOOLEAN DEFAULT TRUE")
+    await conn.execute("UPDATE profiles SET is_active = TRUE WHERE is_active IS NULL")
+
+
+@migration(3, 'engagement_tables')
+async def _engagement_tables(db, conn):
+    """Бывший utils/scripts/migrate_engagement_tables.py"""
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS engagement_templates (
+            id SERIAL PRIMARY KEY,
+            type TEXT NOT NULL,
+            message_text TEXT NOT NULL,
+            conditions JSONB,
+            min_interval_hours INTEGER DEFAULT 24,
+            priority INTEGER DEFAULT 0,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS engagement_history (
+            id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            template_id INTEGER,
+            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            data JSONB
+        )
+    ''')
+
+
+_FIXED_TEMPLATE_5 = """Тебя не было 3 дня
+
+За это время появилось <b>{new_profiles}</b> новых анкет
+
+Возвращайся — вдруг среди них найдётся твой будущий тиммейт!"""
+
+
+@migration(4, 'engagement_templates_fix')
+async def _engagement_templates_fix(db, conn):
+    """Бывший utils/scripts/migrate_fix_engagement_templates.py"""
+    await conn.execute("UPDATE engagement_templates SET min_interval_hours = 4 WHERE type = 'inactive_2h'")
+    await conn.execute("UPDATE engagement_templates SET message_text = $1 WHERE id = 5", _FIXED_TEMPLATE_5)
+
+
+@migration(5, 'engagement_intervals_and_conditions')
+async def _engagement_intervals_and_conditions(db, conn):
+    """Бывший utils/scripts/migrate_fix_intervals_and_conditions.py"""
+    await conn.execute("UPDATE engagement_templates SET min_interval_hours = 96 WHERE type = 'inactive_3d'")
+
+    rows = await conn.fetch("SELECT id, conditions FROM engagement_templates WHERE type = 'inactive_1w'")
+    for row in rows:
+        conditions = row['conditions']
+        if isinstance(conditions, str):
+            conditions = json.loads(conditions)
+        elif conditions is None:
+            conditions = {}
+        conditions['max_inactive_hours'] = 336
+        await conn.execute(
+            "UPDATE engagement_templates SET conditions = $1::jsonb WHERE id = $2",
+            json.dumps(conditions), row['id']
+        )
+
+
+_TEXTS_INACTIVE_3D = [
+    "Тебя не было 3 дня\n\nЗа это время {profile_views} человек просматривали анкеты в поиске\n\nВозможно среди них есть подходящий тиммейт",
+    "Ты не заходил 3 дня\n\n{profile_views} игроков просматривали анкеты пока тебя не было\n\nВозможно среди них есть подходящий тиммейт",
+    "За 3 дня твоего отсутствия в боте появились {profile_views} новых игроков\n\nОни тоже ищут команду — не упусти момент",
+]
+
+_TEXTS_INACTIVE_1W = [
+    "Ты не заходил уже неделю\n\nЗа это время {profile_views} человек искали тиммейта в боте\n\nВернись и проверь — среди них может быть подходящий вариант",
+    "Прошла неделя с последнего визита\n\n{profile_views} игроков просматривали анкеты пока тебя не было\n\nТвоя анкета ждёт",
+    "За неделю в боте было {profile_views} человек в поиске\n\nВозвращайся — твоя анкета по-прежнему активна",
+]
+
+_TEXT_UNVIEWED_LIKES = "У тебя есть непросмотренные лайки\n\nКто-то оценил твою анкету — проверь, может это взаимно"
+
+
+@migration(6, 'engagement_templates_redesign')
+async def _engagement_templates_redesign(db, conn):
+    """Бывший utils/scripts/migrate_redesign_engagement_templates.py"""
+    await conn.execute("DELETE FROM engagement_templates WHERE type IN ('inactive_2h', 'inactive_1m')")
+
+    for template_type, texts in (('inactive_3d', _TEXTS_INACTIVE_3D), ('inactive_1w', _TEXTS_INACTIVE_1W)):
+        rows = await conn.fetch(
+            "SELECT id FROM engagement_templates WHERE type = $1 ORDER BY id", template_type
+        )
+        for row, text in zip(rows, texts):
+            await conn.execute(
+                "UPDATE engagement_templates SET message_text = $1 WHERE id = $2", text, row['id']
+            )
+
+    await conn.execute(
+        "UPDATE engagement_templates SET message_text = $1 WHERE type = 'unviewed_likes'",
+        _TEXT_UNVIEWED_LIKES
+    )
+
+
+@migration(7, 'engagement_templates_cleanup')
+async def _engagement_templates_cleanup(db, conn):
+    """Бывший utils/scripts/migrate_cleanup_templates.py"""
+    await conn.execute("DELETE FROM engagement_templates WHERE type = 'new_profiles_match'")
+    await conn.execute("UPDATE engagement_templates SET min_interval_hours = 72 WHERE type = 'unviewed_likes'")
+
+
+@migration(8, 'profiles_quality_score')
+async def _profiles_quality_score(db, conn):
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS quality_score INTEGER")
+    backfilled = await db._backfill_quality_scores(conn)
+    logger.info(f"quality_score пересчитан для {backfilled} анкет")
+
+
+@migration(9, 'profiles_bitmasks')
+async def _profiles_bitmasks(db, conn):
+    from database import bitmasks
+
+    # Колонки добавляются без DEFAULT, чтобы backfill нашёл существующие строки по NULL
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS positions_mask BIGINT")
+    await conn.execute("ALTER TABLE profiles ADD COLUMN IF NOT EXISTS goals_mask BIGINT")
+    backfilled = await db._backfill_profile_masks(conn)
+    await conn.execute("ALTER TABLE profiles ALTER COLUMN positions_mask SET DEFAULT 0")
+    await conn.execute(f"ALTER TABLE profiles ALTER COLUMN goals_mask SET DEFAULT {bitmasks.ANY_BIT}")
+    logger.info(f"Маски позиций и целей пересчитаны для {backfilled} анкет")
+
+
+# Лайк, проверка взаимности и мэтч за одно обращение к базе.
+# Advisory-блокировка пары сериализует встречные лайки: второй видит лайк первого
+# (каждый запрос функции берёт новый снимок), поэтому мэтч не теряется.
+_REGISTER_LIKE_SQL = '''
+        CREATE OR REPLACE FUNCTION register_like(p_from BIGINT, p_to BIGINT, p_game TEXT, p_message TEXT)
+        RETURNS TEXT
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtextextended(
+                LEAST(p_from, p_to) || ':' || GREATEST(p_from, p_to) || ':' || p_game, 0
+            ));
+
+            INSERT INTO likes (from_user, to_user, game, message)
+            VALUES (p_from, p_to, p_game, p_message)
+            ON CONFLICT (from_user, to_user, game) DO NOTHING;
+            IF NOT FOUND THEN
+                RETURN 'duplicate';
+            END IF;
+
+            IF NOT EXISTS (
+                SELECT 1 FROM likes WHERE from_user = p_to AND to_user = p_from AND game = p_game
+            ) THEN
+                RETURN 'like';
+            END IF;
+
+            INSERT INTO matches (user1, user2, game)
+            VALUES (LEAST(p_from, p_to), GREATEST(p_from, p_to), p_game)
+            ON CONFLICT DO NOTHING;
+            RETURN 'match';
+        END;
+        $$
+'''
+
+
+@migration(10, 'register_like_function')
+async def _register_like_function(db, conn):
+    await conn.execute(_REGISTER_LIKE_SQL)
+
+
+_INDEXES = [
+    # === ОСНОВНЫЕ ИНДЕКСЫ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game ON profiles(game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_telegram_id_game ON profiles(telegram_id, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_telegram_id ON users(telegram_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_current_game ON users(current_game)",
+
+    # === ИНДЕКСЫ ДЛЯ ЛАЙКОВ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_to_game ON likes(to_user, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_from_game ON likes(from_user, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_from_to_game ON likes(from_user, to_user, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_created_at_desc ON likes(created_at DESC)",
+
+    # === ИНДЕКСЫ ДЛЯ МЭТЧЕЙ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_user1_game ON matches(user1, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_user2_game ON matches(user2, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_users_game ON matches(user1, user2, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_matches_created_at_desc ON matches(created_at DESC)",
+
+    # === ИНДЕКСЫ ДЛЯ ПОИСКА ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game_rating ON profiles(game, rating)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game_region ON profiles(game, region)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game_active ON profiles(game, telegram_id) WHERE telegram_id IS NOT NULL",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_goals_gin ON profiles USING gin (goals)",
+
+    # === GIN ИНДЕКС ДЛЯ ПОЗИЦИЙ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_positions_gin ON profiles USING gin (positions)",
+
+    # === СОСТАВНЫЕ ИНДЕКСЫ ДЛЯ СЛОЖНЫХ ЗАПРОСОВ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_search_composite ON profiles(game, rating, region) WHERE telegram_id IS NOT NULL",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_likes_mutual_check ON likes(to_user, from_user, game)",
+
+    # === ИНДЕКСЫ ДЛЯ ПРОПУСКОВ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_search_skipped_user_game ON search_skipped(user_id, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_skipped_likes_user_game ON skipped_likes(user_id, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_search_skipped_composite ON search_skipped(user_id, skipped_user_id, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_skipped_likes_composite ON skipped_likes(user_id, skipped_user_id, game)",
+
+    # === ИНДЕКСЫ ДЛЯ ОТЧЕТОВ И БАНОВ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reports_status ON reports(status)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reports_reported_user_game ON reports(reported_user_id, game)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_reports_created_at_desc ON reports(created_at DESC) WHERE status = 'pending'",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_bans_user_expires ON bans(user_id, expires_at)",
+
+    # === ЧАСТИЧНЫЕ ИНДЕКСЫ ДЛЯ АКТИВНЫХ ЗАПИСЕЙ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_active_with_photo ON profiles(game, telegram_id) WHERE photo_id IS NOT NULL",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_updated_at ON profiles(updated_at)",
+
+    # === ИНДЕКС ДЛЯ СОРТИРОВКИ ПО ЗАПОЛНЕННОСТИ ===
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_profiles_game_quality ON profiles(game, quality_score DESC) WHERE is_active = TRUE"
+]
+
+
+@migration(11, 'indexes', transactional=False)
+async def _indexes(db, conn):
+    for index_sql in _INDEXES:
+        try:
+            await conn.execute(index_sql)
+        except Exception as e:
+            index_name = index_sql.split("idx_")[1].split(" ")[0] if "idx_" in index_sql else "unknown"
+            logger.warning(f"Индекс {index_name} уже существует или ошибка: {e}")
+
+
+_PARTITION_INDEXES = {
+    'likes': [
+        "CREATE INDEX IF NOT EXISTS idx_likes_to_game ON likes(to_user, game)",
+        "CREATE INDEX IF NOT EXISTS idx_likes_from_game ON likes(from_user, game)",
+        "CREATE INDEX IF NOT EXISTS idx_likes_from_to_game ON likes(from_user, to_user, game)",
+        "CREATE INDEX IF NOT EXISTS idx_likes_created_at_desc ON likes(created_at DESC)",
+        "CREATE INDEX IF NOT EXISTS idx_likes_mutual_check ON likes(to_user, from_user, game)",
+    ],
+    'matches': [
+        "CREATE INDEX IF NOT EXISTS idx_matches_user1_game ON matches(user1, game)",
+        "CREATE INDEX IF NOT EXISTS idx_matches_user2_game ON matches(user2, game)",
+        "CREATE INDEX IF NOT EXISTS idx_matches_users_game ON matches(user1, user2, game)",
+        "CREATE INDEX IF NOT EXISTS idx_matches_created_at_desc ON matches(created_at DESC)",
+    ],
+    'engagement_history': [
+        "CREATE INDEX IF NOT EXISTS idx_engagement_history_user_sent ON engagement_history(user_id, sent_at DESC)",
+    ],
+    'broadcast_stats': [
+        "CREATE INDEX IF NOT EXISTS idx_broadcast_stats_broadcast ON broadcast_stats(broadcast_id, status)",
+    ],
+}
+
+
+@migration(12, 'partition_append_only_tables')
+async def _partition_append_only_tables(db, conn):
+    # likes, matches, engagement_history, broadcast_stats -> помесячные партиции;
+    # срок хранения соблюдается удалением целых партиций (PartitionManager.maintain).
+    # Индексы создаются на родительской таблице и наследуются каждой партицией.
+    from database.partitions import PARTITIONED_TABLES, PartitionManager
+
+    manager = PartitionManager(PARTITIONED_TABLES)
+    for table in PARTITIONED_TABLES:
+        await manager.convert(conn, table, _PARTITION_INDEXES.get(table.name, []))
+
+    # UNIQUE(from_user, to_user, game) без ключа партиционирования невозможен:
+    # register_like проверяет дубликаты под advisory-блокировкой пары, остальных
+    # писателей останавливают триггеры из миграции 14.
+    await conn.execute('''
+        CREATE OR REPLACE FUNCTION register_like(p_from BIGINT, p_to BIGINT, p_game TEXT, p_message TEXT)
+        RETURNS TEXT
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtextextended(
+                LEAST(p_from, p_to) || ':' || GREATEST(p_from, p_to) || ':' || p_game, 0
+            ));
+
+            IF EXISTS (
+                SELECT 1 FROM likes WHERE from_user = p_from AND to_user = p_to AND game = p_game
+            ) THEN
+                RETURN 'duplicate';
+            END IF;
+
+            INSERT INTO likes (from_user, to_user, game, message)
+            VALUES (p_from, p_to, p_game, p_message);
+
+            IF NOT EXISTS (
+                SELECT 1 FROM likes WHERE from_user = p_to AND to_user = p_from AND game = p_game
+            ) THEN
+                RETURN 'like';
+            END IF;
+
+            IF NOT EXISTS (
+                SELECT 1 FROM matches
+                WHERE user1 = LEAST(p_from, p_to) AND user2 = GREATEST(p_from, p_to) AND game = p_game
+            ) THEN
+                INSERT INTO matches (user1, user2, game)
+                VALUES (LEAST(p_from, p_to), GREATEST(p_from, p_to), p_game);
+            END IF;
+            RETURN 'match';
+        END;
+        $$
+    ''')
+
+
+@migration(13, 'search_skip_bitmaps')
+async def _search_skip_bitmaps(db, conn):
+    # Уплотнённые пропуски поиска: одна строка на (пользователь, игра) с битовой картой
+    # по profiles.id (database/skip_store.py); search_skipped остаётся журналом свежих пропусков.
+    # Перенос накопленных строк выполняет фоновое уплотнение (Database.compact_search_skips).
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS search_skip_bitmaps (
+            user_id BIGINT NOT NULL,
+            game TEXT NOT NULL,
+            skips BYTEA NOT NULL,
+            skipped_total INTEGER NOT NULL DEFAULT 0,
+            compacted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, game)
+        )
+    ''')
+
+
+# Замена UNIQUE, потерянных при партиционировании (миграция 12): BEFORE INSERT-триггер
+# берёт ту же advisory-блокировку пары, что register_like, и отклоняет дубликат с
+# unique_violation - как прежнее ограничение, для любого пути записи (скрипты, админка).
+# Миграция 15 вернула likes и matches в обычные таблицы с UNIQUE и удалила триггеры.
+_DEDUPE_TRIGGERS = {
+    'likes': (
+        "LEAST(NEW.from_user, NEW.to_user) || ':' || GREATEST(NEW.from_user, NEW.to_user) || ':' || NEW.game",
+        "from_user = NEW.from_user AND to_user = NEW.to_user AND game = NEW.game",
+    ),
+    'matches': (
+        "LEAST(NEW.user1, NEW.user2) || ':' || GREATEST(NEW.user1, NEW.user2) || ':' || NEW.game",
+        "user1 = NEW.user1 AND user2 = NEW.user2 AND game = NEW.game",
+    ),
+}
+
+
+@migration(14, 'partitioned_tables_integrity')
+async def _partitioned_tables_integrity(db, conn):
+    from database.partitions import PartitionManager
+
+    for table, (lock_key, duplicate) in _DEDUPE_TRIGGERS.items():
+        if not await PartitionManager.is_partitioned(conn, table):
+            continue
+        await conn.execute(f'''
+            CREATE OR REPLACE FUNCTION {table}_dedupe() RETURNS trigger
+            LANGUAGE plpgsql AS $$
+            BEGIN
+                PERFORM pg_advisory_xact_lock(hashtextextended({lock_key}, 0));
+                IF EXISTS (SELECT 1 FROM {table} WHERE {duplicate}) THEN
+                    RAISE EXCEPTION 'duplicate key in {table}: %', row_to_json(NEW)
+                        USING ERRCODE = 'unique_violation';
+                END IF;
+                RETURN NEW;
+            END;
+            $$
+        ''')
+        await conn.execute(f"DROP TRIGGER IF EXISTS {table}_dedupe ON {table}")
+        await conn.execute(
+            f"CREATE TRIGGER {table}_dedupe BEFORE INSERT ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION {table}_dedupe()"
+        )
+
+    # Внешний ключ broadcast_stats -> broadcasts не пережил перевод в партиции (LIKE его не
+    # копирует). Партиционированная таблица может ссылаться на обычную - восстанавливаем;
+    # статистика удалённых за это время рассылок удаляется, иначе ключ не создать.
+    if (await conn.fetchval("SELECT to_regclass('broadcast_stats')") is not None
+            and await conn.fetchval("SELECT to_regclass('broadcasts')") is not None):
+        has_fk = await conn.fetchval('''
+            SELECT EXISTS (SELECT 1 FROM pg_constraint
+                           WHERE conrelid = 'broadcast_stats'::regclass AND contype = 'f')
+        ''')
+        if not has_fk:
+            orphans = await conn.execute('''
+                DELETE FROM broadcast_stats s
+                WHERE NOT EXISTS (SELECT 1 FROM broadcasts b WHERE b.id = s.broadcast_id)
+            ''')
+            await conn.execute(
+                "ALTER TABLE broadcast_stats ADD CONSTRAINT broadcast_stats_broadcast_id_fkey "
+                "FOREIGN KEY (broadcast_id) REFERENCES broadcasts(id)"
+            )
+            logger.info(f"Внешний ключ broadcast_stats -> broadcasts восстановлен ({orphans})")
+
+
+# (колонки UNIQUE, порядок, в котором из дубликатов остаётся первая строка)
+_PLAIN_TABLES = {
+    'likes': (('from_user', 'to_user', 'game'), 'created_at, id'),
+    'matches': (('user1', 'user2', 'game'), 'created_at, id'),
+}
+
+
+@migration(15, 'likes_matches_plain_tables')
+async def _likes_matches_plain_tables(db, conn):
+    # Партиции likes/matches ничего не давали: срок хранения бессрочный, горячие запросы
+    # (register_like, входящие лайки, исключения поиска) не фильтруют по created_at и
+    # проверяли бы каждую партицию, а UNIQUE заменяли триггеры с advisory-блокировкой.
+    from database.partitions import PartitionManager
+
+    manager = PartitionManager()
+    for table, (unique, order_by) in _PLAIN_TABLES.items():
+        await conn.execute(f"DROP TRIGGER IF EXISTS {table}_dedupe ON {table}")
+        await conn.execute(f"DROP FUNCTION IF EXISTS {table}_dedupe()")
+        await manager.unpartition(conn, table, unique, order_by, _PARTITION_INDEXES[table])
+
+    # Снова ON CONFLICT по восстановленным UNIQUE вместо явных проверок из миграции 12
+    await conn.execute(_REGISTER_LIKE_SQL)
@@ -0,0 +1,233 @@
+import os
+import re
+import logging
+from datetime import date
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionedTable(NamedTuple):
+    name: str
+    column: str                          # ключ партиционирования (TIMESTAMP)
+    retention_env: Optional[str] = None  # переменная окружения со сроком хранения в месяцах
+    default_retention: Optional[int] = None  # None - партиции не удаляются
+
+
+# Append-only таблицы с помесячным партиционированием по времени записи и сроком хранения.
+# likes и matches сюда не входят: они хранятся бессрочно, горячие запросы к ним не фильтруют
+# по created_at (партиции не отсекались бы), а UNIQUE(пара, игра) без ключа партиционирования
+# невозможен - эти таблицы остаются обычными (миграция 15).
+PARTITIONED_TABLES = [
+    PartitionedTable('engagement_history', 'sent_at', 'ENGAGEMENT_HISTORY_RETENTION_MONTHS', 6),
+    PartitionedTable('broadcast_stats', 'created_at', 'BROADCAST_STATS_RETENTION_MONTHS', 6),
+]
+
+
+def month_start(day: date, shift: int = 0) -> date:
+    """Первое число месяца day, сдвинутого на shift месяцев"""
+    month = day.year * 12 + day.month - 1 + shift
+    return date(month // 12, month % 12 + 1, 1)
+
+
+class PartitionManager:
+    """Создание будущих помесячных партиций и удаление партиций старше срока хранения
+
+    Партиция месяца называется {таблица}_pYYYYMM, строки вне созданных диапазонов
+    попадают в {таблица}_default, чтобы вставка не падала, если обслуживание не запускалось.
+    """
+
+    MONTHS_AHEAD = 3  # сколько будущих месяцев держать созданными
+
+    def __init__(self, tables: List[PartitionedTable] = None):
+        self.tables = tables or PARTITIONED_TABLES
+
+    @staticmethod
+    def partition_name(table: str, month: date) -> str:
+        return f"{table}_p{month:%Y%m}"
+
+    @staticmethod
+    def retention(table: PartitionedTable) -> Optional[int]:
+        value = os.getenv(table.retention_env, '') if table.retention_env else ''
+        if value.strip():
+            return int(value) or None  # 0 - хранить бессрочно
+        return table.default_retention
+
+    @staticmethod
+    async def is_partitioned(conn, table: str) -> bool:
+        relkind = await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = to_regclass($1)", table)
+        return relkind == 'p'
+
+    async def partitions(self, conn, table: str) -> List[Tuple[str, date]]:
+        """Помесячные партиции таблицы: [(имя, первое число месяца)] по возрастанию"""
+        rows = await conn.fetch('''
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass($1)
+        ''', table)
+        pattern = re.compile(rf"^{re.escape(table)}_p(\d{{4}})(\d{{2}})$")
+        result = []
+        for row in rows:
+            match = pattern.match(row['relname'])
+            if match:
+                result.append((row['relname'], date(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(result, key=lambda item: item[1])
+
+    async def ensure_partitions(self, conn, table: PartitionedTable, since: date = None) -> List[str]:
+        """Создание партиций с месяца since (по умолчанию текущего) на MONTHS_AHEAD вперёд"""
+        today = date.today()
+        month = month_start(since or today)
+        last = month_start(today, self.MONTHS_AHEAD)
+
+        await conn.execute(f"CREATE TABLE IF NOT EXISTS {table.name}_default PARTITION OF {table.name} DEFAULT")
+        existing = {name for name, _ in await self.partitions(conn, table.name)}
+        created = []
+        while month <= last:
+            name = self.partition_name(table.name, month)
+            if name not in existing:
+                await conn.execute(
+                    f"CREATE TABLE {name} PARTITION OF {table.name} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{month_start(month, 1).isoformat()}')"
+                )
+                created.append(name)
+            month = month_start(month, 1)
+        return created
+
+    async def drop_expired(self, conn, table: PartitionedTable) -> List[str]:
+        """Отсоединение и удаление партиций, целиком вышедших за срок хранения"""
+        months = self.retention(table)
+        if not months:
+            return []
+        cutoff = month_start(date.today(), -months)
+        dropped = []
+        for name, month in await self.partitions(conn, table.name):
+            if month >= cutoff:
+                break
+            async with conn.transaction():
+                await conn.execute(f"ALTER TABLE {table.name} DETACH PARTITION {name}")
+                await conn.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+        return dropped
+
+    async def maintain(self, conn) -> Dict[str, Dict[str, List[str]]]:
+        """Плановое обслуживание всех таблиц: будущие партиции + удаление устаревших"""
+        report = {}
+        for table in self.tables:
+            if not await self.is_partitioned(conn, table.name):
+                continue
+            try:
+                report[table.name] = {
+                    'created': await self.ensure_partitions(conn, table),
+                    'dropped': await self.drop_expired(conn, table),
+                }
+            except Exception as e:
+                logger.warning(f"Ошибка обслуживания партиций {table.name}: {e}")
+        return report
+
+    @staticmethod
+    async def _columns(conn, table: str) -> List[str]:
+        rows = await conn.fetch('''
+            SELECT attname FROM pg_attribute
+            WHERE attrelid = to_regclass($1) AND attnum > 0 AND NOT attisdropped
+            ORDER BY attnum
+        ''', table)
+        return [row['attname'] for row in rows]
+
+    @staticmethod
+    async def _foreign_keys(conn, table: str) -> List[Tuple[str, str]]:
+        rows = await conn.fetch('''
+            SELECT conname, pg_get_constraintdef(oid) as definition FROM pg_constraint
+            WHERE conrelid = to_regclass($1) AND contype = 'f'
+        ''', table)
+        return [(row['conname'], row['definition']) for row in rows]
+
+    @staticmethod
+    async def _move_sequences(conn, source: str, target: str, columns: List[str]):
+        # SERIAL-последовательности принадлежат старой таблице и удалились бы вместе с ней
+        for column in columns:
+            sequence = await conn.fetchval("SELECT pg_get_serial_sequence($1, $2)", source, column)
+            if sequence:
+                await conn.execute(f"ALTER SEQUENCE {sequence} OWNED BY {target}.{column}")
+
+    async def convert(self, conn, table: PartitionedTable, indexes: List[str]):
+        """Перевод обычной таблицы в партиционированную с переносом данных (для миграции)
+
+        Уникальные ограничения не переносятся: в партиционированной таблице они обязаны
+        включать ключ партиционирования (замена - триггеры дедупликации, миграция 14).
+        Первичный ключ id становится (id, ключ). Внешние ключи таблицы пересоздаются на
+        новой таблице: CREATE TABLE ... LIKE их не копирует.
+        """
+        relkind = await conn.fetchval("SELECT relkind FROM pg_class WHERE oid = to_regclass($1)", table.name)
+        if relkind is None:
+            logger.info(f"Таблица {table.name} не найдена - партиционирование пропущено")
+            return
+        if relkind == 'p':
+            return
+
+        legacy = f"{table.name}_legacy"
+        foreign_keys = await self._foreign_keys(conn, table.name)
+        await conn.execute(
+            f"ALTER TABLE {table.name} ADD COLUMN IF NOT EXISTS {table.column} TIMESTAMP DEFAULT CURRENT_TIMESTAMP"
+        )
+        await conn.execute(f"ALTER TABLE {table.name} RENAME TO {legacy}")
+        columns = await self._columns(conn, legacy)
+
+        await conn.execute(
+            f"CREATE TABLE {table.name} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE ({table.column})"
+        )
+        await conn.execute(f"ALTER TABLE {table.name} ALTER COLUMN {table.column} SET DEFAULT CURRENT_TIMESTAMP")
+        await conn.execute(f"ALTER TABLE {table.name} ALTER COLUMN {table.column} SET NOT NULL")
+
+        oldest = await conn.fetchval(f"SELECT MIN({table.column}) FROM {legacy}")
+        await self.ensure_partitions(conn, table, since=oldest.date() if oldest else None)
+
+        column_list = ', '.join(columns)
+        select_list = ', '.join(
+            f"COALESCE({column}, LOCALTIMESTAMP)" if column == table.column else column for column in columns
+        )
+        await conn.execute(f"INSERT INTO {table.name} ({column_list}) SELECT {select_list} FROM {legacy}")
+
+        await self._move_sequences(conn, legacy, table.name, columns)
+
+        await conn.execute(f"DROP TABLE {legacy}")
+        if 'id' in columns:
+            await conn.execute(f"ALTER TABLE {table.name} ADD PRIMARY KEY (id, {table.column})")
+        for name, definition in foreign_keys:
+            await conn.execute(f"ALTER TABLE {table.name} ADD CONSTRAINT {name} {definition}")
+        for index_sql in indexes:
+            await conn.execute(index_sql)
+        logger.info(f"Таблица {table.name} переведена на помесячные партиции по {table.column}")
+
+    async def unpartition(self, conn, table: str, unique: Tuple[str, ...], order_by: str, indexes: List[str]):
+        """Возврат партиционированной таблицы в обычную с UNIQUE(unique) (для миграции)
+
+        Из дубликатов по unique остаётся первая строка по order_by; первичный ключ
+        снова id, внешние ключи и индексы пересоздаются.
+        """
+        if not await self.is_partitioned(conn, table):
+            return
+
+        partitioned = f"{table}_partitioned"
+        foreign_keys = await self._foreign_keys(conn, table)
+        await conn.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+        columns = await self._columns(conn, partitioned)
+
+        await conn.execute(f"CREATE TABLE {table} (LIKE {partitioned} INCLUDING DEFAULTS)")
+        column_list = ', '.join(columns)
+        unique_list = ', '.join(unique)
+        await conn.execute(
+            f"INSERT INTO {table} ({column_list}) "
+            f"SELECT DISTINCT ON ({unique_list}) {column_list} FROM {partitioned} "
+            f"ORDER BY {unique_list}, {order_by}"
+        )
+        await self._move_sequences(conn, partitioned, table, columns)
+
+        await conn.execute(f"DROP TABLE {partitioned}")
+        if 'id' in columns:
+            await conn.execute(f"ALTER TABLE {table} ADD PRIMARY KEY (id)")
+        await conn.execute(f"ALTER TABLE {table} ADD UNIQUE ({unique_list})")
+        for name, definition in foreign_keys:
+            await conn.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        for index_sql in indexes:
+            await conn.execute(index_sql)
+        logger.info(f"Таблица {table} снова обычная, UNIQUE({unique_list}) восстановлен")
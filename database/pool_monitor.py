@@ -0,0 +1,209 @@
+import asyncio
+import sys
+import time
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from database.metrics import Histogram, record_backend, render_histogram, render_simple
+
+logger = logging.getLogger(__name__)
+
+
+class _AcquireContext:
+    """Как PoolAcquireContext asyncpg: и `async with pool.acquire()`, и `await pool.acquire()`"""
+
+    __slots__ = ('_pool', '_timeout', '_label', '_conn')
+
+    def __init__(self, pool: 'InstrumentedPool', timeout: Optional[float], label: str):
+        self._pool = pool
+        self._timeout = timeout
+        self._label = label
+        self._conn = None
+
+    async def __aenter__(self):
+        self._conn = await self._pool._acquire(self._timeout, self._label)
+        return self._conn
+
+    async def __aexit__(self, *exc):
+        conn, self._conn = self._conn, None
+        await self._pool.release(conn)
+
+    def __await__(self):
+        return self._pool._acquire(self._timeout, self._label).__await__()
+
+
+class InstrumentedPool:
+    """Обёртка пула asyncpg с метриками ожидания и удержания соединений
+
+    Снаружи ведёт себя как asyncpg.Pool (остальные методы проксируются). Собирает:
+    гистограмму ожидания acquire, число занятых/свободных/ожидающих, время удержания
+    соединения по методам (имя вызывающей корутины или явный label). Пул можно
+    пересоздать с другим max_size (resize) - так работает адаптивный режим.
+    """
+
+    def __init__(self, name: str, pool, factory: Callable[[int, int], Awaitable] = None):
+        self.name = name
+        self._pool = pool
+        self._factory = factory  # async factory(min_size, max_size) -> asyncpg.Pool
+        self._retiring: List = []
+        self._held: Dict[int, tuple] = {}  # id(conn) -> (pool, label, момент выдачи)
+
+        self.wait = Histogram()
+        self.hold: Dict[str, Histogram] = {}
+        self.waiting = 0
+        self.peak_in_use = 0
+        self.acquired = 0
+        self.errors = 0
+        self.resizes = 0
+
+    def __getattr__(self, item):
+        return getattr(self._pool, item)
+
+    def acquire(self, *, timeout: Optional[float] = None, label: str = None) -> _AcquireContext:
+        return _AcquireContext(self, timeout, label or sys._getframe(1).f_code.co_name)
+
+    async def _acquire(self, timeout: Optional[float], label: str):
+        pool = self._pool
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            conn = await pool.acquire(timeout=timeout)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.waiting -= 1
+
+        now = time.perf_counter()
+        self.wait.observe(now - started)
+        self.acquired += 1
+        self._held[id(conn)] = (pool, label, now)
+        self.peak_in_use = max(self.peak_in_use, len(self._held))
+        return conn
+
+    async def release(self, conn, *, timeout: Optional[float] = None):
+        pool, label, acquired_at = self._held.pop(id(conn), (self._pool, None, None))
+        if label is not None:
+            held = time.perf_counter() - acquired_at
+            hold = self.hold.get(label)
+            if hold is None:
+                hold = self.hold[label] = Histogram()
+            hold.observe(held)
+            record_backend('postgres', held)
+        await pool.release(conn, timeout=timeout)
+
+    @property
+    def in_use(self) -> int:
+        return len(self._held)
+
+    async def resize(self, min_size: int, max_size: int):
+        """Пересоздание пула с новыми границами; старый закрывается после возврата соединений"""
+        if self._factory is None:
+            raise RuntimeError(f"Пул {self.name} создан без фабрики и не меняет размер")
+        old, self._pool = self._pool, await self._factory(min_size, max_size)
+        self.resizes += 1
+        self._retiring.append(old)
+        task = asyncio.create_task(old.close())
+        task.add_done_callback(lambda _: self._retiring.remove(old))
+
+    async def close(self):
+        for pool in [self._pool, *self._retiring]:
+            await pool.close()
+
+    def stats(self) -> Dict:
+        return {
+            'size': self._pool.get_size(),
+            'min_size': self._pool.get_min_size(),
+            'max_size': self._pool.get_max_size(),
+            'idle': self._pool.get_idle_size(),
+            'in_use': self.in_use,
+            'waiting': self.waiting,
+            'peak_in_use': self.peak_in_use,
+            'acquired': self.acquired,
+            'errors': self.errors,
+            'resizes': self.resizes,
+            'wait_p50': self.wait.quantile(0.5),
+            'wait_p99': self.wait.quantile(0.99),
+        }
+
+    def top_holders(self, limit: int = 5) -> List[tuple]:
+        """Методы с наибольшим суммарным временем удержания: [(метод, вызовов, сумма с)]"""
+        ranked = sorted(self.hold.items(), key=lambda item: item[1].sum, reverse=True)
+        return [(label, hist.count, hist.sum) for label, hist in ranked[:limit]]
+
+    def prometheus(self) -> List[str]:
+        labels = {'pool': self.name}
+        stats = self.stats()
+        lines = render_histogram('cgdv_db_pool_acquire_wait_seconds', 'Ожидание соединения из пула',
+                                 [(labels, self.wait)])
+        for key, kind, help_text in (
+            ('size', 'gauge', 'Открытых соединений'),
+            ('max_size', 'gauge', 'Верхняя граница пула'),
+            ('idle', 'gauge', 'Свободных соединений'),
+            ('in_use', 'gauge', 'Занятых соединений'),
+            ('waiting', 'gauge', 'Корутин в ожидании соединения'),
+            ('acquired', 'counter', 'Выдано соединений'),
+            ('errors', 'counter', 'Ошибок получения соединения'),
+            ('resizes', 'counter', 'Пересозданий пула адаптивным режимом'),
+        ):
+            suffix = '_total' if kind == 'counter' else ''
+            lines += render_simple(f'cgdv_db_pool_{key}{suffix}', kind, help_text, [(labels, stats[key])])
+        lines += render_histogram('cgdv_db_pool_hold_seconds', 'Удержание соединения по методам',
+                                  [({**labels, 'method': label}, hist) for label, hist in sorted(self.hold.items())])
+        return lines
+
+
+class PoolAutoscaler:
+    """Адаптивный размер пула по наблюдаемым ожиданиям
+
+    Раз в INTERVAL секунд сравнивает p95 ожидания acquire за окно с целевым: выше цели
+    при исчерпанном пуле - рост на STEP, несколько спокойных окон подряд с пиком занятости
+    ниже половины - уменьшение на STEP. Границы - [lower, upper].
+    """
+
+    INTERVAL = 30
+    STEP = 5
+    CALM_WINDOWS = 10  # ~5 минут без ожиданий перед уменьшением
+
+    def __init__(self, pool: InstrumentedPool, lower: int, upper: int, wait_target: float):
+        self.pool = pool
+        self.lower = lower
+        self.upper = upper
+        self.wait_target = wait_target
+        self._previous = pool.wait.snapshot()
+        self._calm = 0
+
+    async def evaluate(self) -> Optional[int]:
+        """Одна проверка окна; возвращает новый max_size, если пул пересоздан"""
+        window = self.pool.wait.since(self._previous)
+        self._previous = self.pool.wait.snapshot()
+        peak, self.pool.peak_in_use = self.pool.peak_in_use, self.pool.in_use
+        current = self.pool.get_max_size()
+        p95 = window.quantile(0.95)
+
+        target = current
+        if p95 is not None and p95 > self.wait_target and peak >= current:
+            target = min(self.upper, current + self.STEP)
+            self._calm = 0
+        elif peak < current // 2:
+            self._calm += 1
+            if self._calm >= self.CALM_WINDOWS:
+                target = max(self.lower, current - self.STEP)
+                self._calm = 0
+        else:
+            self._calm = 0
+
+        if target == current:
+            return None
+        await self.pool.resize(min(self.pool.get_min_size(), target), target)
+        logger.info(f"🔧 Пул {self.pool.name}: max_size {current} -> {target} "
+                    f"(p95 ожидания {p95 or 0:.3f} с, пик занятости {peak})")
+        return target
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.INTERVAL)
+            try:
+                await self.evaluate()
+            except Exception as e:
+                logger.warning(f"Ошибка адаптивного размера пула {self.pool.name}: {e}")
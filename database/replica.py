@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Отставание реплики в секундах; 0, если всё полученное WAL уже применено
+# (иначе на простаивающем мастере pg_last_xact_replay_timestamp стареет без реального отставания).
+# Равенство LSN означает свежесть, только пока WAL-приёмник стримит: у отключённого приёмника
+# они тоже равны при любом отставании - тогда NULL, реплика считается недоступной.
+# Статус приёмника виден роли с pg_read_all_stats (pg_monitor), иначе он NULL.
+LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END::float8
+'''
+
+# Методы, которые можно читать с реплики: {маршрут: допустимое отставание, секунд}.
+# Всё, что читает только что записанное (read-your-writes), сюда не попадает и идёт на мастер.
+REPLICA_ROUTES: Dict[str, float] = {
+    'get_database_stats': 300,
+    'admin_analytics': 300,
+    'get_broadcast_recipients': 60,
+    'get_inactive_users': 60,
+    'get_users_for_engagement': 60,
+    'get_new_profiles_count_for_user': 60,
+    'get_unviewed_likes_count': 60,
+    'get_users_for_monthly_reminder': 300,
+}
+
+
+def replica_dsn() -> Optional[str]:
+    """Строка подключения к реплике из DB_REPLICA_* (недостающее берётся из DB_*); None - реплики нет"""
+    host = os.getenv('DB_REPLICA_HOST', '')
+    if not host:
+        return None
+    port = os.getenv('DB_REPLICA_PORT', os.getenv('DB_PORT', '5432'))
+    name = os.getenv('DB_REPLICA_NAME', os.getenv('DB_NAME', 'teammates'))
+    user = os.getenv('DB_REPLICA_USER', os.getenv('DB_USER', 'teammates_user'))
+    password = os.getenv('DB_REPLICA_PASSWORD', os.getenv('DB_PASSWORD', ''))
+    return f"postgresql://{user}:{password}@{host}:{port}/{name}"
+
+
+class ReplicaRouter:
+    """Маршрутизация тяжёлых чтений на реплику с откатом на мастер
+
+    Реплика используется, только если маршрут есть в REPLICA_ROUTES, а измеренное
+    отставание не больше допустимого для маршрута. Отставание проверяется не чаще
+    раза в LAG_CHECK_INTERVAL секунд; ошибка реплики - откат на мастер.
+    """
+
+    LAG_CHECK_INTERVAL = 5
+
+    def __init__(self, primary_pool, replica_pool=None, routes: Dict[str, float] = None):
+        self.primary = primary_pool
+        self.replica = replica_pool
+        self.routes = REPLICA_ROUTES if routes is None else routes
+        self.max_lag = float(os.getenv('DB_REPLICA_MAX_LAG', '0') or 0)  # 0 - по маршрутам
+        self._lag: Optional[float] = None
+        self._checked_at = 0.0
+        self.replica_reads = 0
+        self.primary_fallbacks = 0
+
+    async def lag(self) -> Optional[float]:
+        """Отставание реплики (кэшируется); None - реплика недоступна"""
+        if self.replica is None:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at < self.LAG_CHECK_INTERVAL:
+            return self._lag
+
+        self._checked_at = now
+        try:
+            async with self.replica.acquire(label='replica_lag') as conn:
+                lag = await conn.fetchval(LAG_SQL)
+            if lag is None and self._lag is not None:
+                logger.warning("WAL-приёмник реплики не стримит, чтения идут на мастер")
+            self._lag = lag
+        except Exception as e:
+            if self._lag is not None:
+                logger.warning(f"Реплика PostgreSQL недоступна, чтения идут на мастер: {e}")
+            self._lag = None
+        return self._lag
+
+    async def pool_for(self, route: str):
+        """Пул для чтения маршрута: реплика, если она есть и достаточно свежая"""
+        allowed = self.routes.get(route)
+        if self.replica is None or allowed is None:
+            return self.primary
+
+        if self.max_lag:
+            allowed = min(allowed, self.max_lag)
+        lag = await self.lag()
+        if lag is None or lag > allowed:
+            self.primary_fallbacks += 1
+            if lag is not None:
+                logger.info(f"Реплика отстаёт на {lag:.1f} с (допустимо {allowed:.0f}) - {route} читает мастер")
+            return self.primary
+
+        self.replica_reads += 1
+        return self.replica
+
+    @asynccontextmanager
+    async def acquire(self, route: str):
+        """Соединение для чтения маршрута; не удалось взять соединение реплики - мастер"""
+        pool = await self.pool_for(route)
+        try:
+            conn = await pool.acquire(label=route)
+        except Exception as e:
+            if pool is self.primary:
+                raise
+            logger.warning(f"Не удалось получить соединение реплики для {route}: {e}")
+            self._lag, self._checked_at = None, time.monotonic()
+            self.replica_reads -= 1
+            self.primary_fallbacks += 1
+            pool = self.primary
+            conn = await pool.acquire(label=route)
+        try:
+            yield conn
+        finally:
+            await pool.release(conn)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        return {
+            'enabled': self.replica is not None,
+            'lag': self._lag,
+            'replica_reads': self.replica_reads,
+            'primary_fallbacks': self.primary_fallbacks,
+        }
@@ -0,0 +1,284 @@
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy - опциональная зависимость, без неё поиск ранжируется в PostgreSQL
+    np = None
+
+from database.bitmasks import ANY_BIT, position_bits, goal_bits, encode_mask
+
+logger = logging.getLogger(__name__)
+
+RATINGS_ORDER = {
+    'dota': ['herald', 'guardian', 'crusader', 'archon', 'legend', 'ancient', 'divine',
+             'immortal1', 'immortal2', 'immortal3', 'immortal4', 'immortal5'],
+    'cs': ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10',
+           '10_plus', '10_advanced', '10_elite', 'pro']
+}
+
+
+def _popcount(arr):
+    """Количество единичных бит в каждом элементе int64-массива (включая знаковый бит)"""
+    v = arr.astype(np.uint64)  # логические сдвиги: у отрицательных масок >> не доходит до нуля
+    v = v - ((v >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    v = (v & np.uint64(0x3333333333333333)) + ((v >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    v = (v + (v >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return ((v * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.int64)
+
+
+class GameIndex:
+    """Колоночный индекс активных анкет одной игры (отсортирован по telegram_id)"""
+
+    COLUMNS = ('ids', 'pids', 'rating', 'positions', 'goals', 'region', 'role', 'gender', 'active', 'quality')
+
+    def __init__(self, game: str):
+        self.game = game
+        self.ratings = {r: i for i, r in enumerate(RATINGS_ORDER.get(game, []))}
+        self.position_bits = position_bits(game)
+        self.goal_bits = goal_bits()
+        self.codes = {'region': {}, 'role': {}, 'gender': {}}
+
+        self.ids = np.empty(0, dtype=np.int64)
+        self.pids = np.empty(0, dtype=np.int64)  # profiles.id - адрес анкеты в битовых картах пропусков
+        self.rating = np.empty(0, dtype=np.int16)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.goals = np.empty(0, dtype=np.int64)
+        self.region = np.empty(0, dtype=np.int32)
+        self.role = np.empty(0, dtype=np.int32)
+        self.gender = np.empty(0, dtype=np.int32)
+        self.active = np.empty(0, dtype=bool)
+        self.quality = np.empty(0, dtype=np.int32)
+
+        self.watermark: Optional[datetime] = None
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+
+    def code(self, kind: str, value) -> int:
+        """Код строкового значения (None -> -1); словарь пополняется по мере загрузки"""
+        if value is None:
+            return -1
+        vocabulary = self.codes[kind]
+        if value not in vocabulary:
+            vocabulary[value] = len(vocabulary)
+        return vocabulary[value]
+
+    def _encode(self, rows) -> Dict:
+        return {
+            'ids': np.array([r['telegram_id'] for r in rows], dtype=np.int64),
+            'pids': np.array([r['id'] for r in rows], dtype=np.int64),
+            'rating': np.array([self.ratings.get(r['rating'], -1) for r in rows], dtype=np.int16),
+            'positions': np.array([r['positions_mask'] or 0 for r in rows], dtype=np.int64),
+            'goals': np.array([r['goals_mask'] or 0 for r in rows], dtype=np.int64),
+            'region': np.array([self.code('region', r['region']) for r in rows], dtype=np.int32),
+            'role': np.array([self.code('role', r['role'] or 'player') for r in rows], dtype=np.int32),
+            'gender': np.array([self.code('gender', r['gender']) for r in rows], dtype=np.int32),
+            'active': np.array([bool(r['is_active']) for r in rows], dtype=bool),
+            'quality': np.array([r['quality_score'] or 0 for r in rows], dtype=np.int32),
+        }
+
+    def load(self, rows: List[Dict]):
+        """Полная загрузка индекса"""
+        rows = sorted(rows, key=lambda r: r['telegram_id'])
+        for name, values in self._encode(rows).items():
+            setattr(self, name, values)
+        self.watermark = max((r['updated_at'] for r in rows if r['updated_at']), default=None)
+        self.loaded_at = self.refreshed_at = time.monotonic()
+
+    def upsert(self, rows: List[Dict], refresh: bool = True):
+        """Инкрементальное обновление изменившихся анкет
+
+        refresh=False - точечное обновление вне дочитывания по updated_at: водяной знак
+        и момент последнего дочитывания не сдвигаются (иначе пропустятся чужие изменения).
+        """
+        if not rows:
+            if refresh:
+                self.refreshed_at = time.monotonic()
+            return
+
+        encoded = self._encode(rows)
+        pos = np.searchsorted(self.ids, encoded['ids'])
+        exists = (pos < len(self.ids)) & (self.ids[np.minimum(pos, len(self.ids) - 1)] == encoded['ids']) \
+            if len(self.ids) else np.zeros(len(rows), dtype=bool)
+
+        for name in self.COLUMNS:
+            column = getattr(self, name)
+            column[pos[exists]] = encoded[name][exists]
+            setattr(self, name, np.concatenate([column, encoded[name][~exists]]))
+
+        if (~exists).any():
+            order = np.argsort(self.ids, kind='stable')
+            for name in self.COLUMNS:
+                setattr(self, name, getattr(self, name)[order])
+
+        if not refresh:
+            return
+        latest = max((r['updated_at'] for r in rows if r['updated_at']), default=None)
+        if latest and (self.watermark is None or latest > self.watermark):
+            self.watermark = latest
+        self.refreshed_at = time.monotonic()
+
+    def discard(self, telegram_id: int):
+        """Исключение анкеты из выдачи до следующей полной перезагрузки"""
+        pos = np.searchsorted(self.ids, telegram_id)
+        if pos < len(self.ids) and self.ids[pos] == telegram_id:
+            self.active[pos] = False
+
+    def rank(self, viewer: Dict, filters: Dict, excluded_ids, skips: Dict,
+             started_at: datetime) -> List[int]:
+        """Ранжирование кандидатов - повторяет relevance_score и ORDER BY из SQL-поиска
+
+        Args:
+            viewer: Анкета ищущего (рейтинг, позиции, цели, регион)
+            filters: Нормализованные фильтры поиска (None - без фильтра)
+            excluded_ids: ID лайкнутых, зарепорченных, забаненных и пропущенных в сессии
+            skips: {profile_id: (skip_count, last_skipped)} для пропусков до начала сессии
+            started_at: Начало сессии поиска (время сервера БД)
+        """
+        mask = self.active & (self.ids != viewer['telegram_id'])
+
+        excluded = np.unique(np.asarray(list(excluded_ids), dtype=np.int64))
+        if len(excluded):
+            pos = np.searchsorted(excluded, self.ids)
+            mask &= ~((pos < len(excluded)) & (excluded[np.minimum(pos, len(excluded) - 1)] == self.ids))
+
+        role = self.codes['role'].get(filters.get('role') or 'player')
+        mask &= (self.role == role) if role is not None else False
+
+        if filters.get('rating'):
+            mask &= self.rating == self.ratings.get(filters['rating'], -2)
+        if filters.get('position'):
+            mask &= (self.positions & (self.position_bits.get(filters['position'], 0) | ANY_BIT)) != 0
+        if filters.get('region'):
+            region = self.codes['region'].get(filters['region'], -2)
+            mask &= (self.region == region) | (self.region == self.codes['region'].get('any', -2))
+        if filters.get('goals'):
+            bit = self.goal_bits.get(filters['goals'], 0)
+            mask &= (self.goals & bit) != 0 if bit else False
+        if filters.get('gender'):
+            mask &= self.gender == self.codes['gender'].get(filters['gender'], -2)
+
+        idx = np.nonzero(mask)[0]
+        if not len(idx):
+            return []
+
+        ids = self.ids[idx]
+        score = self.quality[idx].astype(np.int64)
+
+        viewer_rating = self.ratings.get(viewer.get('rating'), -1)
+        if viewer_rating >= 0:
+            rating = self.rating[idx].astype(np.int64)
+            score += np.where(rating >= 0, np.maximum(0, 10 - np.abs(rating - viewer_rating)) * 3, 0)
+
+        viewer_goals = encode_mask(viewer.get('goals'), self.goal_bits) & ~ANY_BIT
+        if viewer_goals:
+            score += _popcount(self.goals[idx] & viewer_goals) * 4
+
+        viewer_positions = viewer.get('positions') or []
+        if viewer_positions and 'any' not in viewer_positions:
+            viewer_mask = encode_mask(viewer_positions, self.position_bits)
+            positions = self.positions[idx]
+            complementary = np.maximum(0, _popcount(positions) - _popcount(positions & viewer_mask)) * 3
+            score += np.where((positions != 0) & (positions != ANY_BIT), complementary, 0)
+
+        viewer_region = viewer.get('region')
+        if viewer_region and viewer_region != 'any':
+            score += np.where(self.region[idx] == self.codes['region'].get(viewer_region, -2), 2, 0)
+
+        skip_count = np.zeros(len(idx), dtype=np.int64)
+        last_skipped = np.full(len(idx), -np.inf)
+        priority = np.zeros(len(idx), dtype=np.int8)
+        if skips:
+            resurface_before = started_at.timestamp() - 7 * 86400
+            for i, profile_id in enumerate(self.pids[idx].tolist()):
+                skip = skips.get(profile_id)
+                if skip:
+                    skip_count[i] = skip[0]
+                    last_skipped[i] = skip[1].timestamp()
+                    priority[i] = 1 if last_skipped[i] < resurface_before else 2
+
+        # lexsort: последний ключ - главный
+        order = np.lexsort((ids, last_skipped, skip_count, -score, priority))
+        return ids[order].tolist()
+
+
+class SearchIndex:
+    """Векторизованный индекс кандидатов поиска по играм (в памяти процесса)"""
+
+    REFRESH_INTERVAL = 5        # секунд между инкрементальными обновлениями
+    FULL_RELOAD_INTERVAL = 600  # полная перезагрузка ловит удаления и смену is_active
+    # updated_at = NOW() - начало транзакции: запись, закоммиченная после дочитывания, может
+    # иметь метку раньше водяного знака. Окно перечитывается заново (upsert идемпотентен).
+    WATERMARK_OVERLAP = timedelta(seconds=30)
+
+    _COLUMNS = '''p.id, p.telegram_id, p.rating, p.positions_mask, p.goals_mask, p.region, p.role,
+                  p.gender, p.is_active, p.quality_score, p.updated_at'''
+
+    def __init__(self):
+        self._games: Dict[str, GameIndex] = {}
+
+    @staticmethod
+    def available() -> bool:
+        return np is not None
+
+    def mark_stale(self, game: str = None):
+        """Принудительная полная перезагрузка при следующем обращении"""
+        for name, index in self._games.items():
+            if game is None or name == game:
+                index.loaded_at = 0.0
+
+    def discard(self, telegram_id: int, game: str = None):
+        for name, index in self._games.items():
+            if game is None or name == game:
+                index.discard(telegram_id)
+
+    async def reload_profiles(self, conn, telegram_ids: List[int], format_row):
+        """Точечное перечитывание анкет в загруженных индексах
+
+        Смена is_active не трогает updated_at, поэтому дочитывание её не видит;
+        вместо полной перезагрузки игры перечитываются только эти анкеты.
+        """
+        if not self._games or not telegram_ids:
+            return
+        rows = await conn.fetch(
+            f'''SELECT p.game, {self._COLUMNS}
+                FROM profiles p
+                JOIN users u ON p.telegram_id = u.telegram_id
+                WHERE p.telegram_id = ANY($1::int8[])''',
+            list(telegram_ids)
+        )
+        for game, index in self._games.items():
+            index.upsert([format_row(row) for row in rows if row['game'] == game], refresh=False)
+
+    async def get(self, conn, game: str, format_row) -> GameIndex:
+        """Актуальный индекс игры: полная загрузка или дочитывание по updated_at"""
+        index = self._games.get(game)
+        now = time.monotonic()
+
+        if index is None or now - index.loaded_at > self.FULL_RELOAD_INTERVAL:
+            index = index or GameIndex(game)
+            rows = await conn.fetch(
+                f'''SELECT {self._COLUMNS}
+                    FROM profiles p
+                    JOIN users u ON p.telegram_id = u.telegram_id
+                    WHERE p.game = $1''',
+                game
+            )
+            index.load([format_row(row) for row in rows])
+            self._games[game] = index
+            logger.info(f"Индекс поиска {game} загружен: {len(index.ids)} анкет")
+
+        elif now - index.refreshed_at > self.REFRESH_INTERVAL:
+            # Использует idx_profiles_updated_at
+            rows = await conn.fetch(
+                f'''SELECT {self._COLUMNS}
+                    FROM profiles p
+                    JOIN users u ON p.telegram_id = u.telegram_id
+                    WHERE p.game = $1 AND p.updated_at >= $2''',
+                game, index.watermark - self.WATERMARK_OVERLAP if index.watermark else datetime.min
+            )
+            index.upsert([format_row(row) for row in rows])
+
+        return index
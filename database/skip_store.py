@@ -0,0 +1,83 @@
+import struct
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, Optional, Tuple
+
+EPOCH = datetime(2020, 1, 1)  # начало отсчёта дневных корзин
+MAX_COUNT = 255               # счётчик пропусков хранится в одном байте
+
+
+class SkipBitmap:
+    """Сжатое множество пропущенных анкет одного пользователя в одной игре
+
+    Анкеты адресуются плотным profiles.id: битовая карта по id (zlib) + боковые массивы
+    в порядке установленных бит - счётчик пропусков (uint8, с насыщением) и корзина
+    последнего пропуска (uint16, дни от EPOCH). ~3 байта на анкету вместо строки
+    search_skipped с тремя индексами. Точное время пропуска округляется до суток:
+    для правила повторного показа через 7 дней этого достаточно.
+    """
+
+    VERSION = 1
+
+    def __init__(self, entries: Dict[int, Tuple[int, int]] = None):
+        self._entries: Dict[int, Tuple[int, int]] = entries or {}  # {profile_id: (count, day)}
+
+    @staticmethod
+    def day(moment: datetime) -> int:
+        return max(0, (moment - EPOCH).days)
+
+    @staticmethod
+    def moment(day: int) -> datetime:
+        return EPOCH + timedelta(days=day)
+
+    def add(self, profile_id: int, count: int, last_skipped: datetime):
+        """Слияние пропусков анкеты: счётчики складываются, корзина берётся последняя"""
+        old_count, old_day = self._entries.get(profile_id, (0, 0))
+        self._entries[profile_id] = (
+            min(MAX_COUNT, old_count + count),
+            max(old_day, self.day(last_skipped)),
+        )
+
+    def items(self) -> Iterator[Tuple[int, int, datetime]]:
+        """(profile_id, skip_count, начало суток последнего пропуска) по возрастанию id"""
+        for profile_id in sorted(self._entries):
+            count, day = self._entries[profile_id]
+            yield profile_id, count, self.moment(day)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, profile_id: int):
+        return profile_id in self._entries
+
+    def to_bytes(self) -> bytes:
+        ids = sorted(self._entries)
+        bitmap = bytearray((ids[-1] >> 3) + 1 if ids else 0)
+        for profile_id in ids:
+            bitmap[profile_id >> 3] |= 1 << (profile_id & 7)
+        counts = bytes(min(MAX_COUNT, self._entries[profile_id][0]) for profile_id in ids)
+        days = struct.pack(f'<{len(ids)}H', *(min(0xFFFF, self._entries[profile_id][1]) for profile_id in ids))
+        payload = struct.pack('<II', len(ids), len(bitmap)) + bytes(bitmap) + counts + days
+        return bytes([self.VERSION]) + zlib.compress(payload)
+
+    @classmethod
+    def from_bytes(cls, blob: Optional[bytes]) -> 'SkipBitmap':
+        if not blob:
+            return cls()
+        if blob[0] != cls.VERSION:
+            raise ValueError(f"Неизвестная версия битовой карты пропусков: {blob[0]}")
+
+        payload = zlib.decompress(blob[1:])
+        size, bitmap_size = struct.unpack_from('<II', payload)
+        offset = 8
+        bitmap = payload[offset:offset + bitmap_size]
+        offset += bitmap_size
+        counts = payload[offset:offset + size]
+        days = struct.unpack_from(f'<{size}H', payload, offset + size)
+
+        ids = []
+        for byte_index, byte in enumerate(bitmap):
+            if byte:
+                base = byte_index << 3
+                ids.extend(base + bit for bit in range(8) if byte >> bit & 1)
+        return cls({profile_id: (counts[i], days[i]) for i, profile_id in enumerate(ids)})
@@ -0,0 +1,94 @@
+import logging
+from collections import Counter
+from typing import Dict
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+
+class HotConnection(asyncpg.Connection):
+    """Соединение пула, хранящее подготовленные горячие запросы"""
+
+    __slots__ = ('hot_statements',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.hot_statements = {}
+
+
+class StatementRegistry:
+    """Реестр именованных горячих запросов
+
+    Запросы готовятся (PREPARE) на каждом новом соединении в init-хуке пула, поэтому после
+    пересоздания соединений (max_inactive_connection_lifetime) первый вызов не платит
+    за разбор и планирование.
+    """
+
+    _RETRY_ERRORS = (
+        asyncpg.exceptions.InvalidCachedStatementError,
+        asyncpg.exceptions.OutdatedSchemaCacheError,
+    )
+
+    def __init__(self):
+        self._sql: Dict[str, str] = {}
+        self.executions = Counter()
+        self.prepares = Counter()
+
+    def register(self, name: str, sql: str):
+        self._sql[name] = sql
+
+    def sql(self, name: str) -> str:
+        return self._sql[name]
+
+    async def prepare_all(self, conn):
+        """init-хук пула: подготовка всех зарегистрированных запросов на новом соединении"""
+        for name in self._sql:
+            try:
+                await self._prepare(conn, name)
+            except Exception as e:
+                # До миграций схемы часть запросов может не готовиться - подготовим при первом вызове
+                logger.debug(f"Запрос {name} не подготовлен при создании соединения: {e}")
+
+    async def _prepare(self, conn, name: str):
+        statement = await conn.prepare(self._sql[name])
+        conn.hot_statements[name] = statement
+        self.prepares[name] += 1
+        return statement
+
+    async def _run(self, conn, name: str, method: str, args):
+        self.executions[name] += 1
+        if not hasattr(conn, 'hot_statements'):
+            # Соединение не из пула Database - обычный вызов через кэш asyncpg
+            return await getattr(conn, method)(self._sql[name], *args)
+
+        statement = conn.hot_statements.get(name) or await self._prepare(conn, name)
+        try:
+            return await getattr(statement, method)(*args)
+        except self._RETRY_ERRORS:
+            # Схема изменилась после подготовки - готовим заново
+            statement = await self._prepare(conn, name)
+            return await getattr(statement, method)(*args)
+
+    async def fetch(self, conn, name: str, *args):
+        return await self._run(conn, name, 'fetch', args)
+
+    async def fetchrow(self, conn, name: str, *args):
+        return await self._run(conn, name, 'fetchrow', args)
+
+    async def fetchval(self, conn, name: str, *args):
+        return await self._run(conn, name, 'fetchval', args)
+
+    async def execute(self, conn, name: str, *args) -> str:
+        """Выполнение без результата; возвращает статус команды, как Connection.execute"""
+        if not hasattr(conn, 'hot_statements'):
+            self.executions[name] += 1
+            return await conn.execute(self._sql[name], *args)
+        await self._run(conn, name, 'fetch', args)
+        return conn.hot_statements[name].get_statusmsg()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {'executions': self.executions[name], 'prepares': self.prepares[name]}
+            for name in self._sql
+        }
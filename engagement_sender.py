@@ -221,7 +221,8 @@ async def main():
 
     # Инициализируем БД
     db = Database()
-    await db.init()
+    # Схему мигрирует бот: рассылка по cron не должна брать DDL-блокировки на живых таблицах
+    await db.init(apply_migrations=False)
 
     try:
         # Создаем sender и запускаем отправку
@@ -126,6 +126,40 @@ async def show_admin_stats(callback: CallbackQuery, db):
     except Exception:
         lines.append("Redis: ❌ Ошибка")
 
+    if hasattr(db, 'get_cache_stats'):
+        codec_stats = db.get_cache_stats()['codec']
+        lines.append(
+            f"Кэш: {codec_stats['codec']}, записей {codec_stats['writes']}, "
+            f"сэкономлено ~{codec_stats['bytes_saved'] // 1024} КБ ({codec_stats['saved_ratio']:.0%})"
+        )
+
+    if hasattr(db, 'get_statement_stats'):
+        statement_stats = db.get_statement_stats()
+        executions = sum(s['executions'] for s in statement_stats.values())
+        prepares = sum(s['prepares'] for s in statement_stats.values())
+        lines.append(f"Подготовленные запросы: {len(statement_stats)}, выполнений {executions}, подготовок {prepares}")
+
+    if hasattr(db, 'get_pool_stats'):
+        pool_stats = db.get_pool_stats()
+        for name, pool in pool_stats['postgres'].items():
+            wait_p99 = f"{pool['wait_p99'] * 1000:.1f} мс" if pool['wait_p99'] is not None else "-"
+            lines.append(
+                f"Пул {name}: {pool['in_use']}/{pool['size']} занято (макс {pool['max_size']}"
+                f"{', адаптивный' if pool_stats['adaptive'] and name == 'primary' else ''}), "
+                f"ждут {pool['waiting']}, p99 ожидания {wait_p99}"
+            )
+        if pool_stats['top_holders']:
+            holders = ", ".join(f"{label} {total:.1f} с" for label, _, total in pool_stats['top_holders'][:3])
+            lines.append(f"Дольше всех держат соединения: {holders}")
+        for name, pool in pool_stats['redis'].items():
+            lines.append(f"Redis ({name}): {pool['in_use']} занято, {pool['idle']} свободно, макс {pool['max']}")
+
+    if hasattr(db, 'get_method_stats'):
+        slowest = db.get_method_stats(3)
+        if slowest:
+            methods = ", ".join(f"{method} {p99 * 1000:.0f} мс" for method, _, p99 in slowest)
+            lines.append(f"Медленные методы (p99): {methods}")
+
     # PostgreSQL
     if not hasattr(db, '_pg_pool') or db._pg_pool is None:
         lines.append("⚠️ Нет подключения к PostgreSQL.")
@@ -133,8 +167,15 @@ async def show_admin_stats(callback: CallbackQuery, db):
         await callback.answer()
         return
 
+    if hasattr(db, 'get_replica_stats'):
+        replica = db.get_replica_stats()
+        if replica['enabled']:
+            lag = f"{replica['lag']:.1f} с" if replica['lag'] is not None else "недоступна"
+            lines.append(f"Реплика: отставание {lag}, чтений {replica['replica_reads']}, "
+                         f"откатов на мастер {replica['primary_fallbacks']}")
+
     try:
-        async with db._pg_pool.acquire() as conn:
+        async with db.read_connection('get_database_stats') as conn:
             stats = await db.get_database_stats()
 
             main_stats = [
@@ -186,7 +227,7 @@ async def show_admin_analytics(callback: CallbackQuery, db):
     await callback.answer("Собираю аналитику...", show_alert=False)
 
     try:
-        async with db._pg_pool.acquire() as conn:
+        async with db.read_connection('admin_analytics') as conn:
 
             # === ВОРОНКА ===
             total_users = await conn.fetchval("SELECT COUNT(*) FROM users") or 0
@@ -202,37 +243,8 @@ async def show_admin_analytics(callback: CallbackQuery, db):
             new_likes_7d = await conn.fetchval("SELECT COUNT(*) FROM likes WHERE created_at > NOW() - INTERVAL '7 days'") or 0
             new_matches_7d = await conn.fetchval("SELECT COUNT(*) FROM matches WHERE created_at > NOW() - INTERVAL '7 days'") or 0
 
-            # === АКТИВНОСТЬ ПОЛЬЗОВАТЕЛЕЙ ===
-            activity_stats = await conn.fetch("""
-                SELECT activity_level, COUNT(*) as count
-                FROM (
-                    SELECT CASE
-                        WHEN last_activity > NOW() - INTERVAL '3 days'  THEN 'до 3 дней'
-                        WHEN last_activity > NOW() - INTERVAL '7 days'  THEN '3–7 дней'
-                        WHEN last_activity > NOW() - INTERVAL '30 days' THEN '7–30 дней'
-                        ELSE 'более 30 дней'
-                    END as activity_level
-                    FROM users WHERE last_activity IS NOT NULL
-                ) s
-                GROUP BY activity_level
-                ORDER BY CASE activity_level
-                    WHEN '< 3 дней' THEN 1 WHEN '3–7 дней' THEN 2
-                    WHEN '7–30 дней' THEN 3 ELSE 4 END
-            """)
-
-            # === RETENTION ===
-            retention_base = await conn.fetchval("""
-                SELECT COUNT(*) FROM users
-                WHERE created_at > NOW() - INTERVAL '14 days'
-                AND created_at < NOW() - INTERVAL '7 days'
-            """) or 0
-            retention_returned = await conn.fetchval("""
-                SELECT COUNT(DISTINCT u.telegram_id) FROM users u
-                WHERE u.created_at > NOW() - INTERVAL '14 days'
-                AND u.created_at < NOW() - INTERVAL '7 days'
-                AND u.last_activity > u.created_at + INTERVAL '7 days'
-            """) or 0
-            retention_rate = (retention_returned / retention_base * 100) if retention_base > 0 else 0
+            # === АКТИВНОСТЬ И RETENTION (HLL-счётчики в Redis, без сканирования users) ===
+            audience = await db.get_audience_stats()
 
             # === АУДИТОРИЯ: пол, роль ===
             gender_stats = await conn.fetch("""
@@ -324,10 +336,15 @@ async def show_admin_analytics(callback: CallbackQuery, db):
             ]
 
             # Активность
-            lines.append("<b>АКТИВНОСТЬ (последний визит)</b>")
-            for row in activity_stats:
-                lines.append(f"  {row['activity_level']}: {row['count']}")
-            lines += [f"  7д Retention: {retention_rate:.0f}% ({retention_returned}/{retention_base})", ""]
+            lines += [
+                "<b>АКТИВНОСТЬ (≈, HyperLogLog)</b>",
+                f"  DAU / WAU / MAU: {audience['dau']} / {audience['wau']} / {audience['mau']}",
+                f"  Вернулись с прошлой недели: {audience['retention']:.0%} "
+                f"({audience['returned']}/{audience['prev_wau']})",
+                f"  7д Retention новичков: {audience['cohort_retention']:.0%} "
+                f"({audience['cohort_returned']}/{audience['cohort_size']})",
+                "",
+            ]
 
             # Аудитория
             lines.append("<b>АУДИТОРИЯ</b>")
@@ -541,7 +558,7 @@ async def _ban_user_action(callback: CallbackQuery, report_id: int, user_id: int
     
     user = await db.get_user(user_id)
     if user and user.get('current_game'):
-        await db._clear_pattern_cache(f"search:*:{user['current_game']}:*")
+        await db.invalidate_search_cache(user['current_game'])
     
     await _show_next_report(callback, db)
 
@@ -2759,7 +2776,7 @@ async def _apply_ban(source, state: FSMContext, db, reason: str):
 
         # Очищаем кэш поиска
         if current_game:
-            await db._clear_pattern_cache(f"search:*:{current_game}:*")
+            await db.invalidate_search_cache(current_game)
 
         logger.info(f"Админ забанил пользователя {user_id} на {ban_days} дней. Причина: {reason}")
 
@@ -2836,10 +2853,11 @@ async def cleanup_blocked_run(callback: CallbackQuery, db):
         await asyncio.sleep(0.05)
 
     deleted = 0
-    for user_id in blocked_ids:
-        success = await db.delete_user_completely(user_id)
-        if success:
-            deleted += 1
+    if blocked_ids:
+        try:
+            deleted = await db.purge_users(blocked_ids)
+        except Exception as e:
+            logger.error(f"Ошибка массового удаления заблокировавших: {e}")
 
     logger.info(f"Очистка заблокировавших: проверено {total}, удалено {deleted}")
 
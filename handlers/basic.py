@@ -1,3 +1,4 @@
+import asyncio
 import os
 from datetime import datetime
 import logging
@@ -163,8 +164,12 @@ async def get_menu_photo(bot, game: str = None):
 
     return None
 
-async def get_default_avatar(bot, game: str):
-    """Получить file_id дефолтной аватарки (с автозагрузкой и кешированием)"""
+async def get_default_avatar(bot, game: str, db=None):
+    """Получить file_id дефолтной аватарки (с автозагрузкой и кешированием)
+
+    Новый file_id меняет то, какие фото считаются стандартными, поэтому с db
+    скоры анкет пересчитываются в фоне.
+    """
     cache_key = f"avatar_{game}"
 
     # Проверяем кэш
@@ -197,6 +202,9 @@ async def get_default_avatar(bot, game: str):
         settings.cache_photo_id(cache_key, file_id)
         logger.info(f"Дефолтная аватарка {game} загружена и закэширована: {file_id}")
 
+        if db:
+            asyncio.create_task(db.sync_quality_scores())
+
         return file_id
 
     except Exception as e:
@@ -11,6 +11,7 @@ import config.settings as settings
 
 from handlers.basic import check_ban_and_profile, safe_edit_message, _format_expire_date
 from handlers.notifications import notify_about_match, notify_admin_new_report
+from database.database import LikeResult
 
 logger = logging.getLogger(__name__)
 router = Router()
@@ -76,9 +77,9 @@ async def process_like_action(callback: CallbackQuery, target_user_id: int, acti
     game = user['current_game']
 
     if action == "like":
-        is_match = await db.add_like(user_id, target_user_id, game, message=None)
+        like_result = await db.add_like(user_id, target_user_id, game, message=None)
 
-        if is_match:
+        if like_result == LikeResult.MATCH:
             await handle_match_created(callback, target_user_id, game, db)
         else:
             await show_next_like_or_finish(callback, user_id, game, db)
@@ -54,7 +54,7 @@ async def get_user_interaction_state(user_id: int, db) -> str:
     """Определяем состояние взаимодействия пользователя"""
     try:
         cache_key = f"user_state:{user_id}"
-        last_state = await db._redis.get(cache_key)
+        last_state = await db._get_cache(cache_key)
         
         busy_states = [
             'search_browsing',
@@ -102,23 +102,13 @@ async def update_user_activity(user_id: int, state: str = None, db=None):
         return
 
     try:
-        import time
-        current_time = time.time()
-
-        # Обновляем Redis кэш (быстро)
-        activity_key = f"last_activity:{user_id}"
-        await db._redis.setex(activity_key, 300, str(current_time))  # 5 минут
-
+        # Состояние для умных уведомлений (5 минут)
         if state:
-            state_key = f"user_state:{user_id}"
-            await db._redis.setex(state_key, 300, state)  # 5 минут
+            await db._set_cache(f"user_state:{user_id}", state, 300)
 
-        # Обновляем поле last_activity в PostgreSQL (для алгоритма подбора)
+        # last_activity и реактивация анкеты пишутся в PostgreSQL пачкой в фоне
         await db.update_user_activity(user_id)
 
-        # Реактивируем анкету если пользователь вернулся после деактивации
-        await db.reactivate_profile(user_id)
-
     except Exception as e:
         logger.warning(f"Ошибка обновления активности пользователя {user_id}: {e}")
 
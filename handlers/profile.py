@@ -1085,7 +1085,7 @@ async def skip_photo(callback: CallbackQuery, state: FSMContext, db):
     game = data.get('game')
 
     # Получаем file_id стандартной аватарки (с автозагрузкой и кешированием)
-    default_photo_id = await get_default_avatar(callback.bot, game)
+    default_photo_id = await get_default_avatar(callback.bot, game, db)
 
     if not default_photo_id:
         await callback.answer("Ошибка загрузки стандартной фотографии", show_alert=True)
@@ -52,34 +52,13 @@ async def update_profile_field(user_id: int, field: str, value, db) -> bool:
     if not user or not user.get('current_game'):
         return False
 
-    game = user['current_game']
-    await db._clear_user_cache(user_id)
-
-    profile = await db.get_user_profile(user_id, game)
-    if not profile:
+    try:
+        profile = await db.update_profile_fields(user_id, user['current_game'], **{field: value})
+    except Exception as e:
+        logger.error(f"Ошибка обновления поля {field} профиля {user_id}: {e}")
         return False
 
-    success = await db.update_user_profile(
-        telegram_id=user_id,
-        game=game,
-        name=profile['name'] if field != 'name' else value,
-        nickname=profile['nickname'] if field != 'nickname' else value,
-        age=profile['age'] if field != 'age' else value,
-        rating=profile['rating'] if field != 'rating' else value,
-        region=profile.get('region', 'any') if field != 'region' else value,
-        positions=profile['positions'] if field != 'positions' else value,
-        goals=profile.get('goals', ['any']) if field != 'goals' else value,
-        additional_info=profile['additional_info'] if field != 'additional_info' else value,
-        photo_id=profile.get('photo_id') if field != 'photo_id' else value,
-        profile_url=profile.get('profile_url', '') if field != 'profile_url' else value,
-        role=profile.get('role', 'player') if field != 'role' else value,
-        gender=profile.get('gender') if field != 'gender' else value
-    )
-
-    if success:
-        await db._clear_user_cache(user_id)
-
-    return success
+    return profile is not None
 
 async def show_edit_menu_after_update(user_id: int, db, message: Message = None, callback: CallbackQuery = None, last_bot_message_id: int = None):
     """Показать меню редактирования после обновления поля"""
@@ -1244,7 +1223,7 @@ async def delete_photo(callback: CallbackQuery, state: FSMContext, db):
     game = user.get('current_game')
 
     # Получаем file_id стандартной аватарки (с автозагрузкой и кешированием)
-    default_photo_id = await get_default_avatar(callback.bot, game)
+    default_photo_id = await get_default_avatar(callback.bot, game, db)
 
     if not default_photo_id:
         await callback.answer("Ошибка загрузки стандартной фотографии", show_alert=True)
@@ -9,6 +9,7 @@ from handlers.likes import show_profile_with_photo
 
 from handlers.basic import check_ban_and_profile, safe_edit_message, SearchForm
 from handlers.notifications import notify_about_match, notify_about_like, update_user_activity, notify_admin_new_report
+from database.database import LikeResult
 from handlers.likes import show_profile_with_photo
 
 import keyboards.keyboards as kb
@@ -182,9 +183,9 @@ async def handle_search_action(callback: CallbackQuery, action: str, target_user
         game = data['game']
     
     if action == "like":
-        is_match = await db.add_like(user_id, target_user_id, game, message=None)
+        like_result = await db.add_like(user_id, target_user_id, game, message=None)
         
-        if is_match:
+        if like_result == LikeResult.MATCH:
             target_profile = await db.get_user_profile(target_user_id, game)
             await notify_about_match(callback.bot, target_user_id, user_id, game, db)
             
@@ -207,8 +208,9 @@ async def handle_search_action(callback: CallbackQuery, action: str, target_user
             logger.info(f"Мэтч: {user_id} <-> {target_user_id}")
         else:
             await callback.answer("Лайк отправлен!")
-            await notify_about_like(callback.bot, target_user_id, game, db)
-            logger.info(f"Лайк: {user_id} -> {target_user_id}")
+            if like_result == LikeResult.LIKE:
+                await notify_about_like(callback.bot, target_user_id, game, db)
+                logger.info(f"Лайк: {user_id} -> {target_user_id}")
             await show_next_profile(callback, state, db)
     
     elif action == "skip":
@@ -305,11 +307,9 @@ async def show_next_profile(callback: CallbackQuery, state: FSMContext, db):
     logger.info(f"🟢 Увеличены счётчики: next_index={next_index}, next_profiles_shown={next_profiles_shown}")
 
     if profiles and next_index >= len(profiles) - 5:
-        last_offset = data.get('last_loaded_offset', 0)
-        new_offset = last_offset + 20
-
         try:
-            new_batch = await db.get_potential_matches(
+            loaded_ids = {p['telegram_id'] for p in profiles}
+            new_batch = await db.get_search_page(
                 user_id=data['user_id'],
                 game=data['game'],
                 rating_filter=data.get('rating_filter'),
@@ -319,15 +319,16 @@ async def show_next_profile(callback: CallbackQuery, state: FSMContext, db):
                 role_filter=data.get('role_filter'),
                 gender_filter=data.get('gender_filter'),
                 limit=20,
-                offset=new_offset
+                after=profiles[-1],
+                seen=loaded_ids
             )
 
+            # После пересборки снапшота возможны анкеты, которые уже загружены в сессию
+            new_batch = [p for p in new_batch if p['telegram_id'] not in loaded_ids]
+
             if new_batch:
                 profiles.extend(new_batch)
-                await state.update_data(
-                    profiles=profiles,
-                    last_loaded_offset=new_offset
-                )
+                await state.update_data(profiles=profiles)
                 logger.info(f"🔄 Подгружено {len(new_batch)} новых анкет, всего: {len(profiles)}")
         except Exception as e:
             logger.error(f"Ошибка при подгрузке анкет: {e}")
@@ -980,24 +981,18 @@ async def begin_search(callback: CallbackQuery, state: FSMContext, db):
     
     await update_user_activity(data['user_id'], 'search_browsing', db)
 
-    all_profiles = []
-    for batch_offset in [0, 20, 40]:
-        batch = await db.get_potential_matches(
-            user_id=data['user_id'],
-            game=data['game'],
-            rating_filter=data.get('rating_filter'),
-            position_filter=data.get('position_filter'),
-            country_filter=data.get('country_filter'),
-            goals_filter=data.get('goals_filter'),
-            role_filter=data.get('role_filter'),
-            gender_filter=data.get('gender_filter'),
-            limit=20,
-            offset=batch_offset
-        )
-        if batch:
-            all_profiles.extend(batch)
-        else:
-            break
+    all_profiles = await db.get_search_page(
+        user_id=data['user_id'],
+        game=data['game'],
+        rating_filter=data.get('rating_filter'),
+        position_filter=data.get('position_filter'),
+        country_filter=data.get('country_filter'),
+        goals_filter=data.get('goals_filter'),
+        role_filter=data.get('role_filter'),
+        gender_filter=data.get('gender_filter'),
+        limit=60,
+        refresh=True
+    )
     
     if not all_profiles:
         await state.clear()
@@ -1043,7 +1038,6 @@ async def begin_search(callback: CallbackQuery, state: FSMContext, db):
     await state.update_data(
         profiles=all_profiles,
         current_index=0,
-        last_loaded_offset=40,
         profiles_shown=0,
         ads_queue_ids=ads_queue_ids,
         current_ad_index=current_ad_index,
@@ -1179,11 +1173,12 @@ async def process_message_with_like(message: Message, state: FSMContext, db):
     except Exception:
         pass
     
-    is_match = await db.add_like(user_id, target_user_id, game, message=user_message)
+    like_result = await db.add_like(user_id, target_user_id, game, message=user_message)
     
-    await notify_about_like(message.bot, target_user_id, game, db)
+    if like_result != LikeResult.DUPLICATE:
+        await notify_about_like(message.bot, target_user_id, game, db)
     
-    if is_match:
+    if like_result == LikeResult.MATCH:
         target_profile = await db.get_user_profile(target_user_id, game)
         await notify_about_match(message.bot, target_user_id, user_id, game, db)
         
@@ -1356,7 +1351,7 @@ async def receive_report_message(message: Message, state: FSMContext, db):
     await state.update_data(report_target_user_id=None)
 
     if success:
-        await db._clear_pattern_cache(f"search:{user_id}:{game}:*")
+        await db._clear_user_search_cache(user_id, game)
         await notify_admin_new_report(bot, user_id, target_user_id, game)
         logger.info(f"Жалоба добавлена: {user_id} пожаловался на {target_user_id}, причина: {report_message[:50]}")
 
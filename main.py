@@ -15,6 +15,7 @@ from database.database import Database
 from config.settings import ADMIN_IDS
 from middleware.database import DatabaseMiddleware
 from middleware.state_recovery import StateRecoveryMiddleware
+from utils.metrics_server import start_metrics_server
 
 # В main.py функция setup_logging() - ВАРИАНТЫ НАСТРОЙКИ
 
@@ -127,6 +128,34 @@ async def cleanup_expired_ads_task(db):
             logger.error(f"❌ Ошибка в задаче очистки реклам: {e}")
             await asyncio.sleep(300)  # При ошибке подождем 5 минут и попробуем снова
 
+async def partition_maintenance_task(db):
+    """Фоновая задача обслуживания партиций: будущие месяцы и удаление устаревших"""
+    logger.info("🗂 Запуск задачи обслуживания партиций")
+
+    while True:
+        try:
+            # Партиции создаются на несколько месяцев вперёд, раза в сутки достаточно
+            await asyncio.sleep(86400)  # 24 часа
+            await db.maintain_partitions()
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка в задаче обслуживания партиций: {e}")
+            await asyncio.sleep(300)
+
+async def skip_compaction_task(db):
+    """Фоновая задача уплотнения пропусков поиска в битовые карты"""
+    logger.info("🗜 Запуск задачи уплотнения пропусков поиска")
+
+    while True:
+        try:
+            # Первый проход сразу: переносит накопленные строки search_skipped после обновления
+            await db.compact_search_skips()
+            await asyncio.sleep(3600)  # 1 час
+
+        except Exception as e:
+            logger.error(f"❌ Ошибка в задаче уплотнения пропусков: {e}")
+            await asyncio.sleep(300)
+
 async def monthly_reminder_task(bot: Bot, db):
     """Задача для ежемесячных напоминаний"""
     logger.info("📅 Запуск задачи ежемесячных напоминаний")
@@ -250,6 +279,11 @@ async def main():
         await db.init()
         logger.info("✅ База данных инициализирована успешно")
 
+        # Локальный эндпоинт метрик Prometheus (METRICS_PORT=0 - выключен)
+        metrics_port = int(os.getenv('METRICS_PORT', '0') or 0)
+        if metrics_port:
+            metrics_runner = await start_metrics_server(db, os.getenv('METRICS_HOST', '127.0.0.1'), metrics_port)
+
         # Подключаем middleware
         dp.update.middleware(DatabaseMiddleware(db))
         logger.info("🔧 DatabaseMiddleware подключен")
@@ -271,6 +305,14 @@ async def main():
         cleanup_ads_task = asyncio.create_task(cleanup_expired_ads_task(db))
         logger.info("🗑️ Задача очистки истекших реклам запущена")
 
+        # Запускаем обслуживание партиций в фоне
+        partitions_task = asyncio.create_task(partition_maintenance_task(db))
+        logger.info("🗂 Задача обслуживания партиций запущена")
+
+        # Запускаем уплотнение пропусков поиска в фоне
+        skips_task = asyncio.create_task(skip_compaction_task(db))
+        logger.info("🗜 Задача уплотнения пропусков поиска запущена")
+
         logger.info("🚀 CGDV TeammateBot успешно запущен и готов к работе!")
         logger.info("🔄 Начинаем polling...")
 
@@ -300,12 +342,32 @@ async def main():
         except:
             pass
 
+        try:
+            if 'partitions_task' in locals():
+                logger.info("🗂 Отменяем задачу обслуживания партиций...")
+                partitions_task.cancel()
+        except:
+            pass
+
+        try:
+            if 'skips_task' in locals():
+                logger.info("🗜 Отменяем задачу уплотнения пропусков...")
+                skips_task.cancel()
+        except:
+            pass
+
         try:
             logger.info("📨 Ожидаем завершения отправки уведомлений...")
             await wait_all_notifications()
         except Exception as e:
             logger.error(f"⚠️  Ошибка ожидания уведомлений: {e}")
 
+        try:
+            if 'metrics_runner' in locals():
+                await metrics_runner.cleanup()
+        except Exception as e:
+            logger.error(f"⚠️  Ошибка остановки эндпоинта метрик: {e}")
+
         try:
             logger.info("🗃️  Закрываем соединения с базой данных...")
             if 'db' in locals():
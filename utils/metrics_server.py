@@ -0,0 +1,20 @@
+import logging
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+async def start_metrics_server(db, host: str, port: int) -> web.AppRunner:
+    """Локальный HTTP-эндпоинт /metrics в text exposition format Prometheus"""
+
+    async def metrics(request: web.Request) -> web.Response:
+        return web.Response(body=db.prometheus_metrics().encode(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"📊 Метрики доступны на http://{host}:{port}/metrics")
+    return runner
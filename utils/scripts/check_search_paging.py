@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Проверка подгрузки выдачи поиска при пересборке снапшота посреди сессии
+
+Нужны PostgreSQL и Redis с тестовыми анкетами (seed_test_data.py). Снапшот пересобирается
+двумя способами - истечение метаданных в Redis и новая версия снапшота, - после чего
+следующая страница должна начинаться с первой ещё не показанной анкеты.
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from database.database import Database
+
+PAGE = 5
+
+
+async def expected_next(db: Database, user_id: int, game: str, after: dict, seen: set) -> list:
+    """Непоказанные анкеты текущего снапшота в порядке выдачи, начиная сразу за after"""
+    meta = await db._get_cache(db._search_snapshot_meta_key(user_id, game))
+    snapshot_key = db._search_snapshot_key(user_id, game, meta['filters'])
+    members = [int(member) for member in await db._redis.zrange(snapshot_key, 0, -1)]
+    if after['telegram_id'] in members:
+        members = members[members.index(after['telegram_id']) + 1:]
+    return [telegram_id for telegram_id in members if telegram_id not in seen]
+
+
+async def check_next_page(db: Database, user_id: int, game: str, loaded: list, how: str) -> bool:
+    seen = {p['telegram_id'] for p in loaded}
+    page = await db.get_search_page(user_id, game, limit=PAGE, after=loaded[-1], seen=seen)
+    expected = await expected_next(db, user_id, game, loaded[-1], seen)
+
+    page_ids = [p['telegram_id'] for p in page]
+    if seen & set(page_ids):
+        print(f"❌ {how}: в странице повторились показанные анкеты {sorted(seen & set(page_ids))}")
+        return False
+    if expected and not page:
+        print(f"❌ {how}: пустая страница, хотя непоказанных анкет {len(expected)}")
+        return False
+    if expected and page_ids[0] != expected[0]:
+        print(f"❌ {how}: страница начинается с {page_ids[0]}, ожидалась {expected[0]}")
+        return False
+
+    print(f"✅ {how}: {len(page)} новых анкет, первая - {page_ids[0] if page_ids else '-'}")
+    loaded.extend(page)
+    return True
+
+
+async def main(game: str, user_id: int = None):
+    db = Database()
+    await db.init(apply_migrations=False)
+    try:
+        if user_id is None:
+            async with db._pg_pool.acquire() as conn:
+                user_id = await conn.fetchval(
+                    "SELECT telegram_id FROM profiles WHERE game = $1 AND is_active = TRUE ORDER BY random() LIMIT 1",
+                    game
+                )
+        if user_id is None:
+            print(f"❌ Нет анкет {game}: сначала запустите seed_test_data.py")
+            return False
+
+        loaded = await db.get_search_page(user_id, game, limit=PAGE, refresh=True)
+        print(f"🔍 Пользователь {user_id}, {game}: первая страница - {len(loaded)} анкет")
+        if len(loaded) < PAGE:
+            print("⚠️  Кандидатов меньше страницы - проверять нечего")
+            return True
+
+        # TTL метаданных истёк - get_search_page пересобирает снапшот сам
+        await db._delete_cache(db._search_snapshot_meta_key(user_id, game))
+        ok = await check_next_page(db, user_id, game, loaded, "истёкший снапшот")
+
+        # Снапшот пересобран с другой версией (например, другим процессом)
+        await db.build_search_snapshot(user_id, game, started_at=db._parse_timestamp(loaded[-1]['search_started_at']))
+        ok = await check_next_page(db, user_id, game, loaded, "новая версия снапшота") and ok
+        return ok
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Проверка подгрузки поиска после пересборки снапшота')
+    parser.add_argument('--game', default='dota', help='Игра (default: dota)')
+    parser.add_argument('--user', type=int, default=None, help='telegram_id ищущего (default: случайная анкета)')
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args.game, args.user)) else 1)
@@ -64,6 +64,7 @@ class DatabaseCleaner:
                 ('reports', 'Жалобы'),
                 ('bans', 'Баны'),
                 ('search_skipped', 'Пропуски в поиске'),
+                ('search_skip_bitmaps', 'Уплотнённые пропуски'),
                 ('skipped_likes', 'Пропуски лайков')
             ]
             
@@ -100,6 +101,7 @@ class DatabaseCleaner:
                 try:
                     # Удаляем связанные данные
                     await conn.execute("DELETE FROM search_skipped WHERE user_id > 10000000 OR skipped_user_id > 10000000")
+                    await conn.execute("DELETE FROM search_skip_bitmaps WHERE user_id > 10000000")
                     await conn.execute("DELETE FROM skipped_likes WHERE user_id > 10000000 OR skipped_user_id > 10000000")
                     await conn.execute("DELETE FROM reports WHERE reporter_id > 10000000 OR reported_user_id > 10000000")
                     await conn.execute("DELETE FROM bans WHERE user_id > 10000000")
@@ -154,6 +156,7 @@ class DatabaseCleaner:
                 try:
                     # Удаляем все данные пользователя
                     await conn.execute("DELETE FROM search_skipped WHERE user_id = $1 OR skipped_user_id = $1", user_id)
+                    await conn.execute("DELETE FROM search_skip_bitmaps WHERE user_id = $1", user_id)
                     await conn.execute("DELETE FROM skipped_likes WHERE user_id = $1 OR skipped_user_id = $1", user_id)
                     await conn.execute("DELETE FROM reports WHERE reporter_id = $1 OR reported_user_id = $1", user_id)
                     await conn.execute("DELETE FROM bans WHERE user_id = $1", user_id)
@@ -186,6 +189,7 @@ class DatabaseCleaner:
                     # Удаляем все данные в правильном порядке
                     tables = [
                         'search_skipped',
+                        'search_skip_bitmaps',
                         'skipped_likes', 
                         'reports',
                         'bans',
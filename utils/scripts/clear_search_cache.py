@@ -9,6 +9,7 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from database.database import Database
+import config.settings as settings
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -27,33 +28,15 @@ async def clear_search_cache():
         await db.init()
         print("✅ Подключение к БД установлено\n")
 
-        # Очищаем все ключи кэша поиска
-        print("⏳ Поиск ключей кэша поиска...")
+        # Ключи поиска содержат поколение gen:search:{game} - инвалидация одним INCR,
+        # старые ключи истекут сами по TTL (без SCAN по всему Redis)
+        print("⏳ Инвалидация кэша поиска...")
+        for game in settings.GAMES:
+            await db.invalidate_search_cache(game)
+            generation = await db._cache_generation(f"search:{game}")
+            print(f"  {game}: новое поколение кэша поиска {generation}")
 
-        # Используем SCAN для поиска всех ключей search:*
-        # SCAN лучше чем KEYS, т.к. не блокирует Redis
-        cursor = 0
-        deleted_count = 0
-        batch_count = 0
-
-        while True:
-            cursor, keys = await db._redis.scan(cursor=cursor, match="search:*", count=100)
-
-            if keys:
-                # Удаляем найденные ключи
-                deleted = await db._redis.delete(*keys)
-                deleted_count += deleted
-                batch_count += 1
-                print(f"  Батч {batch_count}: удалено {deleted} ключей...")
-
-            # Когда cursor == 0, итерация завершена
-            if not cursor:
-                break
-
-        if deleted_count > 0:
-            print(f"\n✅ Очищено {deleted_count} ключей кэша поиска")
-        else:
-            print(f"\n⚠️  Ключи кэша поиска не найдены (уже чистый кэш)")
+        print(f"\n✅ Кэш поиска инвалидирован")
 
         # Также очищаем кэш профилей для перезагрузки данных
         print("\n⏳ Очистка кэша профилей...")
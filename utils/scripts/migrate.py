@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Применение миграций схемы БД (database/migrations.py)
+
+    python utils/scripts/migrate.py            # применить неприменённые миграции
+    python utils/scripts/migrate.py --status   # только показать версию схемы
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from database.database import Database
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def migrate(status_only: bool = False):
+    print("=" * 70)
+    print("🔧 МИГРАЦИИ СХЕМЫ БД")
+    print("=" * 70)
+
+    db = Database()
+    runner = db._migrations
+
+    try:
+        # В режиме --status устаревшая схема не мигрируется: init сообщит об этом после создания пула
+        await db.init(apply_migrations=not status_only)
+        print("✅ Подключение к БД установлено\n")
+    except RuntimeError as e:
+        print(f"⚠️  {e}")
+    except Exception as e:
+        print(f"\n❌ Ошибка миграции: {e}")
+        await db.close()
+        raise
+
+    try:
+        async with db._pg_pool.acquire() as conn:
+            version = await runner.current_version(conn)
+            applied = {}
+            if version:
+                rows = await conn.fetch("SELECT version, applied_at, duration_ms FROM schema_version")
+                applied = {row['version']: row for row in rows}
+
+        print(f"Версия схемы: {version} из {runner.latest}\n")
+        for item in runner.migrations:
+            row = applied.get(item.version)
+            mark = f"✅ {row['applied_at']:%d.%m.%Y %H:%M} ({row['duration_ms']} мс)" if row else "⏳ не применена"
+            print(f"  {item.version:>3}. {item.name:<40} {mark}")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate(status_only='--status' in sys.argv))
@@ -5,12 +5,51 @@
 import asyncio
 import asyncpg
 import os
+import sys
+import redis.asyncio as redis
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from database.activity_counters import ActivityCounters
+from database.replica import LAG_SQL, REPLICA_ROUTES, replica_dsn
+
 load_dotenv()
 
 
+async def get_audience_stats():
+    """DAU/WAU/MAU и удержание из HLL-счётчиков Redis (без сканирования users)"""
+    redis_password = os.getenv('REDIS_PASSWORD', '')
+    redis_auth = f":{redis_password}@" if redis_password else ""
+    client = redis.from_url(
+        f"redis://{redis_auth}{os.getenv('REDIS_HOST', 'localhost')}:"
+        f"{os.getenv('REDIS_PORT', '6379')}/{os.getenv('REDIS_DB', '0')}",
+        decode_responses=True
+    )
+    try:
+        return await ActivityCounters(client).summary()
+    finally:
+        await client.close()
+
+
+async def connect_for_reads(primary_url: str):
+    """Подключение к реплике (DB_REPLICA_HOST), если она доступна и не отстаёт; иначе к мастеру"""
+    dsn = replica_dsn()
+    if dsn:
+        try:
+            conn = await asyncpg.connect(dsn)
+            lag = await conn.fetchval(LAG_SQL)
+            if lag <= REPLICA_ROUTES['admin_analytics']:
+                print(f"📡 Чтение с реплики (отставание {lag:.1f} с)")
+                return conn
+            print(f"⚠️  Реплика отстаёт на {lag:.0f} с - читаем мастер")
+            await conn.close()
+        except Exception as e:
+            print(f"⚠️  Реплика недоступна ({e}) - читаем мастер")
+    return await asyncpg.connect(primary_url)
+
+
 async def get_monthly_stats():
     """Получение статистики за последний месяц"""
 
@@ -24,7 +63,7 @@ async def get_monthly_stats():
     )
 
     print("🔌 Подключение к базе данных...")
-    conn = await asyncpg.connect(connection_url)
+    conn = await connect_for_reads(connection_url)
 
     try:
         # Определяем период - последние 30 дней
@@ -169,6 +208,16 @@ async def get_monthly_stats():
         # === АКТИВНОСТЬ ===
         print("\n📈 АКТИВНОСТЬ:")
 
+        try:
+            audience = await get_audience_stats()
+            print(f"  DAU / WAU / MAU (≈): {audience['dau']} / {audience['wau']} / {audience['mau']}")
+            print(f"  Вернулись с прошлой недели: {audience['retention']:.0%} "
+                  f"({audience['returned']}/{audience['prev_wau']})")
+            print(f"  7д Retention новичков: {audience['cohort_retention']:.0%} "
+                  f"({audience['cohort_returned']}/{audience['cohort_size']})")
+        except Exception as e:
+            print(f"  ⚠️  Счётчики аудитории в Redis недоступны: {e}")
+
         # Самые активные пользователи по лайкам
         top_likers = await conn.fetch("""
             SELECT from_user, COUNT(*) as likes_count
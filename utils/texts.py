@@ -201,11 +201,29 @@ ONBOARDING_TIPS = {
     'info': '<b>Совет:</b> Напиши пару слов о себе:\n• Когда обычно играешь\n• Что ищешь в тиммейтах\n• Стиль игры\n\nПрофили с описанием получают на 40% больше мэтчей'
 }
 
+def has_custom_photo(profile: dict) -> bool:
+    """Есть ли у анкеты своё фото (не стандартная аватарка ни одной из игр)"""
+    photo_id = profile.get('photo_id')
+    if not photo_id:
+        return False
+
+    for game in settings.DEFAULT_AVATARS:
+        default_avatar = settings.get_cached_photo_id(f'avatar_{game}')
+        if default_avatar and photo_id == default_avatar:
+            return False
+
+    return True
+
+# Максимум profiles.quality_score (Database._quality_score_sql): поля до 7 x 4 балла + кастомное фото 8
+SEARCH_QUALITY_MAX = 36
+
 def get_profile_quality_score(profile: dict) -> tuple:
     """
     Возвращает (текущий балл, максимальный балл)
     Не учитываем имя и возраст - они обязательны
     Для тренеров/менеджеров используется упрощенная оценка (только 3 параметра)
+    У игроков берется сохраненный profiles.quality_score (тот же скор, что в ранжировании поиска),
+    приведенный к шкале из 7 баллов; по полям считаем, только если скора еще нет
     """
     role = profile.get('role', 'player')
 
@@ -223,23 +241,20 @@ def get_profile_quality_score(profile: dict) -> tuple:
             score += 1
 
         # Фото (только кастомное)
-        photo_id = profile.get('photo_id')
-        if photo_id:
-            game = profile.get('game') or profile.get('current_game')
-            is_default = False
-            if game:
-                import config.settings as settings
-                default_avatar = settings.get_cached_photo_id(f'avatar_{game}')
-                is_default = (default_avatar and photo_id == default_avatar)
-            if not is_default:
-                score += 1
+        if has_custom_photo(profile):
+            score += 1
 
         return score, max_score
 
     # Для игроков полная оценка (7 параметров)
-    score = 0
     max_score = 7
 
+    stored = profile.get('quality_score')
+    if stored is not None:
+        return round(stored * max_score / SEARCH_QUALITY_MAX), max_score
+
+    score = 0
+
     # Рейтинг считается заполненным, если указан и не 'any'
     if profile.get('rating') and profile['rating'] != 'any':
         score += 1
@@ -267,20 +282,8 @@ def get_profile_quality_score(profile: dict) -> tuple:
         score += 1
 
     # Фото (только кастомное, не дефолтное)
-    photo_id = profile.get('photo_id')
-    if photo_id:
-        # Проверяем, не является ли фото дефолтным
-        game = profile.get('game') or profile.get('current_game')
-        is_default = False
-
-        if game:
-            import config.settings as settings
-            default_avatar = settings.get_cached_photo_id(f'avatar_{game}')
-            is_default = (default_avatar and photo_id == default_avatar)
-
-        # Засчитываем только если НЕ дефолтное
-        if not is_default:
-            score += 1
+    if has_custom_photo(profile):
+        score += 1
 
     return score, max_score
 
@@ -318,16 +321,7 @@ def format_profile_quality(profile: dict) -> str:
             missing.append("Напиши о себе")
 
         # Проверяем фото
-        photo_id = profile.get('photo_id')
-        has_custom_photo = False
-        if photo_id:
-            game = profile.get('game') or profile.get('current_game')
-            if game:
-                import config.settings as settings
-                default_avatar = settings.get_cached_photo_id(f'avatar_{game}')
-                has_custom_photo = not (default_avatar and photo_id == default_avatar)
-
-        if not has_custom_photo:
+        if not has_custom_photo(profile):
             missing.append("Добавь своё фото")
 
     else:
@@ -359,17 +353,7 @@ def format_profile_quality(profile: dict) -> str:
             missing.append("Добавь ссылку на профиль")
 
         # Проверяем фото (только кастомное, не дефолтное)
-        photo_id = profile.get('photo_id')
-        has_custom_photo = False
-        if photo_id:
-            game = profile.get('game') or profile.get('current_game')
-            if game:
-                import config.settings as settings
-                default_avatar = settings.get_cached_photo_id(f'avatar_{game}')
-                # Считаем кастомным, если фото есть И оно не дефолтное
-                has_custom_photo = not (default_avatar and photo_id == default_avatar)
-
-        if not has_custom_photo:
+        if not has_custom_photo(profile):
             missing.append("Добавь своё фото")
 
     if missing and score < max_score: